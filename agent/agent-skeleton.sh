@@ -500,21 +500,38 @@ apply_update_config() {
     log "Update version $ver matches current; skip"
     return
   fi
+  # Controller-hosted artifacts are referenced by path (/agent-artifacts/<sha256>).
+  case "$url" in
+    /*) url="$controller_url$url";;
+  esac
   script_sha="$(echo "$json" | jsonfilter -e '@.script_sha256' 2>/dev/null || true)"
   dl_path="$update_script_path"
-  sh -c "$download_cmd '$url'" >"$dl_path" 2>/dev/null || { log "download update failed"; return; }
+  sh -c "$download_cmd '$url'" >"$dl_path" 2>/dev/null || { log "download update failed"; report_update "$ver" false "download failed"; return; }
   if [ -n "$script_sha" ] && command -v sha256sum >/dev/null 2>&1; then
     calc="$(sha256sum "$dl_path" | awk '{print $1}')"
     if [ "$calc" != "$script_sha" ]; then
       log "update sha mismatch expected=$script_sha got=$calc"
+      report_update "$ver" false "sha mismatch"
       return
     fi
   fi
   chmod +x "$dl_path" || true
-  sh "$dl_path" >/dev/null 2>&1 || log "update script failed"
+  if sh "$dl_path" >/dev/null 2>&1; then
+    report_update "$ver" true ""
+  else
+    log "update script failed"
+    report_update "$ver" false "script failed"
+  fi
   log "Apply update url=$url version=$ver"
 }
 
+report_update() {
+  local ver="$1" ok="$2" err="$3"
+  [ -z "$device_id" ] || [ -z "$ver" ] && return 0
+  http_post_json "agent-update/report" \
+    "{\"device_id\":$device_id,\"version\":\"$(json_escape "$ver")\",\"success\":$ok,\"error\":\"$(json_escape "$err")\"}" >/dev/null
+}
+
 apply_config() {
   pkg="$1"; json="$2"
   case "$pkg" in
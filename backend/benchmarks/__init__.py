@@ -0,0 +1 @@
+"""Microbenchmarks for backend hot paths (run with `python -m benchmarks`)."""
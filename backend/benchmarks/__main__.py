@@ -0,0 +1,62 @@
+"""CLI: run benchmarks, store results, and gate against a saved baseline.
+
+    python -m benchmarks                       # run all, compare to baseline
+    python -m benchmarks --save-baseline       # record a new baseline (benchmarks/baseline.json)
+    python -m benchmarks --no-baseline         # measure only, no gate
+    python -m benchmarks -k serialize --threshold 0.1
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from . import bench_fleet, bench_hot_paths  # noqa: F401 - registers benchmarks
+from .harness import BENCH_DIR, DEFAULT_BASELINE, DEFAULT_THRESHOLD, compare, load, registered, run, save
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Wiretide backend microbenchmarks")
+    parser.add_argument("-k", dest="pattern", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--no-baseline", action="store_true", help="skip the comparison (a missing baseline is an error)")
+    parser.add_argument("--out", type=Path, help="result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--list", action="store_true")
+    args = parser.parse_args(argv)
+
+    names = [n for n in registered() if not args.pattern or args.pattern in n]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    result = run(names, repeat=args.repeat)
+    out = args.out or BENCH_DIR / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    save(out, result)
+    for name, row in result["benchmarks"].items():
+        print(f"{name:45} {row['ns_per_op']:>14,.1f} ns/op")
+    print(f"results: {out}")
+
+    if args.save_baseline:
+        save(args.baseline, result)
+        print(f"baseline saved: {args.baseline}")
+        return 0
+
+    if args.no_baseline:
+        return 0
+    baseline = load(args.baseline)
+    if baseline is None:
+        print(f"ERROR: no baseline at {args.baseline}; run with --save-baseline or pass --no-baseline", file=sys.stderr)
+        return 2
+    rows = compare(result, baseline, args.threshold)
+    failed = [r for r in rows if r["regressed"]]
+    for row in rows:
+        flag = "REGRESSION" if row["regressed"] else "ok"
+        print(f"{row['name']:45} {row['change']:+8.1%}  {flag}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Benchmarks for the in-memory fleet read model (wiretide.fleet) at 10k/50k devices."""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from wiretide.fleet import FLEET, FleetModel
+from wiretide.models import CacheGeneration, Device, DeviceStatus
+from wiretide.routes import _device_rows
+from wiretide.templating import DEVICE_ROWS, get_templates
+
+from .bench_hot_paths import make_clients
+from .harness import benchmark
+
+TYPES = ("router", "access_point", "switch", "firewall")
+STATUSES = ("waiting", "approved", "approved", "approved", "blocked")
+PRESENCES = ("online", "online", "online", "stale", "offline")
+
+
+def make_fleet(devices: int, clients_per_device: int = 5) -> Session:
+    """In-memory SQLite database with `devices` devices, each with a status row written an hour ago."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [CacheGeneration.__table__, Device.__table__, DeviceStatus.__table__]
+    SQLModel.metadata.create_all(engine, tables=tables)
+    rng = random.Random(devices)
+    now = datetime.now(timezone.utc)
+    written = now - timedelta(hours=1)
+    session = Session(engine)
+    session.exec(
+        insert(Device),
+        params=[
+            {
+                "id": idx,
+                "hostname": f"site{idx % 97}-dev-{idx:06d}",
+                "device_type": rng.choice(TYPES),
+                "status": rng.choice(STATUSES),
+                "presence": rng.choice(PRESENCES),
+                "last_seen": now - timedelta(seconds=rng.randrange(86400)),
+                "created_at": now,
+                "changed_at": written,
+                "ssh_enabled": True,
+            }
+            for idx in range(1, devices + 1)
+        ],
+    )
+    session.exec(
+        insert(DeviceStatus),
+        params=[
+            {
+                "device_id": idx,
+                "dns_ok": True,
+                "ntp_ok": True,
+                "clients": make_clients(clients_per_device, seed=idx, mac_pool=devices * 2),
+                "updated_at": written,
+            }
+            for idx in range(1, devices + 1)
+        ],
+    )
+    session.commit()
+    return session
+
+
+def _load(devices: int):
+    session = make_fleet(devices)
+
+    def run():
+        FleetModel().sync(session)
+
+    return run
+
+
+def _refresh(devices: int):
+    """One changed device out of `devices`: the cost every other worker pays after a heartbeat."""
+    session = make_fleet(devices)
+    fleet = FleetModel().sync(session)
+
+    def run():
+        session.exec(update(Device).where(Device.id == 7).values(last_seen=datetime.now(timezone.utc)))
+        session.commit()
+        fleet.sync(session)
+
+    return run
+
+
+def _query(devices: int):
+    session = make_fleet(devices)
+    fleet = FleetModel().sync(session)
+    return lambda: fleet.sync(session).query(
+        device_type="access_point", status="approved", search="site4", sort="-last_seen", offset=50, limit=50
+    )
+
+
+def _query_sql(devices: int):
+    """The same page and count in SQL, as the list views did before the read model."""
+    session = make_fleet(devices)
+
+    def run():
+        stmt = select(Device).where(
+            Device.device_type == "access_point", Device.status == "approved", Device.hostname.contains("site4")
+        )
+        page = session.exec(stmt.order_by(Device.last_seen.desc()).offset(50).limit(50)).all()
+        session.exec(select(func.count()).select_from(stmt.subquery())).one()
+        ids = [device.id for device in page]
+        session.exec(select(DeviceStatus).where(DeviceStatus.device_id.in_(ids))).all()
+        session.expunge_all()
+
+    return run
+
+
+def _clients(devices: int):
+    """Merged /clients list after one status report (the cached list is rebuilt)."""
+    session = make_fleet(devices)
+    fleet = FleetModel().sync(session)
+
+    def run():
+        now = datetime.now(timezone.utc)
+        session.exec(update(DeviceStatus).where(DeviceStatus.device_id == 7).values(updated_at=now))
+        session.commit()
+        fleet.sync(session).clients()
+
+    return run
+
+
+def _rows(cached: bool):
+    """The 200 rows of a full /devices page, from the row cache or rendered from scratch."""
+    session = make_fleet(1_000)
+    FLEET.reset()
+    _, devices = FLEET.sync(session).query(limit=200)
+    templates = get_templates()
+
+    def run():
+        if not cached:
+            DEVICE_ROWS.clear()
+        return _device_rows(templates, devices)
+
+    return run
+
+
+benchmark("devices_page.rows_200_cached")(lambda: _rows(cached=True))
+benchmark("devices_page.rows_200_rendered")(lambda: _rows(cached=False))
+
+for _size, _label in ((10_000, "10k"), (50_000, "50k")):
+    benchmark(f"fleet.load_{_label}")(lambda size=_size: _load(size))
+    benchmark(f"fleet.refresh_one_{_label}")(lambda size=_size: _refresh(size))
+    benchmark(f"fleet.query_page_{_label}")(lambda size=_size: _query(size))
+    benchmark(f"fleet.sql_page_{_label}")(lambda size=_size: _query_sql(size))
+    benchmark(f"fleet.clients_{_label}")(lambda size=_size: _clients(size))
@@ -0,0 +1,115 @@
+"""Benchmarks for per-request hot paths in the agent and admin flows."""
+
+import base64
+import random
+from datetime import datetime, timedelta, timezone
+
+from wiretide.auth import issue_session_token, parse_basic_credentials, validate_session_token
+from wiretide.models import Device, DeviceStatus
+from wiretide.routes import _serialize_device
+from wiretide.schemas import StatusReport
+from wiretide.services import aggregate_clients, canonical_sha256
+
+from .harness import benchmark
+
+# Fixed bcrypt-shaped hash; session tokens only use it as an HMAC key.
+PASSWORD_HASH = "$2b$12$C6UzMDM.H6dfI/f/IKcEeO3LrEpZ0xnV0vY8ZVzL0i8D5d9yQ8n1K"
+
+
+def make_clients(count: int, seed: int = 7, mac_pool: int = 0) -> list:
+    rng = random.Random(seed)
+    clients = []
+    for idx in range(count):
+        mac_idx = rng.randrange(mac_pool) if mac_pool else idx
+        entry = {
+            "mac": f"AA:BB:{mac_idx // 65536 % 256:02X}:{mac_idx // 256 % 256:02X}:{mac_idx % 256:02X}:01",
+            "ip": f"192.168.{idx // 250 + 1}.{idx % 250 + 2}",
+            "host": f"client-{mac_idx}",
+        }
+        if idx % 3:
+            entry.update(iface="wlan0", ssid="wiretide", band="5g")
+        clients.append(entry)
+    return clients
+
+
+@benchmark("queue_config.canonical_sha256")
+def bench_canonical_sha256():
+    package_json = {
+        "profile": "custom",
+        "rules": {
+            f"rule_{idx}": {"src": "lan", "dest": "wan", "proto": "tcp", "dest_port": 1000 + idx, "target": "ACCEPT"}
+            for idx in range(50)
+        },
+    }
+    return lambda: canonical_sha256(package_json)
+
+
+@benchmark("serialize_device.500_clients")
+def bench_serialize_device():
+    now = datetime.now(timezone.utc)
+    device = Device(
+        id=1,
+        hostname="bench-router",
+        device_type="router",
+        status="approved",
+        approved=True,
+        last_seen=now,
+        ssh_enabled=True,
+        created_at=now,
+    )
+    status_row = DeviceStatus(
+        device_id=1,
+        dns_ok=True,
+        ntp_ok=True,
+        firewall_profile_active="strict",
+        security_log_samples={"dropped": 12, "ssh_failures": 3},
+        clients=make_clients(500),
+        updated_at=now,
+    )
+    return lambda: _serialize_device(device, status_row)
+
+
+@benchmark("auth.validate_session_token")
+def bench_validate_session_token():
+    token = issue_session_token("admin", PASSWORD_HASH)
+    return lambda: validate_session_token(token, "admin", PASSWORD_HASH)
+
+
+@benchmark("auth.parse_basic_credentials")
+def bench_parse_basic_credentials():
+    header = "Basic " + base64.b64encode(b"admin:correct horse battery staple").decode()
+    return lambda: parse_basic_credentials(header)
+
+
+@benchmark("schemas.status_report_500_clients")
+def bench_status_report_validation():
+    payload = {
+        "device_id": 42,
+        "dns_ok": True,
+        "ntp_ok": True,
+        "firewall_profile_active": "default",
+        "security_log_samples": {"dropped": 5},
+        "clients": make_clients(500),
+        "ssh_enabled": True,
+        "agent_version": "0.0.1",
+    }
+    return lambda: StatusReport.model_validate(payload)
+
+
+@benchmark("clients_page.aggregate_200x25")
+def bench_aggregate_clients():
+    now = datetime.now(timezone.utc)
+    devices = {
+        idx: Device(id=idx, hostname=f"ap-{idx}", device_type="access_point", created_at=now)
+        for idx in range(1, 201)
+    }
+    # Overlapping MAC pool so roaming clients are seen by several APs.
+    statuses = [
+        DeviceStatus(
+            device_id=idx,
+            clients=make_clients(25, seed=idx, mac_pool=3000),
+            updated_at=now - timedelta(seconds=idx),
+        )
+        for idx in devices
+    ]
+    return lambda: aggregate_clients(statuses, devices)
@@ -0,0 +1,97 @@
+"""Tiny benchmark registry, timer and baseline comparison.
+
+Each benchmark is a setup function returning a zero-argument callable; the
+harness times it with `timeit` autoranging and keeps the best of several
+repeats (per-call nanoseconds), which is the most stable figure on noisy VMs.
+"""
+
+import json
+import platform
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+# Tracked in git; `results/` only holds run outputs.
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_THRESHOLD = 0.25
+
+_REGISTRY: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    """Register a setup function under `name`."""
+
+    def decorator(setup: Callable[[], Callable[[], object]]):
+        if name in _REGISTRY:
+            raise ValueError(f"duplicate benchmark {name}")
+        _REGISTRY[name] = setup
+        return setup
+
+    return decorator
+
+
+def registered() -> List[str]:
+    return sorted(_REGISTRY)
+
+
+def time_call(func: Callable[[], object], repeat: int = 5, min_time: float = 0.2) -> Dict[str, float]:
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    # Scale so each repeat takes at least min_time seconds.
+    if elapsed < min_time:
+        number = max(number, int(number * min_time / max(elapsed, 1e-9)))
+    runs = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    best = min(runs)
+    return {
+        "ns_per_op": round(best * 1e9, 1),
+        "ops_per_s": round(1.0 / best, 1) if best else 0.0,
+        "loops": number,
+        "repeat": repeat,
+    }
+
+
+def run(names: Optional[List[str]] = None, repeat: int = 5) -> dict:
+    results = {}
+    for name in names or registered():
+        func = _REGISTRY[name]()
+        results[name] = time_call(func, repeat=repeat)
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "benchmarks": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> List[dict]:
+    """Return one row per benchmark present in both runs; `regressed` when slower than threshold."""
+    rows = []
+    for name, result in sorted(current["benchmarks"].items()):
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base:
+            continue
+        ratio = result["ns_per_op"] / base["ns_per_op"] if base["ns_per_op"] else 1.0
+        rows.append(
+            {
+                "name": name,
+                "baseline_ns": base["ns_per_op"],
+                "current_ns": result["ns_per_op"],
+                "change": round(ratio - 1.0, 4),
+                "regressed": ratio > 1.0 + threshold,
+            }
+        )
+    return rows
+
+
+def load(path: Path) -> Optional[dict]:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def save(path: Path, payload: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n")
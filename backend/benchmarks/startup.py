@@ -0,0 +1,129 @@
+"""Cold-start benchmark: import time and time to the first served agent request.
+
+    python -m benchmarks.startup                          # 5 runs, check budgets
+    python -m benchmarks.startup --runs 10 --ready-budget-ms 2500
+
+Every run uses a fresh interpreter and an empty SQLite file. `import_ms` is
+`import wiretide.main`; `ready_ms` is from spawning uvicorn until `POST
+/register` first returns 200 (includes create_all and seeding). Medians are
+compared to the budgets; exit 1 when either is over.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from .harness import BENCH_DIR, save
+
+BACKEND_DIR = BENCH_DIR.parent
+DEFAULT_IMPORT_BUDGET_MS = 1500.0
+DEFAULT_READY_BUDGET_MS = 3000.0
+IMPORT_SNIPPET = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "import wiretide.main\n"
+    "print((time.perf_counter() - start) * 1000)\n"
+)
+
+
+def _env(data_dir: Path) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "WIRETIDE_DATABASE_URL": f"sqlite:///{data_dir / 'wiretide.db'}",
+        "WIRETIDE_TEMPLATE_CACHE_DIR": str(data_dir / "template-cache"),
+        "WIRETIDE_ADMIN_TOKEN": "startup-bench",
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(env: Dict[str, str]) -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure_ready(env: Dict[str, str], timeout: float = 30.0) -> float:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/register"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "wiretide.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=2.0) as client:
+            while time.perf_counter() - start < timeout:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with {proc.returncode}")
+                try:
+                    if client.post(url, json={"hostname": "startup-bench"}).status_code == 200:
+                        return (time.perf_counter() - start) * 1000
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+        raise TimeoutError(f"no successful /register within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def run(runs: int) -> Dict[str, List[float]]:
+    samples: Dict[str, List[float]] = {"import_ms": [], "ready_ms": []}
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = _env(Path(tmp))
+            samples["import_ms"].append(round(measure_import(env), 1))
+        with tempfile.TemporaryDirectory() as tmp:
+            samples["ready_ms"].append(round(measure_ready(_env(Path(tmp))), 1))
+    return samples
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Wiretide cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=DEFAULT_IMPORT_BUDGET_MS)
+    parser.add_argument("--ready-budget-ms", type=float, default=DEFAULT_READY_BUDGET_MS)
+    parser.add_argument("--out", type=Path, help="result file (default: benchmarks/results/startup-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    samples = run(args.runs)
+    budgets = {"import_ms": args.import_budget_ms, "ready_ms": args.ready_budget_ms}
+    summary = {
+        name: {"median": statistics.median(values), "max": max(values), "budget": budgets[name], "samples": values}
+        for name, values in samples.items()
+    }
+    out = args.out or BENCH_DIR / "results" / f"startup-{datetime.now():%Y%m%d-%H%M%S}.json"
+    save(out, {"created_at": datetime.now(timezone.utc).isoformat(), "python": sys.version.split()[0], "startup": summary})
+
+    failed = False
+    for name, row in summary.items():
+        over = row["median"] > row["budget"]
+        failed = failed or over
+        flag = "OVER BUDGET" if over else "ok"
+        print(f"{name:10} median {row['median']:>8.1f} ms  max {row['max']:>8.1f} ms  budget {row['budget']:>8.1f} ms  {flag}")
+    print(f"results: {out}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+"""Fleet simulator: N virtual agents driving the controller's agent contract.
+
+Each virtual agent follows `agent/CONTRACT.md`: fetch `/token/current`,
+`/register`, then loop `/status` + `/config` with jittered intervals and
+recover from token rotations via `/token/current` after a 403. An admin task
+approves devices during the run (every approval rotates the shared token) and
+queues configs so `/config` deliveries are exercised too.
+
+Usage (from `backend/`):
+    python -m loadtest.fleet_sim --agents 2000 --duration 120 --interval 30 \\
+        --out loadtest/results/fleet.json
+    python -m loadtest.fleet_sim --compare old.json new.json
+
+Compare the threadpool and async DB paths by running once per `--db-mode`
+and diffing the two result files with `--compare`.
+
+Without `--base-url` a local uvicorn is started on a free port with a
+throwaway SQLite database.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+DEVICE_TYPES = ("router", "access_point", "switch", "firewall")
+SIM_ADMIN_TOKEN = "fleet-sim-admin"
+
+
+@dataclass
+class SimConfig:
+    agents: int = 100
+    duration: float = 60.0
+    interval: float = 30.0
+    jitter: float = 0.2
+    max_clients: int = 40
+    approvals: int = 10
+    config_every: float = 10.0
+    connections: int = 200
+    timeout: float = 10.0
+    seed: int = 1
+    admin_token: str = SIM_ADMIN_TOKEN
+    label: str = ""
+
+
+@dataclass
+class EndpointStats:
+    latencies_ms: List[float] = field(default_factory=list)
+    status_codes: Dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+
+    def record(self, elapsed_ms: float, status_code: Optional[int], error: bool) -> None:
+        self.latencies_ms.append(elapsed_ms)
+        key = str(status_code) if status_code is not None else "transport_error"
+        self.status_codes[key] = self.status_codes.get(key, 0) + 1
+        if error:
+            self.errors += 1
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class FleetStats:
+    def __init__(self) -> None:
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.token_recoveries = 0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def endpoint(self, name: str) -> EndpointStats:
+        stats = self.endpoints.get(name)
+        if stats is None:
+            stats = self.endpoints[name] = EndpointStats()
+        return stats
+
+    def summary(self, config: SimConfig) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        endpoints = {}
+        total = 0
+        total_errors = 0
+        for name, stats in sorted(self.endpoints.items()):
+            values = sorted(stats.latencies_ms)
+            count = len(values)
+            total += count
+            total_errors += stats.errors
+            endpoints[name] = {
+                "count": count,
+                "rps": round(count / elapsed, 2) if elapsed else 0.0,
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "max_ms": round(values[-1], 2) if values else 0.0,
+                "errors": stats.errors,
+                "error_rate": round(stats.errors / count, 4) if count else 0.0,
+                "status_codes": dict(sorted(stats.status_codes.items())),
+            }
+        return {
+            "config": asdict(config),
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(total_errors / total, 4) if total else 0.0,
+            "token_recoveries": self.token_recoveries,
+            "endpoints": endpoints,
+        }
+
+
+def fake_clients(rng: random.Random, count: int) -> List[dict]:
+    clients = []
+    for idx in range(count):
+        mac = ":".join(f"{rng.randrange(256):02x}" for _ in range(6))
+        entry = {"mac": mac, "ip": f"192.168.{idx // 250 + 1}.{idx % 250 + 2}", "host": f"client-{idx}"}
+        if rng.random() < 0.6:
+            entry.update(
+                iface=f"wlan{rng.randrange(2)}",
+                ssid="wiretide",
+                band=rng.choice(("2g", "5g")),
+            )
+        clients.append(entry)
+    return clients
+
+
+class Fleet:
+    """Shared state for virtual agents (token cache, device ids, stats)."""
+
+    def __init__(self, client: httpx.AsyncClient, config: SimConfig) -> None:
+        self.client = client
+        self.config = config
+        self.stats = FleetStats()
+        self.shared_token: Optional[str] = None
+        self.device_ids: List[int] = []
+        self.deadline = 0.0
+
+    async def call(self, method: str, path: str, name: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            resp = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            elapsed = (time.perf_counter() - start) * 1000.0
+            self.stats.endpoint(name).record(elapsed, None, True)
+            return None
+        elapsed = (time.perf_counter() - start) * 1000.0
+        expected = resp.status_code < 400 or resp.status_code in (403, 404)
+        self.stats.endpoint(name).record(elapsed, resp.status_code, not expected)
+        return resp
+
+    async def refresh_token(self) -> None:
+        resp = await self.call("GET", "/token/current", "GET /token/current")
+        if resp is not None and resp.status_code == 200:
+            self.shared_token = resp.json()["shared_token"]
+
+    def headers(self) -> dict:
+        return {"X-Shared-Token": self.shared_token} if self.shared_token else {}
+
+    def sleep_for(self, rng: random.Random) -> float:
+        spread = self.config.interval * self.config.jitter
+        return max(0.0, self.config.interval + rng.uniform(-spread, spread))
+
+
+async def run_agent(fleet: Fleet, index: int) -> None:
+    config = fleet.config
+    rng = random.Random(config.seed * 100003 + index)
+    await asyncio.sleep(rng.uniform(0, config.interval))
+    if time.perf_counter() >= fleet.deadline:
+        return
+    if fleet.shared_token is None:
+        await fleet.refresh_token()
+    registration = {
+        "hostname": f"sim-{index:05d}",
+        "device_type": rng.choice(DEVICE_TYPES),
+        "ssh_enabled": True,
+        "ssh_fingerprint": f"SHA256:sim{index:05d}",
+        "agent_version": "0.0.1-sim",
+        "ip_address": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}",
+    }
+    resp = await fleet.call("POST", "/register", "POST /register", headers=fleet.headers(), json=registration)
+    if resp is not None and resp.status_code == 403:
+        fleet.stats.token_recoveries += 1
+        await fleet.refresh_token()
+        resp = await fleet.call(
+            "POST", "/register", "POST /register", headers=fleet.headers(), json=registration
+        )
+    if resp is None or resp.status_code != 200:
+        return
+    device_id = resp.json()["device_id"]
+    fleet.device_ids.append(device_id)
+    clients = fake_clients(rng, rng.randint(0, config.max_clients))
+
+    while time.perf_counter() < fleet.deadline:
+        if rng.random() < 0.1:
+            clients = fake_clients(rng, rng.randint(0, config.max_clients))
+        report = {
+            "device_id": device_id,
+            "dns_ok": rng.random() > 0.02,
+            "ntp_ok": rng.random() > 0.02,
+            "firewall_profile_active": "default",
+            "clients": clients,
+            "ssh_enabled": True,
+            "agent_version": "0.0.1-sim",
+        }
+        resp = await fleet.call("POST", "/status", "POST /status", headers=fleet.headers(), json=report)
+        if resp is not None and resp.status_code == 403:
+            fleet.stats.token_recoveries += 1
+            await fleet.refresh_token()
+            await fleet.call("POST", "/status", "POST /status", headers=fleet.headers(), json=report)
+        resp = await fleet.call(
+            "GET", "/config", "GET /config", headers=fleet.headers(), params={"device_id": device_id}
+        )
+        if resp is not None and resp.status_code == 403 and resp.json().get("detail") == "Invalid shared token":
+            fleet.stats.token_recoveries += 1
+            await fleet.refresh_token()
+        await asyncio.sleep(fleet.sleep_for(rng))
+
+
+async def run_admin(fleet: Fleet) -> None:
+    """Approve devices (rotating the token each time) and queue configs."""
+    config = fleet.config
+    headers = {"X-Admin-Token": config.admin_token}
+    approved: List[int] = []
+    approve_gap = config.duration / (config.approvals + 1) if config.approvals else None
+    next_approve = time.perf_counter() + (approve_gap or 0)
+    next_config = time.perf_counter() + config.config_every
+    rng = random.Random(config.seed)
+    while time.perf_counter() < fleet.deadline:
+        now = time.perf_counter()
+        if approve_gap and now >= next_approve and len(approved) < config.approvals:
+            candidates = [d for d in fleet.device_ids if d not in approved]
+            if candidates:
+                device_id = rng.choice(candidates)
+                resp = await fleet.call(
+                    "POST",
+                    "/api/devices/approve",
+                    "POST /api/devices/approve",
+                    headers=headers,
+                    json={"device_id": device_id, "device_type": "router"},
+                )
+                if resp is not None and resp.status_code == 200:
+                    approved.append(device_id)
+            next_approve = now + approve_gap
+        if approved and now >= next_config:
+            for device_id in approved:
+                await fleet.call(
+                    "POST",
+                    "/api/queue-config",
+                    "POST /api/queue-config",
+                    headers=headers,
+                    json={
+                        "device_id": device_id,
+                        "package": "wiretide.firewall",
+                        "package_json": {"profile": rng.choice(("default", "strict"))},
+                    },
+                )
+            next_config = now + config.config_every
+        await asyncio.sleep(min(0.5, config.interval / 4))
+
+
+async def run_simulation(client: httpx.AsyncClient, config: SimConfig) -> dict:
+    fleet = Fleet(client, config)
+    fleet.deadline = time.perf_counter() + config.duration
+    fleet.stats.started = time.perf_counter()
+    tasks = [asyncio.create_task(run_agent(fleet, idx)) for idx in range(config.agents)]
+    tasks.append(asyncio.create_task(run_admin(fleet)))
+    await asyncio.gather(*tasks)
+    fleet.stats.finished = time.perf_counter()
+    return fleet.stats.summary(config)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, extra_env: Dict[str, str], workdir: Path) -> tuple:
+    """Start uvicorn against a throwaway database; returns (process, base_url)."""
+    port = _free_port()
+    env = dict(os.environ)
+    env.pop("WIRETIDE_ADMIN_PASSWORD_HASH", None)
+    env.update(
+        WIRETIDE_DATABASE_URL=f"sqlite:///{workdir / 'fleet-sim.db'}",
+        WIRETIDE_ADMIN_TOKEN=SIM_ADMIN_TOKEN,
+        WIRETIDE_ADMIN_ENV_PATH=str(workdir / "admin.env"),
+    )
+    env.update(extra_env)
+    cmd = [
+        sys.executable, "-m", "uvicorn", "wiretide.main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+    ]
+    proc = subprocess.Popen(cmd, cwd=str(BACKEND_DIR), env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None:
+            break
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not become healthy")
+
+
+def compare(old_path: str, new_path: str) -> str:
+    old = json.loads(Path(old_path).read_text())
+    new = json.loads(Path(new_path).read_text())
+    lines = [f"{'endpoint':32} {'metric':10} {'old':>10} {'new':>10} {'delta':>8}"]
+    for name in sorted(set(old["endpoints"]) | set(new["endpoints"])):
+        before = old["endpoints"].get(name, {})
+        after = new["endpoints"].get(name, {})
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms", "error_rate"):
+            a, b = before.get(metric, 0.0), after.get(metric, 0.0)
+            delta = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            lines.append(f"{name:32} {metric:10} {a:>10} {b:>10} {delta:>8}")
+    lines.append(f"{'total':32} {'rps':10} {old['throughput_rps']:>10} {new['throughput_rps']:>10}")
+    return "\n".join(lines)
+
+
+def _parse_env(pairs: List[str]) -> Dict[str, str]:
+    env = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        env[key] = value
+    return env
+
+
+async def _run_cli(config: SimConfig, base_url: str) -> dict:
+    limits = httpx.Limits(max_connections=config.connections, max_keepalive_connections=config.connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=config.timeout) as client:
+        return await run_simulation(client, config)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Wiretide fleet simulator")
+    parser.add_argument("--agents", type=int, default=SimConfig.agents)
+    parser.add_argument("--duration", type=float, default=SimConfig.duration, help="seconds")
+    parser.add_argument("--interval", type=float, default=SimConfig.interval, help="heartbeat interval (s)")
+    parser.add_argument("--jitter", type=float, default=SimConfig.jitter, help="interval jitter fraction")
+    parser.add_argument("--max-clients", type=int, default=SimConfig.max_clients)
+    parser.add_argument("--approvals", type=int, default=SimConfig.approvals, help="token rotations via approve")
+    parser.add_argument("--config-every", type=float, default=SimConfig.config_every)
+    parser.add_argument("--connections", type=int, default=SimConfig.connections)
+    parser.add_argument("--seed", type=int, default=SimConfig.seed)
+    parser.add_argument("--label", default="", help="free-form label stored in the result")
+    parser.add_argument("--base-url", help="existing controller; otherwise a local uvicorn is started")
+    parser.add_argument("--admin-token", default=SIM_ADMIN_TOKEN)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local server")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument(
+        "--db-mode",
+        choices=("sync", "async"),
+        help="local server only: threadpool sessions or the async engine for agent endpoints",
+    )
+    parser.add_argument("--out", help="write the JSON result here (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        print(compare(*args.compare))
+        return 0
+
+    config = SimConfig(
+        agents=args.agents,
+        duration=args.duration,
+        interval=args.interval,
+        jitter=args.jitter,
+        max_clients=args.max_clients,
+        approvals=args.approvals,
+        config_every=args.config_every,
+        connections=args.connections,
+        seed=args.seed,
+        admin_token=args.admin_token,
+        label=args.label,
+    )
+    server_env = _parse_env(args.server_env)
+    if args.db_mode:
+        server_env["WIRETIDE_ASYNC_DB_ENABLED"] = "true" if args.db_mode == "async" else "false"
+    proc = None
+    with tempfile.TemporaryDirectory(prefix="wiretide-sim-") as tmp:
+        base_url = args.base_url
+        if not base_url:
+            proc, base_url = start_server(args.workers, server_env, Path(tmp))
+        try:
+            result = asyncio.run(_run_cli(config, base_url))
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=10)
+    result["server_env"] = server_env
+    payload = json.dumps(result, indent=2, sort_keys=True)
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(payload + "\n")
+    else:
+        print(payload)
+    return 1 if result["error_rate"] > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
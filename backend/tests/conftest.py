@@ -0,0 +1,50 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+os.environ.setdefault("WIRETIDE_ADMIN_TOKEN", "test-admin")
+os.environ.setdefault("WIRETIDE_DATABASE_URL", "sqlite:///:memory:")
+
+from wiretide.cache_bus import BUS  # noqa: E402
+from wiretide.db import get_session, instrument_engine  # noqa: E402
+from wiretide.fleet import FLEET  # noqa: E402
+from wiretide.main import app  # noqa: E402
+from wiretide.services import ensure_settings_seeded  # noqa: E402
+
+
+test_engine = instrument_engine(
+    create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+)
+
+
+def get_test_session():
+    with Session(test_engine) as session:
+        yield session
+
+
+app.dependency_overrides[get_session] = get_test_session
+
+# Disable production startup/shutdown hooks and lifespan for isolated testing.
+app.router.on_startup.clear()
+app.router.on_shutdown.clear()
+app.router.lifespan_context = None
+
+
+@pytest.fixture(autouse=True)
+def clear_db():
+    SQLModel.metadata.drop_all(test_engine)
+    SQLModel.metadata.create_all(test_engine)
+    BUS.reset()
+    FLEET.reset()
+    with Session(test_engine) as session:
+        ensure_settings_seeded(session)
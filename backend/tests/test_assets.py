@@ -0,0 +1,50 @@
+import gzip
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from wiretide import assets
+from wiretide.assets import AssetFiles, asset_url, build_assets, load_manifest
+
+
+def _client(static, build):
+    app = FastAPI()
+    app.mount("/static", AssetFiles(static, build), name="static")
+    return TestClient(app)
+
+
+def test_build_writes_hashed_precompressed_assets(tmp_path):
+    static = tmp_path / "static"
+    (static / "css").mkdir(parents=True)
+    (static / "css" / "app.css").write_text("body { color: red; }\n" * 50)
+    build = tmp_path / "build"
+
+    manifest = build_assets(static, build)
+    hashed = manifest["css/app.css"]
+    assert hashed.startswith("css/app.") and hashed.endswith(".css") and hashed != "css/app.css"
+    assert gzip.decompress((build / (hashed + ".gz")).read_bytes()) == (static / "css" / "app.css").read_bytes()
+    assert build_assets(static, build) == manifest  # content-addressed: stable across builds
+
+    client = _client(static, build)
+    response = client.get(f"/static/{hashed}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"].startswith("text/css")
+    assert "immutable" in response.headers["cache-control"]
+    assert response.text.startswith("body")
+    plain = client.get(f"/static/{hashed}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and "immutable" in plain.headers["cache-control"]
+    source = client.get("/static/css/app.css")
+    assert source.status_code == 200 and source.headers["cache-control"] == "no-cache"
+
+
+def test_asset_url_resolves_through_manifest(tmp_path, monkeypatch):
+    try:
+        load_manifest(tmp_path)
+        assert asset_url("css/app.css") == "/static/css/app.css"
+        build_assets(assets.STATIC_DIR, tmp_path)
+        load_manifest(tmp_path)
+        assert asset_url("css/app.css") != "/static/css/app.css"
+        assert (tmp_path / asset_url("css/app.css")[len("/static/"):]).is_file()
+    finally:
+        load_manifest()
@@ -0,0 +1,70 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from wiretide.async_routes import async_agent_router
+from wiretide.db import get_async_session, get_session
+from wiretide.routes import router
+from wiretide.services import ensure_settings_seeded
+
+
+def _build_app(db_path):
+    sync_engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    SQLModel.metadata.create_all(sync_engine)
+    with Session(sync_engine) as session:
+        ensure_settings_seeded(session)
+
+    def sync_session():
+        with Session(sync_engine) as session:
+            yield session
+
+    async def async_session():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(async_agent_router)
+    app.include_router(router)
+    app.dependency_overrides[get_session] = sync_session
+    app.dependency_overrides[get_async_session] = async_session
+    return app
+
+
+def test_async_agent_flow_matches_sync_contract(tmp_path):
+    client = TestClient(_build_app(tmp_path / "async.db"))
+    admin = {"X-Admin-Token": "test-admin"}
+
+    reg = client.post("/register", json={"hostname": "async-router", "ssh_enabled": True})
+    assert reg.status_code == 200
+    device_id = reg.json()["device_id"]
+    assert reg.json()["status"] == "waiting"
+
+    assert client.post("/status", json={"device_id": device_id, "dns_ok": True}).status_code == 200
+    assert client.post("/status", json={"device_id": 999, "dns_ok": True}).status_code == 404
+
+    approve = client.post(
+        "/api/devices/approve",
+        headers=admin,
+        json={"device_id": device_id, "device_type": "router"},
+    )
+    assert approve.status_code == 200
+    token = client.get("/token/current").json()["shared_token"]
+
+    assert client.get("/config", params={"device_id": device_id}).status_code == 401
+    assert (
+        client.get("/config", headers={"X-Shared-Token": "stale"}, params={"device_id": device_id}).status_code
+        == 403
+    )
+    client.post(
+        "/api/queue-config",
+        headers=admin,
+        json={"device_id": device_id, "package": "wiretide.apps", "package_json": {"adblock_enabled": True}},
+    )
+    cfg = client.get("/config", headers={"X-Shared-Token": token}, params={"device_id": device_id})
+    assert cfg.status_code == 200
+    assert cfg.json()["package_json"] == {"adblock_enabled": True}
+    again = client.get("/config", headers={"X-Shared-Token": token}, params={"device_id": device_id})
+    assert again.status_code == 404
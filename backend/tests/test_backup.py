@@ -0,0 +1,97 @@
+import gzip
+import hashlib
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import create_engine, text
+
+from wiretide import backup
+from wiretide.config import get_settings
+from wiretide.main import app
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+
+
+@pytest.fixture
+def backup_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "backup_dir", str(tmp_path))
+    return tmp_path
+
+
+def _restore(path, tmp_path):
+    restored = tmp_path / "restored.db"
+    restored.write_bytes(gzip.decompress(path.read_bytes()))
+    return sqlite3.connect(restored)
+
+
+def test_endpoint_writes_checksummed_snapshot(backup_dir):
+    client.post("/register", json={"hostname": "snap"})
+    assert client.post("/api/backups").status_code == 401
+    response = client.post("/api/backups", headers=ADMIN)
+    assert response.status_code == 201
+    (created,) = response.json()
+    path = backup_dir / created["name"]
+    assert created["sha256"] == hashlib.sha256(path.read_bytes()).hexdigest()
+    assert (backup_dir / f"{created['name']}.sha256").read_text() == f"{created['sha256']}  {created['name']}\n"
+    assert _restore(path, backup_dir).execute("SELECT hostname FROM device").fetchall() == [("snap",)]
+    assert client.get("/api/backups", headers=ADMIN).json() == [created]
+
+
+def test_retention_keeps_newest_per_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'wiretide.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x)"))
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for day in range(4):
+        backup.create_backup([engine], tmp_path / "out", start + timedelta(days=day), keep=2)
+    names = [item.name for item in backup.list_backups(tmp_path / "out")]
+    assert names == ["wiretide.20260104-000000-000000.db.gz", "wiretide.20260103-000000-000000.db.gz"]
+    assert len(list((tmp_path / "out").iterdir())) == 4
+    assert backup.main(["list", "--dir", str(tmp_path / "out")]) == 0
+    engine.dispose()
+
+
+@pytest.mark.parametrize("journal_mode", ["wal", "delete"])
+def test_writers_progress_during_stepped_copy(journal_mode, tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "backup_step_pages", 4)
+    monkeypatch.setattr(get_settings(), "backup_step_sleep", 0.002)
+    url = f"sqlite:///{tmp_path / 'busy.db'}"
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA journal_mode={journal_mode}")
+        conn.execute(text("CREATE TABLE beat (at REAL, pad TEXT)"))
+        conn.execute(
+            text(
+                "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 2000) "
+                "INSERT INTO beat SELECT 0, hex(randomblob(500)) FROM n"
+            )
+        )
+    stop = threading.Event()
+    slowest = []
+
+    def heartbeat():
+        writer = sqlite3.connect(tmp_path / "busy.db", timeout=5)
+        while not stop.is_set():
+            started = time.perf_counter()
+            with writer:
+                writer.execute("INSERT INTO beat VALUES (?, '')", (started,))
+            slowest.append(time.perf_counter() - started)
+            time.sleep(0.001)
+        writer.close()
+
+    thread = threading.Thread(target=heartbeat)
+    thread.start()
+    try:
+        (created,) = backup.create_backup([engine], tmp_path / "out")
+    finally:
+        stop.set()
+        thread.join()
+    assert len(slowest) > 1 and max(slowest) < 1.0
+    copy = _restore(tmp_path / "out" / created.name, tmp_path)
+    assert copy.execute("SELECT count(*) FROM beat").fetchone()[0] >= 2000
+    engine.dispose()
@@ -0,0 +1,32 @@
+from benchmarks.__main__ import main
+from benchmarks.harness import DEFAULT_BASELINE, compare, load, registered
+
+
+def test_compare_flags_only_slowdowns_beyond_threshold():
+    baseline = {"benchmarks": {"a": {"ns_per_op": 100.0}, "b": {"ns_per_op": 100.0}}}
+    current = {
+        "benchmarks": {
+            "a": {"ns_per_op": 120.0},
+            "b": {"ns_per_op": 140.0},
+            "new": {"ns_per_op": 5.0},
+        }
+    }
+    rows = {row["name"]: row for row in compare(current, baseline, threshold=0.25)}
+    assert set(rows) == {"a", "b"}
+    assert rows["a"]["regressed"] is False
+    assert rows["b"]["regressed"] is True
+
+
+def test_missing_baseline_fails_the_gate(tmp_path, capsys):
+    args = ["-k", "auth.parse_basic", "--repeat", "1", "--out", str(tmp_path / "run.json")]
+    assert main(args + ["--baseline", str(tmp_path / "missing.json")]) == 2
+    assert "no baseline" in capsys.readouterr().err
+    assert main(args + ["--no-baseline"]) == 0
+    assert main(args + ["--baseline", str(tmp_path / "base.json"), "--save-baseline"]) == 0
+    assert main(args + ["--baseline", str(tmp_path / "base.json"), "--threshold", "100"]) == 0
+
+
+def test_committed_baseline_covers_every_benchmark():
+    baseline = load(DEFAULT_BASELINE)
+    assert baseline is not None, "record one with `python -m benchmarks --save-baseline` and commit it"
+    assert set(registered()) <= set(baseline["benchmarks"])
@@ -0,0 +1,80 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from conftest import test_engine
+from wiretide.main import app
+from wiretide.models import Device, DeviceConfig, DeviceStatus, PresenceEvent
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+
+
+def _register(hostname: str, ssh: bool = True, device_type: str = "router") -> int:
+    payload = {"hostname": hostname, "ssh_enabled": ssh, "device_type": device_type}
+    return client.post("/register", json=payload).json()["device_id"]
+
+
+def _token() -> str:
+    return client.get("/token/current").json()["shared_token"]
+
+
+def test_bulk_approve_rotates_token_once_and_reports_skips():
+    ids = [_register(f"r{i}") for i in range(5)]
+    no_ssh = _register("quiet", ssh=False)
+    untyped = _register("mystery", device_type="unknown")
+    before = _token()
+    response = client.post(
+        "/api/devices/bulk", json={"action": "approve", "device_ids": ids + [no_ssh, untyped, 9999]}, headers=ADMIN
+    )
+    result = response.json()
+    assert response.status_code == 200
+    assert result["applied"] == ids and result["token_rotated"] is True
+    assert {item["device_id"]: item["reason"] for item in result["skipped"]} == {
+        9999: "Device not found",
+        no_ssh: "Device not reachable via SSH; approval blocked",
+        untyped: "Device type must be valid and not 'unknown' before approval",
+    }
+    assert _token() != before
+    before = _token()
+    again = client.post("/api/devices/bulk", json={"action": "approve", "device_ids": ids}, headers=ADMIN).json()
+    assert again["applied"] == [] and again["token_rotated"] is False
+    assert _token() == before
+
+
+def test_bulk_block_by_selector():
+    _register("edge-1")
+    _register("Edge-2")
+    _register("core-1")
+    # Same matching as GET /api/devices: the search is case-insensitive.
+    payload = {"action": "block", "selector": {"search": "EDGE", "status": "waiting"}}
+    result = client.post("/api/devices/bulk", json=payload, headers=ADMIN).json()
+    assert len(result["applied"]) == 2
+    with Session(test_engine) as session:
+        statuses = dict(session.exec(select(Device.hostname, Device.status)).all())
+    assert statuses == {"edge-1": "blocked", "Edge-2": "blocked", "core-1": "waiting"}
+    assert client.post("/api/devices/bulk", json={"action": "block"}, headers=ADMIN).status_code == 400
+    for selector in ({}, {"search": "", "status": None}):
+        response = client.post("/api/devices/bulk", json={"action": "delete", "selector": selector}, headers=ADMIN)
+        assert response.status_code == 400
+    assert client.post("/api/devices/bulk", json={"action": "block", "device_ids": [1]}).status_code == 401
+
+
+def test_bulk_delete_cascades():
+    client.patch("/api/settings/monitoring", json={"monitoring_api_enabled": True}, headers=ADMIN)
+    ids = [_register(f"gone-{i}") for i in range(3)]
+    keep = _register("keep")
+    client.post("/api/devices/bulk", json={"action": "approve", "device_ids": ids + [keep]}, headers=ADMIN)
+    token = _token()
+    for device_id in ids + [keep]:
+        client.post("/status", json={"device_id": device_id, "dns_ok": True}, headers={"X-Shared-Token": token})
+        client.post(
+            "/api/queue-config",
+            json={"device_id": device_id, "package": "network", "package_json": {"a": 1}},
+            headers=ADMIN,
+        )
+    result = client.post("/api/devices/bulk", json={"action": "delete", "device_ids": ids}, headers=ADMIN).json()
+    assert result["applied"] == ids
+    with Session(test_engine) as session:
+        for model in (DeviceStatus, DeviceConfig, PresenceEvent):
+            assert set(session.exec(select(model.device_id)).all()) == {keep}
+        assert session.exec(select(Device.id)).all() == [keep]
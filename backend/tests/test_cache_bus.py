@@ -0,0 +1,73 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from conftest import test_engine
+from wiretide.auth import hash_password
+from wiretide.cache_bus import TOPIC_ADMIN_CREDENTIALS, BUS, CachedValue, InvalidationBus
+from wiretide.config import get_settings
+from wiretide.main import app
+from wiretide.services import get_settings_row
+
+
+client = TestClient(app)
+
+
+def test_generation_bump_invalidates_other_worker_cache():
+    worker_a = InvalidationBus(poll_interval=0)
+    worker_b = InvalidationBus(poll_interval=0)
+    loads = []
+
+    def loader(session):
+        loads.append(1)
+        return get_settings_row(session).shared_token
+
+    cached_b = CachedValue(worker_b, "controller_settings", loader)
+    with Session(test_engine) as session:
+        first = cached_b.get(session)
+        assert cached_b.get(session) == first
+        assert len(loads) == 1
+
+        row = get_settings_row(session)
+        row.shared_token = "rotated-elsewhere"
+        session.add(row)
+        worker_a.publish(session, "controller_settings")
+        session.commit()
+
+        assert cached_b.get(session) == "rotated-elsewhere"
+        assert len(loads) == 2
+
+
+def test_stale_token_cache_never_rejects_fresh_token():
+    reg = client.post("/register", json={"hostname": "bus-router", "ssh_enabled": True})
+    device_id = reg.json()["device_id"]
+    token = client.get("/token/current").json()["shared_token"]
+    assert client.post(
+        "/status", headers={"X-Shared-Token": token}, json={"device_id": device_id}
+    ).status_code == 200
+
+    # Rotate without publishing, as if another worker's bump is not yet polled.
+    with Session(test_engine) as session:
+        row = get_settings_row(session)
+        row.shared_token = "fresh-token"
+        session.add(row)
+        session.commit()
+    ok = client.post("/status", headers={"X-Shared-Token": "fresh-token"}, json={"device_id": device_id})
+    assert ok.status_code == 200
+    stale = client.post("/status", headers={"X-Shared-Token": token}, json={"device_id": device_id})
+    assert stale.status_code == 403
+
+
+def test_admin_credentials_reload_from_env_file(tmp_path, monkeypatch):
+    settings = get_settings()
+    env_file = tmp_path / "admin.env"
+    new_hash = hash_password("another-password")
+    env_file.write_text(f"WIRETIDE_ADMIN_USERNAME=admin\nWIRETIDE_ADMIN_PASSWORD_HASH={new_hash}\n")
+    monkeypatch.setattr(settings, "admin_env_path", str(env_file))
+    monkeypatch.setattr(settings, "admin_password_hash", hash_password("old-password"))
+
+    with Session(test_engine) as session:
+        InvalidationBus(poll_interval=0).publish(session, TOPIC_ADMIN_CREDENTIALS)
+        session.commit()
+        BUS.poll(session, force=True)
+
+    assert settings.admin_password_hash == new_hash
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, update
+from sqlmodel import Session, select
+
+from conftest import test_engine
+from wiretide.config import get_settings
+from wiretide.fleet import FLEET, publish_fleet_delete
+from wiretide.main import app
+from wiretide.models import Device, DeviceStatus
+from wiretide.presence import sweep_presence
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+
+
+def _register(hostname: str, device_type: str = "router") -> int:
+    payload = {"hostname": hostname, "ssh_enabled": True, "device_type": device_type}
+    return client.post("/register", json=payload).json()["device_id"]
+
+
+def _list(**params) -> dict:
+    response = client.get("/api/devices", params=params, headers=ADMIN)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_write_paths_keep_list_and_detail_current():
+    router = _register("edge-router")
+    ap = _register("Lobby-AP", device_type="access_point")
+    assert _list()["total"] == 2
+
+    client.post("/api/devices/approve", json={"device_id": ap, "device_type": "access_point"}, headers=ADMIN)
+    token = client.get("/token/current").json()["shared_token"]
+    status = {"device_id": ap, "dns_ok": True, "ntp_ok": False, "clients": [{"mac": "AA:01", "host": "phone"}]}
+    assert client.post("/status", json=status, headers={"X-Shared-Token": token}).status_code == 200
+
+    approved = _list(status="approved")
+    assert [item["id"] for item in approved["items"]] == [ap]
+    assert approved["items"][0]["status_row"]["clients"] == [{"mac": "AA:01", "host": "phone"}]
+    assert client.get(f"/api/devices/{ap}", headers=ADMIN).json()["status_row"]["ntp_ok"] is False
+    assert "phone" in client.get("/clients", headers=ADMIN).text
+
+    client.post("/api/devices/block", params={"device_id": router}, headers=ADMIN)
+    assert _list(status="blocked")["total"] == 1
+    client.delete(f"/api/devices/{router}", headers=ADMIN)
+    assert [item["id"] for item in _list()["items"]] == [ap]
+    assert client.get(f"/api/devices/{router}", headers=ADMIN).status_code == 404
+    assert client.get(f"/devices/{router}", headers=ADMIN).status_code == 404
+
+
+def test_changes_committed_by_another_worker_are_picked_up():
+    device_id = _register("remote")
+    _register("gone")
+    assert _list(search="REM")["total"] == 1
+    with Session(test_engine) as session:
+        session.exec(update(Device).where(Device.id == device_id).values(hostname="renamed"))
+        session.exec(delete(Device).where(Device.hostname == "gone"))
+        publish_fleet_delete(session)
+        session.commit()
+    assert [item["hostname"] for item in _list()["items"]] == ["renamed"]
+
+    with Session(test_engine) as session:
+        session.add(Device(hostname="inserted", device_type="switch"))
+        session.commit()
+    assert _list(device_type="switch")["items"][0]["hostname"] == "inserted"
+
+
+def test_late_commits_and_separate_status_commits_are_picked_up():
+    device_id = _register("late")
+    with Session(test_engine) as session:
+        before = FLEET.sync(session).get(device_id).version
+        # Rows re-read inside the overlap keep their version when nothing changed.
+        assert FLEET.sync(session).get(device_id).version == before
+        # Stamped before the last sync but committed after it (within the overlap).
+        stamped = datetime.now(timezone.utc) - timedelta(seconds=1)
+        session.exec(update(Device).where(Device.id == device_id).values(description="late", changed_at=stamped))
+        session.commit()
+    assert _list()["items"][0]["description"] == "late"
+
+    # The status row commits on its own, after the device row was already read.
+    with Session(test_engine) as session:
+        session.add(DeviceStatus(device_id=device_id, dns_ok=True, clients=[{"mac": "AA:02", "host": "tv"}]))
+        session.commit()
+    item = _list()["items"][0]
+    assert item["status_row"]["dns_ok"] is True and item["status_row"]["clients"][0]["host"] == "tv"
+    assert FLEET.get(device_id).version > before
+
+
+def test_presence_sweep_updates_model():
+    device_id = _register("sleepy")
+    assert _list(presence="online")["total"] == 1
+    with Session(test_engine) as session:
+        sweep_presence(session, now=datetime.now(timezone.utc) + timedelta(days=1))
+        session.commit()
+    assert [item["id"] for item in _list(presence="offline")["items"]] == [device_id]
+
+
+def test_filters_sort_and_paging_match_sql():
+    for index, hostname in enumerate(["delta", "Alpha", "charlie", "bravo", "echo"]):
+        _register(hostname, device_type="switch" if index % 2 else "router")
+    by_name = _list(sort="hostname")
+    assert [item["hostname"] for item in by_name["items"]] == ["Alpha", "bravo", "charlie", "delta", "echo"]
+    page = _list(sort="-hostname", offset=1, limit=2)
+    assert page["total"] == 5 and [item["hostname"] for item in page["items"]] == ["delta", "charlie"]
+
+    routers = _list(device_type="router", sort="-id")
+    with Session(test_engine) as session:
+        expected = session.exec(select(Device.id).where(Device.device_type == "router").order_by(Device.id.desc()))
+        assert [item["id"] for item in routers["items"]] == list(expected)
+    assert client.get("/api/devices", params={"sort": "ip_last"}, headers=ADMIN).status_code == 400
+    assert "charlie" in client.get("/devices", params={"sort": "-created_at"}, headers=ADMIN).text
+
+
+def test_model_reloads_when_generation_goes_backwards():
+    _register("before-reset")
+    assert _list()["total"] == 1
+    with Session(test_engine) as session:
+        session.exec(delete(DeviceStatus))
+        session.exec(delete(Device))
+        session.commit()
+    FLEET.generation = (FLEET.generation or 0) + 10
+    assert _list()["total"] == 0
+
+
+def test_writes_stamped_before_a_lock_wait_are_picked_up(monkeypatch):
+    waited, late = _register("waited"), _register("late")
+    untouched = _register("untouched")
+    with Session(test_engine) as session:
+        version = FLEET.sync(session).get(untouched).version
+        # Stamped before waiting out the SQLite busy timeout: older than the 2 s overlap alone.
+        stamped = datetime.now(timezone.utc) - timedelta(seconds=get_settings().sqlite_busy_timeout + 1)
+        session.exec(update(Device).where(Device.id == waited).values(status="blocked", changed_at=stamped))
+        # Committed far past any overlap: only the periodic reconcile finds it.
+        stamped = datetime.now(timezone.utc) - timedelta(hours=1)
+        session.exec(update(Device).where(Device.id == late).values(status="blocked", changed_at=stamped))
+        session.commit()
+    assert [item["id"] for item in _list(status="blocked")["items"]] == [waited]
+    monkeypatch.setattr(get_settings(), "fleet_reconcile_interval", 0.0)
+    assert [item["id"] for item in _list(status="blocked")["items"]] == [waited, late]
+    assert FLEET.get(untouched).version == version
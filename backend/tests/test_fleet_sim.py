@@ -0,0 +1,53 @@
+import asyncio
+
+import httpx
+from sqlmodel import SQLModel, Session, create_engine
+
+from loadtest.fleet_sim import SimConfig, percentile, run_simulation
+from wiretide.db import get_session
+from wiretide.main import app
+from wiretide.services import ensure_settings_seeded
+
+
+def test_percentile_nearest_rank():
+    values = sorted(float(v) for v in range(1, 101))
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 95) == 0.0
+
+
+def test_simulation_runs_agent_contract_against_app(tmp_path, monkeypatch):
+    # Concurrent virtual agents need a real file DB; the shared in-memory
+    # StaticPool connection is not safe across threadpool workers.
+    engine = create_engine(f"sqlite:///{tmp_path / 'sim.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        ensure_settings_seeded(session)
+
+    def file_session():
+        with Session(engine) as session:
+            yield session
+
+    monkeypatch.setitem(app.dependency_overrides, get_session, file_session)
+    config = SimConfig(
+        agents=2,
+        duration=0.6,
+        interval=0.1,
+        approvals=1,
+        config_every=0.2,
+        max_clients=5,
+        admin_token="test-admin",
+    )
+
+    async def _run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://fleet-sim") as client:
+            return await run_simulation(client, config)
+
+    result = asyncio.run(_run())
+    endpoints = result["endpoints"]
+    assert endpoints["POST /register"]["count"] >= 2
+    assert endpoints["POST /status"]["count"] >= 2
+    assert "p95_ms" in endpoints["POST /status"]
+    assert endpoints["POST /api/devices/approve"]["status_codes"] == {"200": 1}
+    assert result["error_rate"] == 0.0
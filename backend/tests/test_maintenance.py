@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, create_engine, select, text
+
+from conftest import test_engine
+from wiretide.config import get_settings
+from wiretide.db import maintain_database, prefer_incremental_vacuum
+from wiretide.main import app
+from wiretide.maintenance import perform_maintenance
+from wiretide.models import DeviceConfig, MaintenanceRun, PresenceEvent, RolloutTarget, SecurityEvent, UpdateRollout
+from wiretide.updates import UPDATE_PACKAGE
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+NOW = datetime(2026, 6, 1, tzinfo=timezone.utc)
+
+
+def _config(device_id: int, created_at: datetime) -> DeviceConfig:
+    return DeviceConfig(device_id=device_id, package="network", package_json={}, sha256="x", created_at=created_at)
+
+
+def _seed() -> int:
+    device_id = client.post("/register", json={"hostname": "keep"}).json()["device_id"]
+    old, recent = NOW - timedelta(days=400), NOW - timedelta(days=1)
+    with Session(test_engine) as session:
+        session.add_all([_config(device_id, old), _config(device_id, recent), _config(device_id + 99, recent)])
+        session.add_all(
+            PresenceEvent(device_id=device_id, previous="online", presence="offline", at=at) for at in (old, recent)
+        )
+        session.add_all(
+            SecurityEvent(
+                device_id=device_id, event_type="ssh_failure", fingerprint=str(i), bucket=at, first_seen=at, last_seen=at
+            )
+            for i, at in enumerate((old, old, recent))
+        )
+        session.commit()
+    return device_id
+
+
+def test_pass_prunes_each_table_in_batches_and_records_run(monkeypatch):
+    monkeypatch.setattr(get_settings(), "maintenance_batch_size", 1)
+    _seed()
+    with Session(test_engine) as session:
+        run = perform_maintenance(session, NOW)
+        assert run.rows_deleted == {"deviceconfig_orphaned": 1, "deviceconfig": 1, "securityevent": 2, "presenceevent": 1}
+        assert run.error is None and run.finished_at is not None
+        assert len(session.exec(select(DeviceConfig)).all()) == 1
+        assert session.exec(select(PresenceEvent).where(PresenceEvent.at < NOW - timedelta(days=90))).all() == []
+        assert len(session.exec(select(SecurityEvent)).all()) == 1
+        assert len(session.exec(select(MaintenanceRun)).all()) == 1
+
+
+def test_pending_rollout_update_is_not_pruned_by_age():
+    device_id = client.post("/register", json={"hostname": "offline-ap"}).json()["device_id"]
+    old = NOW - timedelta(days=400)
+    with Session(test_engine) as session:
+        rollout = UpdateRollout(version="2.0.0", artifact_sha256="a" * 64)
+        session.add(rollout)
+        session.flush()
+        session.add(RolloutTarget(rollout_id=rollout.id, device_id=device_id, assigned_at=old))
+        update = _config(device_id, old)
+        update.package = UPDATE_PACKAGE
+        session.add(update)
+        session.commit()
+        assert "deviceconfig" not in perform_maintenance(session, NOW).rows_deleted
+        session.exec(select(RolloutTarget)).one().state = "failed"
+        session.commit()
+        assert perform_maintenance(session, NOW).rows_deleted["deviceconfig"] == 1
+
+
+def test_admin_endpoints_trigger_and_list_runs():
+    assert client.post("/api/maintenance/run").status_code == 401
+    response = client.post("/api/maintenance/run", headers=ADMIN)
+    assert response.status_code == 200
+    assert response.json()["error"] is None
+    runs = client.get("/api/maintenance/runs", headers=ADMIN).json()
+    assert [run["id"] for run in runs] == [response.json()["id"]]
+
+
+def test_incremental_vacuum_returns_free_pages(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'vacuum.db'}")
+    prefer_incremental_vacuum(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE blob (data TEXT)"))
+        conn.execute(
+            text(
+                "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 200) "
+                "INSERT INTO blob SELECT hex(randomblob(2000)) FROM n"
+            )
+        )
+        conn.execute(text("DELETE FROM blob"))
+    result = maintain_database(engine, vacuum_pages=50)
+    assert result["auto_vacuum"] == "incremental"
+    assert result["pages_reclaimed"] == 50
+    assert maintain_database(engine)["pages_reclaimed"] == result["free_pages"] > 0
+    engine.dispose()
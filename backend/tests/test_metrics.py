@@ -0,0 +1,40 @@
+from fastapi.testclient import TestClient
+
+from wiretide.main import app
+from wiretide.metrics import Histogram
+
+
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    hist.observe(0.05, "/a")
+    hist.observe(0.5, "/a")
+    hist.observe(3.0, "/a")
+    lines = hist.render()
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{route="/a"} 3' in lines
+
+
+def test_metrics_endpoint_reports_routes_heartbeats_and_fleet():
+    assert client.get("/metrics").status_code == 401
+
+    reg = client.post("/register", json={"hostname": "metrics-router", "ssh_enabled": True})
+    device_id = reg.json()["device_id"]
+    client.post("/status", json={"device_id": device_id, "dns_ok": True})
+    client.get(f"/api/devices/{device_id}", headers={"X-Admin-Token": "test-admin"})
+
+    resp = client.get("/metrics", headers={"X-Admin-Token": "test-admin"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    body = resp.text
+    assert 'wiretide_http_requests_total{method="POST",route="/status",status="200"}' in body
+    # Route templates keep label cardinality bounded.
+    assert 'route="/api/devices/{device_id}"' in body
+    assert "wiretide_heartbeats_total " in body
+    assert 'wiretide_db_queries_per_request_count{route="/status"}' in body
+    assert "wiretide_config_queue_depth 0" in body
+    assert 'wiretide_devices{status="waiting",device_type="unknown"} 1' in body
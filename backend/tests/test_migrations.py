@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect
+from sqlmodel import SQLModel, Session, create_engine, func, select
+
+from wiretide.db import get_session, instrument_engine
+from wiretide.main import app
+from wiretide.migrations import upgrade_schema
+from wiretide.models import Device, DeviceConfig, DeviceStatus
+from wiretide.services import ensure_settings_seeded
+
+# `device` and `devicestatus` as created by releases before presence, the unique keys and `changed_at`.
+OLD_TABLES = (
+    """CREATE TABLE device (
+        id INTEGER NOT NULL PRIMARY KEY, hostname VARCHAR NOT NULL, description VARCHAR,
+        device_type VARCHAR NOT NULL, status VARCHAR NOT NULL, approved BOOLEAN NOT NULL,
+        last_seen DATETIME, ssh_enabled BOOLEAN NOT NULL, ssh_fingerprint VARCHAR,
+        agent_version VARCHAR, agent_update_allowed BOOLEAN NOT NULL, ip_last VARCHAR,
+        created_at DATETIME NOT NULL)""",
+    """CREATE TABLE devicestatus (
+        id INTEGER NOT NULL PRIMARY KEY, device_id INTEGER NOT NULL REFERENCES device (id),
+        dns_ok BOOLEAN NOT NULL, ntp_ok BOOLEAN NOT NULL, firewall_profile_active VARCHAR,
+        security_log_samples JSON, clients JSON, updated_at DATETIME NOT NULL)""",
+)
+
+
+@pytest.fixture
+def old_engine(tmp_path, monkeypatch):
+    engine = instrument_engine(
+        create_engine(f"sqlite:///{tmp_path / 'old.db'}", connect_args={"check_same_thread": False})
+    )
+    now = datetime(2024, 1, 1).isoformat(" ")
+    with engine.begin() as conn:
+        for ddl in OLD_TABLES:
+            conn.exec_driver_sql(ddl)
+        for device_id, hostname in ((1, "edge"), (2, "edge"), (3, "core")):
+            conn.exec_driver_sql(
+                "INSERT INTO device VALUES (?, ?, NULL, 'router', 'waiting', 0, NULL, 0, NULL, NULL, 0, NULL, ?)",
+                (device_id, hostname, now),
+            )
+        for status_id, device_id, dns_ok in ((1, 1, 0), (2, 1, 1), (3, 2, 1)):
+            conn.exec_driver_sql(
+                "INSERT INTO devicestatus VALUES (?, ?, ?, 0, NULL, NULL, NULL, ?)", (status_id, device_id, dns_ok, now)
+            )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(DeviceConfig(device_id=2, package="{}", package_json={}, sha256="0" * 64))
+        ensure_settings_seeded(session)
+        session.commit()
+
+    def old_session():
+        with Session(engine) as session:
+            yield session
+
+    monkeypatch.setitem(app.dependency_overrides, get_session, old_session)
+    yield engine
+    engine.dispose()
+
+
+def test_old_database_is_upgraded_once(old_engine):
+    assert upgrade_schema(old_engine)
+    assert upgrade_schema(old_engine) == []
+
+    inspector = inspect(old_engine)
+    assert {"presence", "presence_changed_at", "changed_at"} <= {c["name"] for c in inspector.get_columns("device")}
+    device_indexes = {index["name"]: index for index in inspector.get_indexes("device")}
+    assert device_indexes["ix_device_hostname"]["unique"]
+    assert {"ix_device_changed_at", "ix_device_presence_last_seen"} <= set(device_indexes)
+    status_indexes = {index["name"]: index for index in inspector.get_indexes("devicestatus")}
+    assert status_indexes["ix_devicestatus_device_id"]["unique"]
+    assert "ix_devicestatus_updated_at" in status_indexes
+
+    with Session(old_engine) as session:
+        # The oldest device per hostname survives; the duplicate goes with its dependent rows.
+        assert session.exec(select(Device.id).order_by(Device.id)).all() == [1, 3]
+        assert session.exec(select(func.count()).select_from(DeviceConfig)).one() == 0
+        status = session.exec(select(DeviceStatus)).one()
+        assert (status.id, status.dns_ok) == (2, True)
+        assert session.get(Device, 1).presence == "unknown"
+
+    client = TestClient(app)
+    response = client.post("/register", json={"hostname": "edge", "agent_version": "2.0"})
+    assert response.status_code == 200 and response.json()["device_id"] == 1
+    assert client.post("/status", json={"device_id": 1, "ntp_ok": True}).status_code == 200
+    with Session(old_engine) as session:
+        assert session.exec(select(func.count()).select_from(DeviceStatus)).one() == 1
+
+
+def test_current_database_needs_no_steps(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    SQLModel.metadata.create_all(engine)
+    assert upgrade_schema(engine) == []
+    engine.dispose()
@@ -0,0 +1,120 @@
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from wiretide.config import get_settings
+from wiretide.main import app
+
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+
+
+def _lines(resp):
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert rows[-1]["kind"] == "cursor"
+    return rows[:-1], rows[-1]
+
+
+def _enable():
+    client.patch("/api/settings/monitoring", json={"monitoring_api_enabled": True}, headers=ADMIN)
+
+
+def test_disabled_monitoring_api_is_hidden():
+    assert client.get("/api/monitoring/events", headers=ADMIN).status_code == 404
+
+
+def test_stream_resumes_from_cursor_and_filters():
+    _enable()
+    device_id = client.post("/register", json={"hostname": "mon-router"}).json()["device_id"]
+    client.post(
+        "/status",
+        json={"device_id": device_id, "security_log_samples": {"ssh_failures": ["Failed password for root"]}},
+    )
+
+    live = {"settled": "false"}
+    items, trailer = _lines(client.get("/api/monitoring/events", params=live, headers=ADMIN))
+    assert [(i["kind"], i["type"]) for i in items] == [
+        ("presence", "presence_online"),
+        ("security", "ssh_failures"),
+    ]
+    assert items[1]["device_name"] == "mon-router"
+
+    # Nothing new after the cursor.
+    items, again = _lines(
+        client.get("/api/monitoring/events", params={**live, "cursor": trailer["cursor"]}, headers=ADMIN)
+    )
+    assert items == [] and again["cursor"] == trailer["cursor"]
+
+    client.post(
+        "/status",
+        json={"device_id": device_id, "security_log_samples": {"events": [{"type": "firewall_drop", "src": "x"}]}},
+    )
+    items, _ = _lines(
+        client.get("/api/monitoring/events", params={**live, "cursor": trailer["cursor"]}, headers=ADMIN)
+    )
+    assert [i["type"] for i in items] == ["firewall_drop"]
+
+    items, _ = _lines(client.get("/api/monitoring/events", params={"type": "presence_online"}, headers=ADMIN))
+    assert [i["kind"] for i in items] == ["presence"]
+    items, _ = _lines(
+        client.get("/api/monitoring/events", params={"device_id": device_id + 1}, headers=ADMIN)
+    )
+    assert items == []
+
+    items, head = _lines(client.get("/api/monitoring/events", params={"cursor": "now"}, headers=ADMIN))
+    assert items == [] and head["cursor"] != "s0-p0"
+    assert client.get("/api/monitoring/events", params={"cursor": "bogus"}, headers=ADMIN).status_code == 400
+
+
+def test_security_rows_are_streamed_once_their_bucket_is_final(monkeypatch):
+    _enable()
+    monkeypatch.setattr(get_settings(), "security_event_bucket_seconds", 1)
+    monkeypatch.setattr(get_settings(), "security_event_settle_seconds", 0.2)
+    device_id = client.post("/register", json={"hostname": "mon-settle"}).json()["device_id"]
+    samples = {"events": [{"type": "firewall_drop", "src": "x"}, {"type": "firewall_drop", "src": "x"}]}
+    client.post("/status", json={"device_id": device_id, "security_log_samples": samples})
+    params = {"type": "firewall_drop"}
+
+    items, trailer = _lines(client.get("/api/monitoring/events", params=params, headers=ADMIN))
+    assert items == [] and trailer["cursor"] == "s0-p0"
+    time.sleep(1.3)
+    items, trailer = _lines(client.get("/api/monitoring/events", params=params, headers=ADMIN))
+    assert [i["count"] for i in items] == [2]
+
+    # A late report, backdated into the delivered bucket, opens a new row instead of growing the old one.
+    backdated = {"events": [{"type": "firewall_drop", "src": "x", "ts": items[0]["time"]}]}
+    client.post("/status", json={"device_id": device_id, "security_log_samples": backdated})
+    params["cursor"] = trailer["cursor"]
+    assert _lines(client.get("/api/monitoring/events", params=params, headers=ADMIN))[0] == []
+    time.sleep(1.3)
+    late, _ = _lines(client.get("/api/monitoring/events", params=params, headers=ADMIN))
+    assert [(i["count"], i["time"]) for i in late] == [(1, items[0]["time"])]
+    assert late[0]["id"] > items[0]["id"]
+
+
+def test_paging_by_limit():
+    _enable()
+    for i in range(5):
+        client.post("/register", json={"hostname": f"mon-{i}"})
+    cursor, seen = None, []
+    while True:
+        params = {"limit": 2, "type": "presence_online"}
+        if cursor:
+            params["cursor"] = cursor
+        items, trailer = _lines(client.get("/api/monitoring/events", params=params, headers=ADMIN))
+        seen += [i["device_name"] for i in items]
+        cursor = trailer["cursor"]
+        if not trailer["more"]:
+            break
+    assert seen == [f"mon-{i}" for i in range(5)]
+
+
+def test_bearer_token_access(monkeypatch):
+    _enable()
+    monkeypatch.setattr(get_settings(), "monitoring_api_token", "ai-token")
+    assert client.get("/api/monitoring/events", headers={"Authorization": "Bearer ai-token"}).status_code == 200
+    assert client.get("/api/monitoring/events", headers={"Authorization": "Bearer nope"}).status_code == 401
@@ -0,0 +1,74 @@
+import json
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from conftest import test_engine
+from wiretide.config import get_settings
+from wiretide.main import app
+from wiretide.models import Device, PreRegistration
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+FP = "SHA256:abc"
+
+
+def _ndjson(*rows) -> str:
+    return "\n".join(json.dumps(row) for row in rows)
+
+
+def test_ndjson_import_reports_per_row_results(monkeypatch):
+    monkeypatch.setattr(get_settings(), "import_chunk_size", 2)
+    body = _ndjson(
+        {"hostname": "r1", "device_type": "router", "ssh_fingerprint": FP},
+        {"hostname": "r2", "device_type": "router", "ssh_fingerprint": FP, "description": "lab"},
+        {"hostname": "bad", "device_type": "toaster", "ssh_fingerprint": FP},
+        {"hostname": "r1", "device_type": "router", "ssh_fingerprint": FP},
+        {"hostname": "r3", "device_type": "switch"},
+    ) + "\nnot json\n"
+    assert client.post("/api/devices/import", content=body).status_code == 401
+    result = client.post("/api/devices/import", content=body, headers=ADMIN).json()
+    assert (result["created"], result["updated"], result["errors"]) == (2, 0, 4)
+    assert [(row["line"], row["result"]) for row in result["rows"]] == [
+        (1, "created"), (2, "created"), (3, "error"), (4, "error"), (5, "error"), (6, "error")
+    ]
+    again = client.post("/api/devices/import", content=body, headers=ADMIN).json()
+    assert (again["created"], again["updated"]) == (0, 2)
+    listed = client.get("/api/preregistrations", headers=ADMIN).json()
+    assert [(row["hostname"], row["description"]) for row in listed] == [("r1", None), ("r2", "lab")]
+
+
+def test_first_register_with_matching_fingerprint_is_approved():
+    csv_body = (
+        "hostname,device_type,description,ssh_fingerprint\n"
+        "ap-1,access_point,Hall,SHA256:abc\n"
+        "ap-2,access_point,,SHA256:abc\n"
+    )
+    result = client.post(
+        "/api/devices/import", content=csv_body, headers={**ADMIN, "Content-Type": "text/csv"}
+    ).json()
+    assert result["created"] == 2
+
+    ok = client.post("/register", json={"hostname": "ap-1", "ssh_enabled": True, "ssh_fingerprint": FP}).json()
+    assert (ok["status"], ok["approved"], ok["device_type"]) == ("approved", True, "access_point")
+    wrong = client.post("/register", json={"hostname": "ap-2", "ssh_enabled": True, "ssh_fingerprint": "x"}).json()
+    assert wrong["status"] == "waiting"
+    with Session(test_engine) as session:
+        assert session.get(Device, ok["device_id"]).description == "Hall"
+        claimed = session.exec(select(PreRegistration).where(PreRegistration.hostname == "ap-1")).one()
+        assert claimed.device_id == ok["device_id"] and claimed.claimed_at is not None
+
+
+def test_import_approves_devices_that_registered_first():
+    waiting = client.post("/register", json={"hostname": "sw-1", "ssh_enabled": True, "ssh_fingerprint": FP}).json()
+    client.post("/register", json={"hostname": "sw-2", "ssh_enabled": False, "ssh_fingerprint": FP})
+    body = _ndjson(
+        {"hostname": "sw-1", "device_type": "switch", "ssh_fingerprint": FP},
+        {"hostname": "sw-2", "device_type": "switch", "ssh_fingerprint": FP},
+    )
+    result = client.post("/api/devices/import", content=body, headers=ADMIN).json()
+    assert [row["approved"] for row in result["rows"]] == [True, False]
+    device = client.get(f"/api/devices/{waiting['device_id']}", headers=ADMIN).json()
+    assert (device["status"], device["device_type"]) == ("approved", "switch")
+    unclaimed = client.get("/api/preregistrations?unclaimed=true", headers=ADMIN).json()
+    assert [row["hostname"] for row in unclaimed] == ["sw-2"]
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from conftest import test_engine
+from wiretide.main import app
+from wiretide.models import Device, PresenceEvent
+from wiretide.presence import sweep_presence
+
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+
+
+def _register(hostname: str) -> int:
+    return client.post("/register", json={"hostname": hostname, "ssh_enabled": True}).json()["device_id"]
+
+
+def _events(device_id: int):
+    with Session(test_engine) as session:
+        rows = session.exec(
+            select(PresenceEvent).where(PresenceEvent.device_id == device_id).order_by(PresenceEvent.id)
+        ).all()
+        return [(row.previous, row.presence) for row in rows]
+
+
+def test_heartbeats_only_write_on_transition():
+    device_id = _register("presence-a")
+    for _ in range(3):
+        assert client.post("/status", json={"device_id": device_id}).status_code == 200
+    assert _events(device_id) == [("unknown", "online")]
+    body = client.get(f"/api/devices/{device_id}", headers=ADMIN).json()
+    assert body["presence"] == "online"
+
+
+def test_sweeper_demotes_and_heartbeat_recovers():
+    quiet = _register("presence-quiet")
+    gone = _register("presence-gone")
+    fresh = _register("presence-fresh")
+    now = datetime.now(timezone.utc)
+    with Session(test_engine) as session:
+        session.get(Device, quiet).last_seen = now - timedelta(seconds=120)
+        session.get(Device, gone).last_seen = now - timedelta(seconds=600)
+        session.commit()
+        assert sweep_presence(session, now) == {"stale": 1, "offline": 1}
+        session.commit()
+        # Idempotent: a second sweep (e.g. another worker) changes nothing.
+        assert sweep_presence(session, now) == {"stale": 0, "offline": 0}
+        session.commit()
+
+    summary = client.get("/api/presence", headers=ADMIN).json()
+    assert summary["counts"]["online"] == 1
+    assert summary["counts"]["stale"] == 1
+    assert summary["counts"]["offline"] == 1
+
+    offline = client.get("/api/devices", params={"presence": "offline"}, headers=ADMIN).json()
+    assert [item["id"] for item in offline["items"]] == [gone]
+    assert client.get("/api/devices", params={"presence": "bogus"}, headers=ADMIN).status_code == 400
+
+    client.post("/status", json={"device_id": gone})
+    assert _events(gone) == [("unknown", "online"), ("online", "offline"), ("offline", "online")]
+    events = client.get("/api/presence/events", params={"device_id": quiet}, headers=ADMIN).json()
+    assert [(e["previous"], e["presence"]) for e in events] == [("online", "stale"), ("unknown", "online")]
+    assert fresh not in [e["device_id"] for e in events]
@@ -0,0 +1,100 @@
+import dataclasses
+import json
+import os
+import pstats
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from wiretide.config import get_settings
+from wiretide import profiling
+from wiretide.main import app
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "profile_dir", str(tmp_path))
+    return tmp_path
+
+
+def _arm(**payload):
+    response = client.post("/api/profiler/arm", json=payload, headers=ADMIN)
+    assert response.status_code == 200
+    return response.json()
+
+
+def _functions(path):
+    return {name for _, _, name in pstats.Stats(str(path)).stats}
+
+
+def test_armed_budget_captures_exactly_n_matching_requests(profile_dir):
+    client.get("/api/devices", headers=ADMIN)
+    assert list(profile_dir.iterdir()) == []
+
+    state = _arm(pattern="/api/devices", method="get", count=2)
+    assert state["armed"]["remaining"] == 2 and state["armed"]["method"] == "GET"
+    client.get("/api/settings", headers=ADMIN)
+    for _ in range(3):
+        assert client.get("/api/devices", headers=ADMIN).status_code == 200
+
+    captures = client.get("/api/profiler", headers=ADMIN).json()
+    assert captures["armed"] is None
+    assert [c["route"] for c in captures["captures"]] == ["/api/devices", "/api/devices"]
+    stats = sorted(profile_dir.glob("*.pstats"))
+    assert len(stats) == 2
+    assert "list_devices" in _functions(stats[0])
+
+
+def test_write_units_on_the_writer_are_included(profile_dir):
+    _arm(pattern="/register", count=1)
+    assert client.post("/register", json={"hostname": "prof"}).status_code == 200
+    (stats,) = profile_dir.glob("*.pstats")
+    assert "register_device_impl" in _functions(stats)
+
+
+def test_sample_mode_writes_collapsed_stacks(profile_dir, monkeypatch):
+    monkeypatch.setattr(get_settings(), "profile_sample_interval", 0.0005)
+    _arm(pattern="/api/devices*", count=1, mode="sample")
+    client.get("/api/devices", headers=ADMIN)
+    (collapsed,) = profile_dir.glob("*.collapsed")
+    (meta,) = client.get("/api/profiler", headers=ADMIN).json()["captures"]
+    assert meta["mode"] == "sample" and meta["name"] == collapsed.name
+    assert f"-{os.getpid()}-" in meta["name"]
+    for line in collapsed.read_text().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
+
+
+def test_disarm_and_capture_download(profile_dir):
+    _arm(pattern="/api/devices", count=5)
+    client.get("/api/devices", headers=ADMIN)
+    assert client.delete("/api/profiler/arm", headers=ADMIN).json()["armed"] is None
+    client.get("/api/devices", headers=ADMIN)
+    (meta,) = client.get("/api/profiler", headers=ADMIN).json()["captures"]
+
+    assert client.get(f"/api/profiler/captures/{meta['name']}").status_code == 401
+    download = client.get(f"/api/profiler/captures/{meta['name']}", headers=ADMIN)
+    assert download.status_code == 200
+    assert download.content == (profile_dir / meta["name"]).read_bytes()
+    sidecar = meta["name"].replace(".pstats", ".json")
+    assert json.loads(client.get(f"/api/profiler/captures/{sidecar}", headers=ADMIN).content) == meta
+    assert client.get("/api/profiler/captures/..%2Fwiretide.db", headers=ADMIN).status_code == 404
+    assert client.post("/api/profiler/arm", json={"pattern": "/x", "count": 0}, headers=ADMIN).status_code == 422
+
+
+def test_unmatched_or_expired_arm_stays_off_the_request_path(profile_dir, monkeypatch):
+    _arm(pattern="/nomatch*", count=5)
+    client.get("/health")
+    assert profiling.PROFILER.armed is not None
+    claims = []
+    monkeypatch.setattr(profiling, "_claim", lambda *args: claims.append(args))
+    for _ in range(3):
+        assert client.get("/health").status_code == 200
+    past = datetime.now(timezone.utc) - timedelta(seconds=1)
+    profiling.PROFILER.armed = dataclasses.replace(profiling.PROFILER.armed, expires_at=past)
+    client.get("/health")
+    assert claims == [] and profiling.PROFILER.armed is None
@@ -0,0 +1,41 @@
+import logging
+
+from fastapi.testclient import TestClient
+
+from wiretide.config import get_settings
+from wiretide.main import app
+from wiretide.querystats import fingerprint, normalize_statement
+
+
+client = TestClient(app)
+
+
+def test_normalize_statement_collapses_literals_and_in_lists():
+    a = "SELECT * FROM device WHERE id IN (?, ?, ?) AND hostname = 'x'"
+    b = "SELECT *   FROM device WHERE id IN (?) AND hostname = 'other'"
+    assert normalize_statement(a) == "SELECT * FROM device WHERE id IN (...) AND hostname = ?"
+    assert fingerprint(a) == fingerprint(b)
+
+
+def test_db_debug_header_and_fingerprint_stats(monkeypatch):
+    monkeypatch.setattr(get_settings(), "db_debug_header", True)
+    client.delete("/api/admin/db-stats", headers={"X-Admin-Token": "test-admin"})
+
+    reg = client.post("/register", json={"hostname": "stats-router", "ssh_enabled": True})
+    header = reg.headers["x-wiretide-db"]
+    fields = dict(part.split("=") for part in header.split(";"))
+    assert int(fields["queries"]) >= 2
+    assert float(fields["time_ms"]) >= 0
+
+    stats = client.get("/api/admin/db-stats", headers={"X-Admin-Token": "test-admin"})
+    assert stats.status_code == 200
+    statements = stats.json()["statements"]
+    assert any(s["statement"].startswith("INSERT INTO device") for s in statements)
+
+
+def test_slow_query_log_includes_plan(monkeypatch, caplog):
+    monkeypatch.setattr(get_settings(), "slow_query_ms", 0.0)
+    with caplog.at_level(logging.WARNING, logger="wiretide.slow_query"):
+        client.get("/api/devices", headers={"X-Admin-Token": "test-admin"})
+    messages = [r.getMessage() for r in caplog.records]
+    assert any("slow query" in m and "plan:" in m for m in messages)
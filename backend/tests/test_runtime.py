@@ -0,0 +1,44 @@
+from fastapi.testclient import TestClient
+
+from wiretide import runtime
+from wiretide.config import get_settings
+from wiretide.main import app
+from wiretide.runtime import plan_runtime
+
+client = TestClient(app)
+
+
+def test_worker_count_follows_cores_and_db_mode():
+    assert plan_runtime(1, "sqlite:///x.db").workers == 1
+    assert plan_runtime(32, "sqlite:///x.db").workers == runtime.SQLITE_MAX_WORKERS
+    assert plan_runtime(8, "postgresql://db/wiretide").workers == 8
+    assert plan_runtime(64, "postgresql://db/wiretide").workers == runtime.MAX_WORKERS
+    assert plan_runtime(8, "sqlite:///x.db", workers=6).workers == 6
+
+
+def test_optional_accelerators_and_socket_limits():
+    fast = plan_runtime(4, "sqlite:///x.db", uvloop=True, httptools=True, listen_backlog=65535)
+    assert (fast.loop, fast.http, fast.backlog) == ("uvloop", "httptools", runtime.MAX_BACKLOG)
+    plain = plan_runtime(4, "sqlite:///x.db", uvloop=False, httptools=False, listen_backlog=64)
+    assert (plain.loop, plain.http, plain.backlog) == ("asyncio", "h11", 128)
+    assert plain.keepalive_timeout > runtime.NGINX_KEEPALIVE_TIMEOUT
+    assert plain.nginx_keepalive == 32
+
+
+def test_plan_cli_writes_env_file_lines(capsys):
+    assert runtime.main(["plan", "--cpus", "2", "--database-url", "sqlite:///x.db"]) == 0
+    env = dict(line.split("=", 1) for line in capsys.readouterr().out.splitlines())
+    assert env["WIRETIDE_SERVER_WORKERS"] == "2"
+    assert env["WIRETIDE_RUNTIME_PROFILE"] == "production"
+
+
+def test_health_reports_runtime(monkeypatch):
+    launched = {"runtime_profile": "production", "server_workers": 3, "server_loop": "uvloop", "server_http": "httptools"}
+    for field, value in launched.items():
+        monkeypatch.setattr(get_settings(), field, value)
+    body = client.get("/health").json()
+    assert body["status"] == "ok"
+    reported = body["runtime"]
+    assert reported["profile"] == "production" and reported["workers"] == 3
+    assert (reported["loop"], reported["http"], reported["db_mode"]) == ("uvloop", "httptools", "sqlite")
+    assert reported["cpus"] >= 1 and reported["active_loop"] in ("asyncio", "uvloop")
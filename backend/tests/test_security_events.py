@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from conftest import test_engine
+from wiretide.config import get_settings
+from wiretide.main import app
+from wiretide.models import SecurityEvent
+from wiretide.security_events import TRUNCATED_EVENT_TYPE, prune_security_events
+
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+
+
+def _setup_device() -> int:
+    client.patch("/api/settings/monitoring", json={"monitoring_api_enabled": True}, headers=ADMIN)
+    return client.post("/register", json={"hostname": "sec-router", "ssh_enabled": True}).json()["device_id"]
+
+
+def _events():
+    with Session(test_engine) as session:
+        return session.exec(select(SecurityEvent).order_by(SecurityEvent.id)).all()
+
+
+def test_ingest_disabled_without_monitoring_api():
+    device_id = client.post("/register", json={"hostname": "quiet"}).json()["device_id"]
+    client.post("/status", json={"device_id": device_id, "security_log_samples": {"ssh_failures": ["x"]}})
+    assert _events() == []
+    assert client.get("/api/security/events", headers=ADMIN).status_code == 404
+
+
+def test_events_are_deduplicated_per_bucket_and_accumulate():
+    device_id = _setup_device()
+    samples = {
+        "dropped": 12,  # counters stay in the status snapshot only
+        "ssh_failures": [f"Failed password for root from 203.0.113.9 port {p}" for p in range(40000, 40005)],
+        "events": [
+            {"type": "firewall_drop", "src": "198.51.100.7", "dst": "10.0.0.1", "severity": "low"},
+            {"type": "wifi_auth_failure", "src": "aa:bb:cc:dd:ee:ff", "tags": ["wpa2"]},
+        ],
+    }
+    for _ in range(2):
+        client.post("/status", json={"device_id": device_id, "security_log_samples": samples})
+
+    counts = {row.event_type: row.count for row in _events()}
+    assert counts == {"ssh_failures": 10, "firewall_drop": 2, "wifi_auth_failure": 2}
+
+    listed = client.get(
+        "/api/security/events", params={"device_id": device_id, "event_type": "firewall_drop"}, headers=ADMIN
+    ).json()
+    assert [(e["src"], e["dst"], e["count"]) for e in listed] == [("198.51.100.7", "10.0.0.1", 2)]
+
+
+def test_flood_cost_is_flat(monkeypatch):
+    device_id = _setup_device()
+    monkeypatch.setattr(get_settings(), "db_debug_header", True)
+
+    def queries(n: int) -> int:
+        lines = [f"Failed password for user{i} from 192.0.2.{i % 250} port {i}" for i in range(n)]
+        resp = client.post("/status", json={"device_id": device_id, "security_log_samples": {"ssh_failures": lines}})
+        assert resp.status_code == 200
+        return int(resp.headers["x-wiretide-db"].split(";")[0].split("=")[1])
+
+    small = queries(10)
+    flood = queries(20000)
+    assert flood <= small + 6
+
+    truncated = [row for row in _events() if row.event_type == TRUNCATED_EVENT_TYPE]
+    assert truncated and truncated[0].count == 20000 - get_settings().security_events_max_per_report
+
+
+def test_retention_prune():
+    device_id = _setup_device()
+    client.post("/status", json={"device_id": device_id, "security_log_samples": {"ssh_failures": ["old"]}})
+    with Session(test_engine) as session:
+        assert prune_security_events(session) == 0
+        future = datetime.now(timezone.utc) + timedelta(days=get_settings().security_event_retention_days + 1)
+        assert prune_security_events(session, now=future) == 1
+    assert _events() == []
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from wiretide import write_queue
+from wiretide.db import (
+    create_writer_engine,
+    get_session,
+    instrument_engine,
+    maintain_database,
+    telemetry_binds,
+    telemetry_tables,
+)
+from wiretide.main import app
+from wiretide.models import Device, DeviceStatus
+from wiretide.services import ensure_settings_seeded
+
+ADMIN = {"X-Admin-Token": "test-admin"}
+
+
+@pytest.fixture(params=["pooled", "write_queue"])
+def split(request, tmp_path, monkeypatch):
+    """Inventory and telemetry in two SQLite files, as with WIRETIDE_TELEMETRY_DATABASE_URL."""
+    main_url = f"sqlite:///{tmp_path / 'wiretide.db'}"
+    telemetry_url = f"sqlite:///{tmp_path / 'telemetry.db'}"
+    main = instrument_engine(create_engine(main_url, connect_args={"check_same_thread": False}))
+    telemetry = instrument_engine(create_engine(telemetry_url, connect_args={"check_same_thread": False}))
+    tables = telemetry_tables()
+    SQLModel.metadata.create_all(main, tables=[t for t in SQLModel.metadata.sorted_tables if t not in tables])
+    SQLModel.metadata.create_all(telemetry, tables=tables)
+    with Session(main) as session:
+        ensure_settings_seeded(session)
+
+    def split_session():
+        with Session(main, binds=telemetry_binds(telemetry)) as session:
+            yield session
+
+    monkeypatch.setitem(app.dependency_overrides, get_session, split_session)
+    if request.param == "write_queue":
+        write_queue.start_write_queue(
+            create_writer_engine(main_url), telemetry_bind=create_writer_engine(telemetry_url)
+        )
+    yield main, telemetry
+    write_queue.stop_write_queue()
+    main.dispose()
+    telemetry.dispose()
+
+
+def test_telemetry_rows_live_in_their_own_file(split):
+    main, telemetry = split
+    client = TestClient(app)
+    client.patch("/api/settings/monitoring", json={"monitoring_api_enabled": True}, headers=ADMIN)
+    device_id = client.post("/register", json={"hostname": "split", "ssh_enabled": True}).json()["device_id"]
+    samples = {"ssh_failures": ["Failed password for root from 10.0.0.1 port 1"]}
+    response = client.post("/status", json={"device_id": device_id, "dns_ok": True, "security_log_samples": samples})
+    assert response.status_code == 200
+
+    assert "devicestatus" not in inspect(main).get_table_names()
+    assert "device" not in inspect(telemetry).get_table_names()
+    with Session(telemetry) as session:
+        assert session.exec(select(DeviceStatus.device_id)).all() == [device_id]
+    with Session(main) as session:
+        assert session.get(Device, device_id).presence == "online"
+
+    devices = client.get("/api/devices", headers=ADMIN).json()
+    assert devices["items"][0]["status_row"]["dns_ok"] is True
+    stream = client.get("/api/monitoring/events", params={"settled": "false"}, headers=ADMIN)
+    lines = [json.loads(line) for line in stream.text.splitlines()]
+    assert {(item["kind"], item["device_name"]) for item in lines[:-1]} == {("security", "split"), ("presence", "split")}
+
+    assert client.delete(f"/api/devices/{device_id}", headers=ADMIN).status_code == 200
+    with Session(telemetry) as session:
+        assert session.exec(select(DeviceStatus)).all() == []
+
+
+def test_maintenance_runs_per_file(split):
+    results = [maintain_database(engine) for engine in split]
+    assert [result["database"].rsplit("/", 1)[-1] for result in results] == ["wiretide.db", "telemetry.db"]
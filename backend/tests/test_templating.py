@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from wiretide import main, routes, templating
+from wiretide.config import get_settings
+from wiretide.metrics import FRAGMENT_CACHE
+
+client = TestClient(main.app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def test_one_shared_environment_precompiled():
+    templates = templating.get_templates()
+    assert templating.get_templates() is templates
+    env = templates.env
+    assert env.auto_reload is False
+    count = templating.precompile_templates()
+    assert count == len(env.list_templates(extensions=["html"])) > 0
+    assert len(env.cache) >= count
+
+
+def test_bytecode_cache_written_to_configured_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "template_cache_dir", str(tmp_path / "jinja"))
+    templates = templating._build_templates()
+    templates.env.get_template("devices.html")
+    assert list((tmp_path / "jinja").glob("__jinja2_*.cache"))
+
+
+def test_admin_globals_follow_credential_changes(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "admin_username", "fleet-ops")
+    routes._admin_credentials_changed()
+    try:
+        assert templating.get_templates().env.globals["admin_username"] == "fleet-ops"
+        assert "fleet-ops" in client.get("/devices", headers=ADMIN).text
+    finally:
+        monkeypatch.undo()
+        templating.refresh_template_globals()
+
+
+def _row_lookups():
+    return FRAGMENT_CACHE.value("device_rows", "hit"), FRAGMENT_CACHE.value("device_rows", "miss")
+
+
+def test_device_rows_rerendered_only_when_device_changes():
+    ids = [
+        client.post("/register", json={"hostname": f"row-{i}", "ssh_enabled": True}).json()["device_id"]
+        for i in range(3)
+    ]
+    client.get("/devices", headers=ADMIN)
+    hits, misses = _row_lookups()
+    assert "row-2" in client.get("/devices", headers=ADMIN).text
+    assert _row_lookups() == (hits + 3, misses)
+
+    client.post("/api/devices/approve", json={"device_id": ids[1], "device_type": "switch"}, headers=ADMIN)
+    page = client.get("/devices", params={"status": "approved"}, headers=ADMIN).text
+    assert _row_lookups() == (hits + 3, misses + 1)
+    assert "row-1" in page and "Switch" in page and "row-0" not in page
+
+
+def test_fragment_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(get_settings(), "device_row_cache_size", 2)
+    cache = templating.FragmentCache("test_rows", "device_row_cache_size")
+    rendered = []
+
+    def render(text):
+        return lambda: rendered.append(text) or text
+
+    assert cache.get(1, 1, render("a")) == "a"
+    cache.get(2, 1, render("b"))
+    cache.get(1, 1, render("stale"))
+    cache.get(3, 1, render("c"))
+    assert rendered == ["a", "b", "c"] and len(cache) == 2
+    cache.get(2, 1, render("b2"))
+    cache.get(1, 2, render("a2"))
+    cache.get(1, None, render("uncached"))
+    assert rendered == ["a", "b", "c", "b2", "a2", "uncached"]
+    assert FRAGMENT_CACHE.value("test_rows", "hit") == 1
+    assert FRAGMENT_CACHE.value("test_rows", "evict") == 3
+
+
+def test_main_import_defers_ui_dependencies():
+    """Agent-only startup must not pay for jinja2/bcrypt (see main.warm_ui)."""
+    code = (
+        "import sys, wiretide.main\n"
+        "loaded = [name for name in ('jinja2', 'bcrypt') if name in sys.modules]\n"
+        "assert not loaded, loaded\n"
+    )
+    env = {**os.environ, "WIRETIDE_DATABASE_URL": "sqlite:///:memory:"}
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,97 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from wiretide.config import get_settings
+from wiretide.main import app
+from wiretide.tracing import flush_traces
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+PARENT = "0af7651916cd43dd8448eb211c80319c"
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "trace_file", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(get_settings(), "trace_sample_rate", 1.0)
+    yield tmp_path / f"traces.{os.getpid()}.jsonl"
+    flush_traces()
+
+
+def _timing(response):
+    entries = {}
+    for part in response.headers["server-timing"].split(", "):
+        name, _, value = part.partition(";")
+        entries[name] = value
+    return entries
+
+
+def _traces(path):
+    flush_traces()
+    return [json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"] for line in path.read_text().splitlines()]
+
+
+def test_sampled_page_reports_stage_timings_and_writes_otlp_spans(trace_file):
+    client.post("/register", json={"hostname": "traced"})
+    response = client.get("/devices", headers=ADMIN)
+    assert response.status_code == 200
+    timing = _timing(response)
+    assert {"auth", "db", "serialize", "render", "total", "trace"} <= set(timing)
+
+    spans = _traces(trace_file)[-1]
+    root = spans[0]
+    assert root["name"] == "GET /devices" and root["kind"] == 2 and "parentSpanId" not in root
+    assert timing["trace"] == f'desc="{root["traceId"]}"'
+    assert {span["traceId"] for span in spans} == {root["traceId"]}
+    names = {span["name"] for span in spans[1:]}
+    assert {"auth require_admin_token", "db.query", "serialize _serialize_device", "render devices.html"} <= names
+    by_id = {span["spanId"]: span for span in spans}
+    assert all(span["parentSpanId"] in by_id for span in spans[1:])
+    assert all(int(span["startTimeUnixNano"]) <= int(span["endTimeUnixNano"]) for span in spans)
+    attributes = {item["key"]: item["value"] for item in root["attributes"]}
+    assert attributes["http.status_code"] == {"intValue": "200"}
+
+
+def test_incoming_traceparent_is_continued(trace_file, monkeypatch):
+    monkeypatch.setattr(get_settings(), "trace_sample_rate", 0.0)
+    unsampled = client.get("/api/devices", headers={**ADMIN, "traceparent": f"00-{PARENT}-b7ad6b7169203331-00"})
+    assert "server-timing" not in unsampled.headers
+    sampled = client.get("/api/devices", headers={**ADMIN, "traceparent": f"00-{PARENT}-b7ad6b7169203331-01"})
+    assert _timing(sampled)["trace"] == f'desc="{PARENT}"'
+    (spans,) = _traces(trace_file)
+    assert spans[0]["traceId"] == PARENT and spans[0]["parentSpanId"] == "b7ad6b7169203331"
+
+
+def test_unsampled_requests_write_nothing(trace_file, monkeypatch):
+    monkeypatch.setattr(get_settings(), "trace_sample_rate", 0.0)
+    assert "server-timing" not in client.get("/api/devices", headers=ADMIN).headers
+    flush_traces()
+    assert not trace_file.exists()
+
+
+def test_trace_file_rotates(trace_file, monkeypatch):
+    monkeypatch.setattr(get_settings(), "trace_file_max_bytes", 2000)
+    monkeypatch.setattr(get_settings(), "trace_file_backups", 2)
+    for _ in range(20):
+        client.get("/api/devices", headers=ADMIN)
+    flush_traces()
+    files = sorted(path.name for path in trace_file.parent.iterdir())
+    assert files == [trace_file.name, f"{trace_file.name}.1", f"{trace_file.name}.2"]
+
+
+def test_trace_files_of_exited_workers_are_pruned(trace_file):
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    dead_pid, live_pid = int(dead.stdout), os.getppid()
+    stale = [trace_file.parent / f"traces.{dead_pid}.jsonl", trace_file.parent / f"traces.{dead_pid}.jsonl.1"]
+    alive = trace_file.parent / f"traces.{live_pid}.jsonl"
+    for path in stale + [alive]:
+        path.write_text("{}\n")
+    client.get("/api/devices", headers=ADMIN)
+    flush_traces()
+    assert not any(path.exists() for path in stale)
+    assert alive.exists() and trace_file.exists()
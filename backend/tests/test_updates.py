@@ -0,0 +1,129 @@
+import hashlib
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from conftest import test_engine
+from wiretide.config import get_settings
+from wiretide.main import app
+from wiretide.models import Device, DeviceConfig, RolloutTarget, UpdateRollout
+from wiretide.updates import advance_rollout, cohort_slot
+
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "test-admin"}
+SCRIPT = b"#!/bin/sh\necho updating\n" * 200
+
+
+@pytest.fixture(autouse=True)
+def artifact_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "artifact_dir", str(tmp_path))
+
+
+def _upload(data: bytes = SCRIPT, version: str = "1.2.0") -> dict:
+    resp = client.post("/api/agent-artifacts", params={"version": version}, content=data, headers=ADMIN)
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def test_artifact_is_content_addressed_with_http_caching():
+    artifact = _upload()
+    assert artifact["sha256"] == hashlib.sha256(SCRIPT).hexdigest()
+    assert _upload()["sha256"] == artifact["sha256"]
+    url = artifact["url"]
+
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert plain.content == SCRIPT
+    assert plain.headers["etag"] == f'"{artifact["sha256"]}"'
+    assert "immutable" in plain.headers["cache-control"]
+
+    zipped = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["content-encoding"] == "gzip"
+    assert zipped.content == SCRIPT  # httpx decodes transparently
+    assert int(zipped.headers["content-length"]) < len(SCRIPT)
+
+    partial = client.get(url, headers={"Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == SCRIPT[10:20]
+    assert partial.headers["content-range"] == f"bytes 10-19/{len(SCRIPT)}"
+    assert client.get(url, headers={"Range": "bytes=-5"}).content == SCRIPT[-5:]
+    assert client.get(url, headers={"Range": f"bytes={len(SCRIPT)}-"}).status_code == 416
+
+    assert client.get(url, headers={"If-None-Match": plain.headers["etag"]}).status_code == 304
+    assert client.get("/agent-artifacts/" + "0" * 64).status_code == 404
+
+
+def _fleet(count: int, device_type: str = "router") -> list:
+    with Session(test_engine) as session:
+        devices = [
+            Device(hostname=f"upd-{device_type}-{i}", device_type=device_type, status="approved", approved=True, agent_version="1.0.0")
+            for i in range(count)
+        ]
+        session.add_all(devices)
+        session.commit()
+        return [d.id for d in devices]
+
+
+def test_rollout_waves_respect_cap_and_pause_on_errors():
+    client.patch("/api/settings/agent-update", json={"agent_update_policy": "force_on"}, headers=ADMIN)
+    _fleet(6)
+    artifact = _upload()
+    rollout = client.post(
+        "/api/rollouts",
+        json={"artifact_sha256": artifact["sha256"], "percent": 100, "max_concurrent": 2, "min_reports": 2, "error_threshold": 0.5},
+        headers=ADMIN,
+    ).json()
+    assert rollout["counts"]["updating"] == 2
+
+    with Session(test_engine) as session:
+        targets = session.exec(select(RolloutTarget.device_id)).all()
+        configs = session.exec(select(DeviceConfig).where(DeviceConfig.package == "wiretide.update")).all()
+        assert sorted(c.device_id for c in configs) == sorted(targets)
+        assert configs[0].package_json["url"] == artifact["url"]
+
+    token = client.get("/token/current").json()["shared_token"]
+    headers = {"X-Shared-Token": token}
+    # First device applies and reports the new version via /status.
+    client.post("/status", json={"device_id": targets[0], "agent_version": "1.2.0"}, headers=headers)
+    with Session(test_engine) as session:
+        counts = advance_rollout(session, session.get(UpdateRollout, rollout["id"]))
+        session.commit()
+    assert counts["succeeded"] == 1 and counts["updating"] == 2
+
+    for device_id in _in_flight():
+        resp = client.post(
+            "/agent-update/report",
+            json={"device_id": device_id, "version": "1.2.0", "success": False, "error": "script failed"},
+            headers=headers,
+        )
+        assert resp.status_code == 200
+    with Session(test_engine) as session:
+        rollout_row = session.get(UpdateRollout, rollout["id"])
+        advance_rollout(session, rollout_row)
+        session.commit()
+        assert rollout_row.status == "paused"
+        assert "error rate" in rollout_row.pause_reason
+
+    resumed = client.patch(f"/api/rollouts/{rollout['id']}", json={"status": "active"}, headers=ADMIN).json()
+    assert resumed["status"] == "active" and resumed["counts"]["updating"] == 2
+    assert client.post("/api/rollouts", json={"artifact_sha256": artifact["sha256"]}, headers=ADMIN).status_code == 409
+
+
+def _in_flight() -> list:
+    with Session(test_engine) as session:
+        return session.exec(select(RolloutTarget.device_id).where(RolloutTarget.state == "updating")).all()
+
+
+def test_cohort_percent_and_device_type():
+    client.patch("/api/settings/agent-update", json={"agent_update_policy": "force_on"}, headers=ADMIN)
+    routers = _fleet(40)
+    _fleet(5, device_type="access_point")
+    artifact = _upload(b"v2", version="2.0.0")
+    rollout = client.post(
+        "/api/rollouts",
+        json={"artifact_sha256": artifact["sha256"], "percent": 25, "device_types": ["router"], "max_concurrent": 100},
+        headers=ADMIN,
+    ).json()
+    expected = [d for d in routers if cohort_slot(rollout["id"], d) < 25]
+    assert sorted(_in_flight()) == sorted(expected)
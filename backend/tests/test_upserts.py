@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, Session, create_engine, func, select
+
+from wiretide.db import get_session, instrument_engine
+from wiretide.main import app
+from wiretide.models import Device, DeviceStatus
+from wiretide.services import ensure_settings_seeded
+
+THREADS = 16
+ROUNDS = 10
+
+
+@pytest.fixture
+def file_engine(tmp_path, monkeypatch):
+    """Real file DB: concurrent connections instead of the shared in-memory one."""
+    engine = instrument_engine(
+        create_engine(f"sqlite:///{tmp_path / 'upsert.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        ensure_settings_seeded(session)
+
+    def file_session():
+        with Session(engine) as session:
+            yield session
+
+    monkeypatch.setitem(app.dependency_overrides, get_session, file_session)
+    yield engine
+    engine.dispose()
+
+
+def _hammer(fn):
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        return list(pool.map(lambda i: fn(i), range(THREADS * ROUNDS)))
+
+
+def test_concurrent_heartbeats_keep_one_device_and_status_row(file_engine):
+    client = TestClient(app)
+
+    def register(i):
+        return client.post(
+            "/register", json={"hostname": "hammered", "agent_version": f"1.0.{i}", "ssh_enabled": True}
+        )
+
+    responses = _hammer(register)
+    assert {r.status_code for r in responses} == {200}
+    device_ids = {r.json()["device_id"] for r in responses}
+    assert len(device_ids) == 1
+    device_id = device_ids.pop()
+
+    def heartbeat(i):
+        return client.post(
+            "/status", json={"device_id": device_id, "dns_ok": True, "clients": [{"mac": f"02:00:00:00:00:{i % 99:02d}"}]}
+        )
+
+    responses = _hammer(heartbeat)
+    assert {r.status_code for r in responses} == {200}
+
+    with Session(file_engine) as session:
+        assert session.exec(select(func.count()).select_from(Device)).one() == 1
+        assert session.exec(select(func.count()).select_from(DeviceStatus)).one() == 1
+        device = session.get(Device, device_id)
+        assert device.ssh_enabled is True and device.agent_version.startswith("1.0.")
+
+
+def test_status_only_sets_fields_present_in_payload(file_engine):
+    client = TestClient(app)
+    device_id = client.post("/register", json={"hostname": "partial", "description": "lab"}).json()["device_id"]
+    client.post(
+        "/status",
+        json={"device_id": device_id, "dns_ok": True, "firewall_profile_active": "strict", "clients": [{"mac": "x"}]},
+    )
+    client.post("/status", json={"device_id": device_id, "ntp_ok": True})
+    client.post("/register", json={"hostname": "partial", "agent_version": "2.0"})
+
+    with Session(file_engine) as session:
+        row = session.exec(select(DeviceStatus).where(DeviceStatus.device_id == device_id)).one()
+        assert (row.dns_ok, row.ntp_ok, row.firewall_profile_active, row.clients) == (True, True, "strict", [{"mac": "x"}])
+        device = session.get(Device, device_id)
+        assert (device.description, device.agent_version, device.device_type) == ("lab", "2.0", "unknown")
@@ -0,0 +1,108 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, Session, create_engine, func, select
+
+from wiretide import write_queue
+from wiretide.db import create_writer_engine, get_session, instrument_engine
+from wiretide.main import app
+from wiretide.models import Device, DeviceStatus
+from wiretide.services import ensure_settings_seeded
+from wiretide.write_queue import WriteQueue
+
+
+@pytest.fixture
+def queued(tmp_path, monkeypatch):
+    """File DB with the write queue on; request sessions only read."""
+    url = f"sqlite:///{tmp_path / 'queue.db'}"
+    writer = create_writer_engine(url)
+    SQLModel.metadata.create_all(writer)
+    with Session(writer) as session:
+        ensure_settings_seeded(session)
+    readers = instrument_engine(create_engine(url, connect_args={"check_same_thread": False}))
+
+    def read_session():
+        with Session(readers) as session:
+            yield session
+
+    monkeypatch.setitem(app.dependency_overrides, get_session, read_session)
+    queue = write_queue.start_write_queue(writer, max_batch=32)
+    yield queue, readers
+    write_queue.stop_write_queue()
+    readers.dispose()
+
+
+def _add_device(session, hostname):
+    device = Device(hostname=hostname)
+    session.add(device)
+    session.flush()
+    return device.id
+
+
+def _fail(session, hostname):
+    session.add(Device(hostname=hostname))
+    session.flush()
+    raise HTTPException(status_code=409, detail="nope")
+
+
+def test_failing_unit_rolls_back_alone_within_group(tmp_path):
+    engine = create_writer_engine(f"sqlite:///{tmp_path / 'unit.db'}")
+    SQLModel.metadata.create_all(engine)
+    queue = WriteQueue(engine)
+    queue.start()
+    try:
+        started, release = threading.Event(), threading.Event()
+
+        def block(session):
+            started.set()
+            release.wait(5)
+
+        blocker = queue.submit(block)
+        assert started.wait(5)
+        futures = [
+            queue.submit(_add_device, "a"),
+            queue.submit(_fail, "b"),
+            queue.submit(_add_device, "c"),
+        ]
+        release.set()
+        blocker.result(timeout=5)
+        assert isinstance(futures[0].result(timeout=5), int)
+        with pytest.raises(HTTPException):
+            futures[1].result(timeout=5)
+        assert isinstance(futures[2].result(timeout=5), int)
+        # blocker alone, then the three queued units in one transaction
+        assert queue.batches == 2
+    finally:
+        queue.stop()
+    with Session(engine) as session:
+        assert sorted(session.exec(select(Device.hostname)).all()) == ["a", "c"]
+    engine.dispose()
+
+
+def test_concurrent_agent_writes_go_through_writer(queued):
+    queue, readers = queued
+    client = TestClient(app)
+    device_id = client.post("/register", json={"hostname": "queued", "ssh_enabled": True}).json()["device_id"]
+
+    def heartbeat(i):
+        return client.post("/status", json={"device_id": device_id, "dns_ok": i % 2 == 0})
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        responses = list(pool.map(heartbeat, range(160)))
+    assert {r.status_code for r in responses} == {200}
+    assert client.post("/status", json={"device_id": 999}).status_code == 404
+
+    approve = client.post(
+        "/api/devices/approve",
+        json={"device_id": device_id, "device_type": "router"},
+        headers={"X-Admin-Token": "test-admin"},
+    )
+    assert approve.status_code == 200 and approve.json()["approved"] is True
+    assert queue.batches > 0
+
+    with Session(readers) as session:
+        assert session.exec(select(func.count()).select_from(DeviceStatus)).one() == 1
+        assert session.get(Device, device_id).status == "approved"
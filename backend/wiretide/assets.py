@@ -0,0 +1,127 @@
+"""Fingerprinted static assets.
+
+`python -m wiretide.assets` copies every file under `static_dir` to
+`asset_build_dir` as `name.<hash>.ext` with `.gz` (and, when the optional
+`brotli` package is installed, `.br`) siblings, plus a `manifest.json`
+mapping logical paths to hashed ones. Templates resolve names with
+`asset_url("css/app.css")`; `AssetFiles` serves the hashed files with
+`Cache-Control: immutable` and picks the precompressed variant the client
+accepts. Without a build, everything falls back to the plain files.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli  # type: ignore
+except Exception:  # pragma: no cover - optional dependency guard
+    brotli = None
+
+from .config import get_settings
+
+BASE_PATH = Path(__file__).resolve().parent
+STATIC_DIR = (BASE_PATH.parent / get_settings().static_dir).resolve()
+BUILD_DIR = (BASE_PATH.parent / get_settings().asset_build_dir).resolve()
+MANIFEST_NAME = "manifest.json"
+HASH_LENGTH = 12
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Already-compressed formats gain nothing from gzip/brotli.
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".json", ".txt", ".html", ".map", ".ico"}
+
+
+def hashed_name(relative: Path, data: bytes) -> Path:
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    return relative.with_name(f"{relative.stem}.{digest}{relative.suffix}")
+
+
+def build_assets(source: Path = STATIC_DIR, dest: Path = BUILD_DIR) -> Dict[str, str]:
+    """Write hashed copies and precompressed siblings; returns the manifest.
+
+    Older hashed files are kept so pages rendered before a deploy still load.
+    """
+    manifest: Dict[str, str] = {}
+    for path in sorted(p for p in source.rglob("*") if p.is_file()):
+        relative = path.relative_to(source)
+        data = path.read_bytes()
+        target = dest / hashed_name(relative, data)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        if relative.suffix in COMPRESSIBLE_SUFFIXES:
+            target.with_name(target.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                target.with_name(target.name + ".br").write_bytes(brotli.compress(data))
+        manifest[relative.as_posix()] = target.relative_to(dest).as_posix()
+    dest.mkdir(parents=True, exist_ok=True)
+    (dest / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+_manifest: Optional[Dict[str, str]] = None
+
+
+def load_manifest(build_dir: Path = BUILD_DIR) -> Dict[str, str]:
+    global _manifest
+    try:
+        _manifest = json.loads((build_dir / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        _manifest = {}
+    return _manifest
+
+
+def asset_url(path: str) -> str:
+    """Template helper: URL of the fingerprinted build of `path` (plain file if not built)."""
+    manifest = _manifest if _manifest is not None else load_manifest()
+    return "/static/" + manifest.get(path.lstrip("/"), path.lstrip("/"))
+
+
+class AssetFiles(StaticFiles):
+    """`/static` mount: hashed build output first (immutable, precompressed), then the sources."""
+
+    def __init__(self, directory: Path = STATIC_DIR, build_dir: Path = BUILD_DIR) -> None:
+        super().__init__(directory=directory)
+        self.build_dir = os.path.realpath(build_dir)
+        self.all_directories = [build_dir, *self.all_directories]
+
+    def file_response(
+        self,
+        full_path: "os.PathLike[str]",
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        full_path = str(full_path)
+        if os.path.commonpath([full_path, self.build_dir]) != self.build_dir:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        request_headers = Headers(scope=scope)
+        accepted = {part.split(";")[0].strip() for part in request_headers.get("accept-encoding", "").split(",")}
+        media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        headers = {"Cache-Control": IMMUTABLE, "Vary": "Accept-Encoding"}
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding in accepted and os.path.isfile(full_path + suffix):
+                full_path += suffix
+                stat_result = os.stat(full_path)
+                headers["Content-Encoding"] = encoding
+                break
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, media_type=media_type, headers=headers
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    built = build_assets()
+    print(f"Built {len(built)} assets into {BUILD_DIR}" + ("" if brotli else " (brotli not installed: .gz only)"))
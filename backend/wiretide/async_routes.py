@@ -0,0 +1,86 @@
+"""Async variants of the agent-facing endpoints.
+
+Enabled with `WIRETIDE_ASYNC_DB_ENABLED=true`. Handlers run on the event loop
+and await the async driver (aiosqlite today) instead of holding a threadpool
+slot while SQLite is locked. The endpoint bodies are shared with the
+threadpool routes through `AsyncSession.run_sync`, so both paths keep
+identical validation and responses. With the write queue enabled, write
+units go to the single writer thread instead (see `write_queue`).
+"""
+
+from typing import Any, Callable, Optional
+
+from fastapi import APIRouter, Depends, Header, Request
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .db import get_async_session
+from .metrics import HEARTBEATS
+from .profiling import ProfiledRoute
+from .routes import (
+    check_agent_token,
+    current_token_impl,
+    get_config_impl,
+    register_device_impl,
+    update_status_impl,
+)
+from .schemas import (
+    ConfigResponse,
+    RegisterRequest,
+    RegisterResponse,
+    StatusReport,
+    StatusResponse,
+    TokenResponse,
+)
+from .write_queue import current_write_queue
+
+async_agent_router = APIRouter(route_class=ProfiledRoute)
+
+
+async def _write(session: AsyncSession, fn: Callable[..., Any], *args: Any) -> Any:
+    queue = current_write_queue()
+    if queue is not None:
+        return await queue.run(fn, *args)
+    response = await session.run_sync(fn, *args)
+    await session.commit()
+    return response
+
+
+async def require_agent_token_async(
+    x_shared_token: Optional[str] = Header(default=None, alias="X-Shared-Token"),
+    session: AsyncSession = Depends(get_async_session),
+) -> None:
+    await session.run_sync(check_agent_token, x_shared_token)
+
+
+@async_agent_router.post("/register", response_model=RegisterResponse)
+async def register_device(
+    payload: RegisterRequest,
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+) -> RegisterResponse:
+    return await _write(session, register_device_impl, payload, request.headers.get("x-shared-token"))
+
+
+@async_agent_router.post("/status", response_model=StatusResponse)
+async def update_status(
+    payload: StatusReport,
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+) -> StatusResponse:
+    response = await _write(session, update_status_impl, payload, request.headers.get("x-shared-token"))
+    HEARTBEATS.inc()
+    return response
+
+
+@async_agent_router.get("/config", response_model=ConfigResponse)
+async def get_config(
+    device_id: int,
+    session: AsyncSession = Depends(get_async_session),
+    _: None = Depends(require_agent_token_async),
+) -> ConfigResponse:
+    return await _write(session, get_config_impl, device_id)
+
+
+@async_agent_router.get("/token/current", response_model=TokenResponse)
+async def current_token(session: AsyncSession = Depends(get_async_session)) -> TokenResponse:
+    return await session.run_sync(current_token_impl)
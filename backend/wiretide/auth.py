@@ -6,18 +6,20 @@ import hmac
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Tuple
 
-import bcrypt
-
 SESSION_TTL_SECONDS = 60 * 60 * 4
 
 
 def hash_password(password: str) -> str:
     """Generate a bcrypt hash for a plaintext password."""
+    import bcrypt  # deferred: only password flows need it
+
     return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
 
 def verify_password(password: str, password_hash: str) -> bool:
     """Verify a plaintext password against a bcrypt hash."""
+    import bcrypt
+
     try:
         return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
     except Exception:
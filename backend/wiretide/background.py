@@ -0,0 +1,20 @@
+"""Periodic background jobs started from the app lifespan."""
+
+import asyncio
+import logging
+from typing import Callable
+
+logger = logging.getLogger("wiretide.background")
+
+
+async def run_periodically(interval: float, job: Callable[[], object], name: str) -> None:
+    """Run a blocking `job` in a worker thread every `interval` seconds until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = await asyncio.to_thread(job)
+        except Exception:  # pragma: no cover - keep running after transient DB errors
+            logger.exception("%s failed", name)
+            continue
+        if result:
+            logger.info("%s: %s", name, result)
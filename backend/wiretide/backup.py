@@ -0,0 +1,235 @@
+"""Online database snapshots.
+
+Each SQLite file is copied with the sqlite3 online backup API in steps of
+`backup_step_pages`, pausing `backup_step_sleep` between steps, so a snapshot
+of a busy controller never holds the database for longer than one step
+(see `copy_database` for rollback-journal databases).
+The copy is checked with `PRAGMA quick_check`, gzipped to
+`<backup_dir>/<db>.<timestamp>.db.gz` and described by a `sha256sum`-style
+sidecar; only the newest `backup_keep` snapshots per database are kept.
+
+CLI: `python -m wiretide.backup create|list [--dir DIR] [--keep N]`.
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from .config import get_settings
+from .db import all_engines, get_session
+from .maintenance import session_engines
+from .profiling import ProfiledRoute
+from .routes import require_admin_token
+from .schemas import BackupOut
+
+backup_router = APIRouter(route_class=ProfiledRoute)
+
+SUFFIX = ".db.gz"
+STAMP = "%Y%m%d-%H%M%S-%f"
+MAX_RESTARTS = 3
+_lock = threading.Lock()
+
+
+class BackupBusy(RuntimeError):
+    """Another snapshot is being written by this process."""
+
+
+def backup_dir() -> Path:
+    return (Path(__file__).resolve().parent.parent / get_settings().backup_dir).resolve()
+
+
+def _database_name(target: Engine) -> str:
+    database = target.url.database
+    if not database or database == ":memory:":
+        return "memory"
+    return Path(database).name.split(".", 1)[0]
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _Restarted(Exception):
+    pass
+
+
+def copy_database(target: Engine, dest: Path, step_pages: int, step_sleep: float) -> None:
+    """Online backup of `target` into the plain SQLite file `dest`.
+
+    In WAL mode the copy runs inside one read transaction, so it sees a fixed
+    snapshot while writers carry on. Otherwise every write by another
+    connection restarts the copy; after `MAX_RESTARTS` it is finished in a
+    single step, holding a shared lock for the duration of the copy.
+    """
+    restarts = 0
+    remaining_before = None
+
+    def pause(status: int, remaining: int, total: int) -> None:
+        nonlocal restarts, remaining_before
+        if remaining_before is not None and remaining >= remaining_before:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _Restarted
+        remaining_before = remaining
+        if remaining and step_sleep > 0:
+            time.sleep(step_sleep)
+
+    raw = target.raw_connection()
+    source = raw.driver_connection
+    wal = source.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    try:
+        if wal:
+            source.execute("BEGIN")
+            source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        copy = sqlite3.connect(dest)
+        try:
+            try:
+                source.backup(copy, pages=max(step_pages, 1), progress=pause)
+            except _Restarted:
+                source.backup(copy)
+            check = copy.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            copy.close()
+    finally:
+        if wal:
+            source.rollback()
+        raw.close()
+    if check != "ok":
+        raise RuntimeError(f"backup of {target.url.database} failed quick_check: {check}")
+
+
+def snapshot_database(target: Engine, directory: Path, now: datetime) -> BackupOut:
+    settings = get_settings()
+    database = _database_name(target)
+    name = f"{database}.{now.strftime(STAMP)}{SUFFIX}"
+    final = directory / name
+    raw_copy = directory / f".{name}.sqlite.tmp"
+    packed = directory / f".{name}.tmp"
+    try:
+        copy_database(target, raw_copy, settings.backup_step_pages, settings.backup_step_sleep)
+        with raw_copy.open("rb") as source, gzip.open(packed, "wb", compresslevel=6) as sink:
+            shutil.copyfileobj(source, sink, 1024 * 1024)
+        digest = _sha256(packed)
+        os.replace(packed, final)
+        final.with_name(name + ".sha256").write_text(f"{digest}  {name}\n")
+    finally:
+        raw_copy.unlink(missing_ok=True)
+        packed.unlink(missing_ok=True)
+    return BackupOut(name=name, database=database, size=final.stat().st_size, sha256=digest, created_at=now)
+
+
+def list_backups(directory: Optional[Path] = None) -> List[BackupOut]:
+    """Snapshots with a checksum sidecar, newest first."""
+    directory = directory or backup_dir()
+    backups = []
+    for path in directory.glob(f"*{SUFFIX}"):
+        sidecar = path.with_name(path.name + ".sha256")
+        database, _, stamp = path.name[: -len(SUFFIX)].partition(".")
+        try:
+            created_at = datetime.strptime(stamp, STAMP).replace(tzinfo=timezone.utc)
+            digest = sidecar.read_text().split()[0]
+        except (OSError, ValueError, IndexError):
+            continue
+        backups.append(
+            BackupOut(name=path.name, database=database, size=path.stat().st_size, sha256=digest, created_at=created_at)
+        )
+    return sorted(backups, key=lambda backup: (backup.created_at, backup.name), reverse=True)
+
+
+def prune_backups(directory: Path, keep: int) -> List[str]:
+    """Delete all but the newest `keep` snapshots of each database."""
+    seen: Dict[str, int] = {}
+    removed = []
+    for backup in list_backups(directory):
+        seen[backup.database] = seen.get(backup.database, 0) + 1
+        if seen[backup.database] > max(keep, 1):
+            (directory / backup.name).unlink(missing_ok=True)
+            (directory / f"{backup.name}.sha256").unlink(missing_ok=True)
+            removed.append(backup.name)
+    return removed
+
+
+def create_backup(
+    engines: Optional[Sequence[Engine]] = None,
+    directory: Optional[Path] = None,
+    now: Optional[datetime] = None,
+    keep: Optional[int] = None,
+) -> List[BackupOut]:
+    """Snapshot every SQLite database (inventory and telemetry), then apply retention."""
+    if not _lock.acquire(blocking=False):
+        raise BackupBusy("a backup is already running")
+    try:
+        directory = directory or backup_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        now = now or datetime.now(timezone.utc)
+        targets = [target for target in (engines or all_engines()) if target.dialect.name == "sqlite"]
+        created = [snapshot_database(target, directory, now) for target in targets]
+        prune_backups(directory, get_settings().backup_keep if keep is None else keep)
+        return created
+    finally:
+        _lock.release()
+
+
+def run_scheduled_backup() -> Optional[List[str]]:
+    """Background job (see main.lifespan); skipped when another worker just wrote one."""
+    interval = get_settings().backup_interval
+    newest = next(iter(list_backups()), None)
+    if newest is not None and newest.created_at > datetime.now(timezone.utc) - timedelta(seconds=interval / 2):
+        return None
+    try:
+        return [backup.name for backup in create_backup()]
+    except BackupBusy:
+        return None
+
+
+@backup_router.get("/api/backups", response_model=List[BackupOut])
+def get_backups(_: None = Depends(require_admin_token)) -> List[BackupOut]:
+    return list_backups()
+
+
+@backup_router.post("/api/backups", response_model=List[BackupOut], status_code=status.HTTP_201_CREATED)
+async def post_backup(
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> List[BackupOut]:
+    try:
+        return await run_in_threadpool(create_backup, session_engines(session))
+    except BackupBusy as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m wiretide.backup", description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=("create", "list"))
+    parser.add_argument("--dir", type=Path, default=None, help="backup directory (default: WIRETIDE_BACKUP_DIR)")
+    parser.add_argument("--keep", type=int, default=None, help="snapshots kept per database (default: WIRETIDE_BACKUP_KEEP)")
+    args = parser.parse_args(argv)
+    directory = (args.dir or backup_dir()).resolve()
+    if args.command == "create":
+        backups = create_backup(directory=directory, keep=args.keep)
+    else:
+        backups = list_backups(directory)
+    for backup in backups:
+        print(f"{backup.name}\t{backup.size}\t{backup.sha256}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
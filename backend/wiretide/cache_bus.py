@@ -0,0 +1,130 @@
+"""Cross-worker cache invalidation via a DB-backed generation counter table.
+
+Each uvicorn worker keeps its own in-process caches. Writers bump a named
+generation in `cachegeneration` inside the same transaction as the change;
+every worker polls that tiny table (rate-limited by
+`cache_bus_poll_interval`) before serving cached state and drops the caches
+whose generation moved. Works the same on SQLite and PostgreSQL.
+"""
+
+import threading
+from time import monotonic
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from .config import get_settings
+from .models import CacheGeneration
+
+T = TypeVar("T")
+_MISSING = object()
+
+TOPIC_CONTROLLER_SETTINGS = "controller_settings"
+TOPIC_ADMIN_CREDENTIALS = "admin_credentials"
+TOPIC_PROFILER = "profiler"
+# Bumped when devices are deleted (see fleet.py).
+TOPIC_FLEET = "fleet"
+
+
+class InvalidationBus:
+    def __init__(self, poll_interval: Optional[float] = None) -> None:
+        self._poll_interval = poll_interval
+        self._known: Dict[str, int] = {}
+        self._handlers: Dict[str, List[Callable[[], None]]] = {}
+        self._last_poll = float("-inf")
+        self._lock = threading.Lock()
+
+    @property
+    def poll_interval(self) -> float:
+        if self._poll_interval is not None:
+            return self._poll_interval
+        return get_settings().cache_bus_poll_interval
+
+    def subscribe(self, topic: str, handler: Callable[[], None]) -> None:
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def _fire(self, topic: str) -> None:
+        for handler in self._handlers.get(topic, ()):
+            handler()
+
+    def publish(self, session: Session, topic: str) -> int:
+        """Bump `topic` in the caller's transaction and invalidate locally; returns the new generation."""
+        result = session.exec(
+            update(CacheGeneration)
+            .where(CacheGeneration.name == topic)
+            .values(generation=CacheGeneration.generation + 1)
+        )
+        if result.rowcount == 0:
+            try:
+                with session.begin_nested():
+                    session.add(CacheGeneration(name=topic, generation=1))
+            except IntegrityError:
+                # Another worker created the row first; bump it instead.
+                session.exec(
+                    update(CacheGeneration)
+                    .where(CacheGeneration.name == topic)
+                    .values(generation=CacheGeneration.generation + 1)
+                )
+        generation = session.exec(
+            select(CacheGeneration.generation).where(CacheGeneration.name == topic)
+        ).one()
+        with self._lock:
+            self._known[topic] = generation
+        self._fire(topic)
+        return generation
+
+    def poll(self, session: Session, force: bool = False) -> List[str]:
+        """Fire handlers for topics changed by other workers; returns the topics."""
+        now = monotonic()
+        if not force and now - self._last_poll < self.poll_interval:
+            return []
+        self._last_poll = now
+        rows = session.exec(select(CacheGeneration.name, CacheGeneration.generation)).all()
+        changed = []
+        with self._lock:
+            for topic, generation in rows:
+                if self._known.get(topic) != generation:
+                    self._known[topic] = generation
+                    changed.append(topic)
+        for topic in changed:
+            self._fire(topic)
+        return changed
+
+    def reset(self) -> None:
+        """Forget known generations and drop every cached value (e.g. after a DB reset)."""
+        with self._lock:
+            self._known.clear()
+        self._last_poll = float("-inf")
+        for topic in list(self._handlers):
+            self._fire(topic)
+
+
+class CachedValue(Generic[T]):
+    """A lazily loaded value dropped whenever its bus topic changes."""
+
+    def __init__(self, bus: InvalidationBus, topic: str, loader: Callable[[Session], T]) -> None:
+        self.bus = bus
+        self.loader = loader
+        self._value: object = _MISSING
+        self._version = 0
+        bus.subscribe(topic, self.invalidate)
+
+    def invalidate(self) -> None:
+        self._version += 1
+        self._value = _MISSING
+
+    def get(self, session: Session) -> T:
+        self.bus.poll(session)
+        value = self._value
+        if value is _MISSING:
+            version = self._version
+            value = self.loader(session)
+            # Skip storing if an invalidation raced with the load.
+            if version == self._version:
+                self._value = value
+        return value  # type: ignore[return-value]
+
+
+BUS = InvalidationBus()
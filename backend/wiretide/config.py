@@ -17,6 +17,34 @@ class Settings(BaseSettings):
         default="sqlite:///./wiretide.db",
         description="SQLAlchemy-compatible database URL (defaults to local SQLite).",
     )
+    telemetry_database_url: str | None = Field(
+        default=None,
+        description="Optional second database for heartbeat telemetry (status snapshots, presence and security events).",
+    )
+    db_maintenance_interval: float = Field(
+        default=3600.0,
+        description="Seconds between maintenance passes (retention pruning, ANALYZE, incremental vacuum); 0 disables.",
+    )
+    async_db_enabled: bool = Field(
+        default=False,
+        description="Serve agent endpoints from an async engine/session instead of the threadpool.",
+    )
+    write_queue_enabled: bool = Field(
+        default=False,
+        description="SQLite only: run agent and admin writes on one dedicated writer thread/connection.",
+    )
+    sqlite_busy_timeout: float = Field(
+        default=5.0,
+        description="SQLite only: seconds a statement waits for another connection's write lock.",
+    )
+    write_queue_max_batch: int = Field(
+        default=64,
+        description="Most queued write units grouped into a single writer transaction.",
+    )
+    async_database_url: str | None = Field(
+        default=None,
+        description="Async SQLAlchemy URL; derived from database_url (aiosqlite/asyncpg) when unset.",
+    )
     admin_token: str = Field(
         default="wiretide-admin-dev",
         description="Static admin token for UI/admin endpoints; override in production.",
@@ -44,10 +72,202 @@ class Settings(BaseSettings):
     static_dir: str = Field(
         default="static", description="Directory for static assets (relative or absolute)."
     )
+    asset_build_dir: str = Field(
+        default="build/static",
+        description="Output of `python -m wiretide.assets` (fingerprinted, precompressed static files).",
+    )
     templates_dir: str = Field(
         default="templates",
         description="Directory for Jinja2 templates (relative or absolute).",
     )
+    templates_auto_reload: bool = Field(
+        default=False,
+        description="Re-check template files for changes on every render (development only).",
+    )
+    template_bytecode_cache: bool = Field(
+        default=True,
+        description="Keep compiled template bytecode on disk across restarts.",
+    )
+    template_cache_dir: str | None = Field(
+        default=None,
+        description="Directory for the template bytecode cache (defaults to a per-user temp dir).",
+    )
+    device_row_cache_size: int = Field(
+        default=5000,
+        description="Rendered /devices table rows kept per worker (LRU); 0 disables the cache.",
+    )
+    fleet_sync_overlap: float = Field(
+        default=2.0,
+        description="Longest device write transaction in seconds; part of the fleet model's re-read window.",
+    )
+    fleet_reconcile_interval: float = Field(
+        default=120.0,
+        description="Seconds between full fleet model reconciles that catch writes committed past the overlap.",
+    )
+    cache_bus_poll_interval: float = Field(
+        default=0.5,
+        description="Seconds between cross-worker cache generation checks (0 checks on every access).",
+    )
+    presence_stale_after: int = Field(
+        default=90,
+        description="Seconds without a heartbeat before an online device is marked stale.",
+    )
+    presence_offline_after: int = Field(
+        default=300,
+        description="Seconds without a heartbeat before a device is marked offline.",
+    )
+    presence_sweep_interval: float = Field(
+        default=15.0,
+        description="Seconds between presence sweeps (0 disables the background sweeper).",
+    )
+    security_event_bucket_seconds: int = Field(
+        default=60,
+        description="Time bucket for security event dedup (same device+fingerprint within a bucket is counted).",
+    )
+    security_event_settle_seconds: float = Field(
+        default=10.0,
+        description="Seconds after a bucket closes before the monitoring stream treats its rows as final; "
+        "must exceed the longest /status write, lock waits included.",
+    )
+    security_events_max_per_report: int = Field(
+        default=1000,
+        description="Events parsed per /status report; the rest is counted as one ingest_truncated event.",
+    )
+    security_event_retention_days: int = Field(
+        default=30,
+        description="Days to keep security events before pruning.",
+    )
+    presence_event_retention_days: int = Field(
+        default=90,
+        description="Days to keep presence transition events (0 keeps them forever).",
+    )
+    config_retention_days: int = Field(
+        default=30,
+        description="Days an undelivered queued config is kept before pruning (0 keeps them forever).",
+    )
+    maintenance_run_retention_days: int = Field(
+        default=90,
+        description="Days to keep maintenance run records.",
+    )
+    maintenance_batch_size: int = Field(
+        default=1000,
+        description="Rows deleted per transaction while pruning, bounding how long the write lock is held.",
+    )
+    maintenance_vacuum_pages: int = Field(
+        default=2000,
+        description="Free pages returned per incremental vacuum step (0 = all); needs auto_vacuum=INCREMENTAL.",
+    )
+    import_chunk_size: int = Field(
+        default=500,
+        description="Rows per INSERT/transaction when importing pre-registered devices.",
+    )
+    profile_dir: str = Field(
+        default="profiles",
+        description="Directory for on-demand request profiles (relative or absolute).",
+    )
+    profile_keep: int = Field(
+        default=50,
+        description="Profiles kept on disk; older captures are deleted.",
+    )
+    profile_sample_interval: float = Field(
+        default=0.005,
+        description="Seconds between stack samples in `sample` profiling mode.",
+    )
+    backup_dir: str = Field(
+        default="backups",
+        description="Directory for compressed database snapshots (relative or absolute).",
+    )
+    backup_keep: int = Field(
+        default=7,
+        description="Snapshots kept per database file; older ones are deleted after each backup.",
+    )
+    backup_interval: float = Field(
+        default=0.0,
+        description="Seconds between scheduled snapshots (0 disables; admin endpoint and CLI still work).",
+    )
+    backup_step_pages: int = Field(
+        default=256,
+        description="Pages copied per online-backup step; the source is unlocked between steps.",
+    )
+    backup_step_sleep: float = Field(
+        default=0.01,
+        description="Seconds to pause between backup steps so writers can take the lock.",
+    )
+    monitoring_api_token: str | None = Field(
+        default=None,
+        description="Bearer token for the Monitoring API (admin credentials are accepted as well).",
+    )
+    artifact_dir: str = Field(
+        default="artifacts",
+        description="Directory for content-addressed agent update artifacts (relative or absolute).",
+    )
+    rollout_interval: float = Field(
+        default=30.0,
+        description="Seconds between rollout wave advances (0 disables).",
+    )
+    rollout_update_timeout: int = Field(
+        default=1800,
+        description="Seconds a device may take to report/apply an update before it counts as failed.",
+    )
+    metrics_enabled: bool = Field(
+        default=True,
+        description="Collect in-process request/DB metrics and expose them at /metrics (admin auth).",
+    )
+    slow_query_ms: float | None = Field(
+        default=None,
+        description="Log SQL statements slower than this many milliseconds (unset disables).",
+    )
+    slow_query_explain: bool = Field(
+        default=True,
+        description="Attach the EXPLAIN plan to slow-query log entries.",
+    )
+    db_debug_header: bool = Field(
+        default=False,
+        description="Add an X-Wiretide-DB response header with per-request query count/time.",
+    )
+    trace_sample_rate: float = Field(
+        default=0.0,
+        ge=0.0,
+        le=1.0,
+        description="Fraction of requests traced (spans, Server-Timing header, trace file); 0 disables.",
+    )
+    trace_file: str = Field(
+        default="traces/wiretide-traces.jsonl",
+        description="OTLP/JSON lines file for sampled traces (relative or absolute); workers insert their pid.",
+    )
+    trace_file_max_bytes: int = Field(
+        default=10 * 1024 * 1024,
+        description="Rotate the trace file at this size.",
+    )
+    trace_file_backups: int = Field(
+        default=5,
+        description="Rotated trace files kept.",
+    )
+
+    runtime_profile: str = Field(
+        default="default",
+        description="Server profile the process was launched with (set by the installer, see wiretide.runtime).",
+    )
+    server_workers: int = Field(
+        default=1,
+        description="Uvicorn worker processes (installer-chosen; reported in /health).",
+    )
+    server_loop: str = Field(
+        default="auto",
+        description="Uvicorn event loop: uvloop, asyncio or auto.",
+    )
+    server_http: str = Field(
+        default="auto",
+        description="Uvicorn HTTP parser: httptools, h11 or auto.",
+    )
+    server_backlog: int = Field(
+        default=2048,
+        description="Listen backlog passed to uvicorn.",
+    )
+    server_keepalive_timeout: int = Field(
+        default=5,
+        description="Seconds uvicorn keeps idle keep-alive connections open.",
+    )
 
     model_config = SettingsConfigDict(
         env_prefix="WIRETIDE_",
@@ -60,6 +280,19 @@ class Settings(BaseSettings):
     def using_sqlite(self) -> bool:
         return self.database_url.startswith("sqlite")
 
+    @property
+    def resolved_async_database_url(self) -> str:
+        if self.async_database_url:
+            return self.async_database_url
+        return async_url(self.database_url)
+
+
+def async_url(url: str) -> str:
+    """Swap a sync SQLAlchemy URL to its async driver (aiosqlite/asyncpg)."""
+    scheme, sep, rest = url.partition("://")
+    driver = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}.get(scheme, scheme)
+    return f"{driver}{sep}{rest}"
+
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
@@ -1,39 +1,290 @@
 """Database engine and session management."""
 
 from contextlib import contextmanager
-from typing import Iterator
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Iterator, List, Optional
 
-from sqlmodel import SQLModel, Session, create_engine
+from sqlalchemy import delete, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select
 
-from .config import get_settings
+if TYPE_CHECKING:  # pragma: no cover
+    from sqlalchemy.ext.asyncio import AsyncEngine
+    from sqlmodel.ext.asyncio.session import AsyncSession
 
+from .config import async_url, get_settings
+from .querystats import QUERY_STATS, log_slow_query
+from .request_context import current_request
+from .tracing import record_query
 
-def _build_engine_url():
-    settings = get_settings()
-    connect_args = {"check_same_thread": False} if settings.using_sqlite else {}
-    engine = create_engine(settings.database_url, connect_args=connect_args)
+
+def _sqlite_connect_args() -> Dict[str, Any]:
+    return {"check_same_thread": False, "timeout": get_settings().sqlite_busy_timeout}
+
+
+def _build_engine_url(url: Optional[str] = None):
+    url = url or get_settings().database_url
+    connect_args = _sqlite_connect_args() if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args)
     return engine
 
 
-engine = _build_engine_url()
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("wiretide_query_start", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    starts = conn.info.get("wiretide_query_start")
+    if not starts:
+        return
+    start = starts.pop()
+    end = perf_counter()
+    elapsed = end - start
+    key = QUERY_STATS.record(statement, elapsed)
+    ctx = current_request()
+    if ctx is not None:
+        ctx.db_queries += 1
+        ctx.db_time += elapsed
+        ctx.fingerprints[key] = ctx.fingerprints.get(key, 0) + 1
+        if ctx.trace is not None:
+            record_query(key, int(start * 1e9), int(end * 1e9))
+    settings = get_settings()
+    threshold = settings.slow_query_ms
+    if threshold is not None and elapsed * 1000.0 >= threshold and not executemany:
+        log_slow_query(
+            conn.connection.dbapi_connection,
+            conn.dialect.name,
+            statement,
+            parameters,
+            elapsed,
+            settings.slow_query_explain,
+        )
+
+
+def _handle_error(exception_context) -> None:
+    conn = exception_context.connection
+    starts = conn.info.get("wiretide_query_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(target: Engine) -> Engine:
+    """Attach query timing, fingerprinting and slow-query logging (idempotent)."""
+    if not event.contains(target, "before_cursor_execute", _before_cursor_execute):
+        event.listen(target, "before_cursor_execute", _before_cursor_execute)
+        event.listen(target, "after_cursor_execute", _after_cursor_execute)
+        event.listen(target, "handle_error", _handle_error)
+    return target
+
+
+engine = instrument_engine(_build_engine_url())
+_telemetry_url = get_settings().telemetry_database_url
+telemetry_engine: Optional[Engine] = (
+    instrument_engine(_build_engine_url(_telemetry_url)) if _telemetry_url else None
+)
+
+
+def telemetry_binds(target: Any = None) -> Dict[type, Any]:
+    """Session `binds` routing the telemetry models to `target` (default: the telemetry engine).
+
+    Empty when no telemetry database is configured, so everything stays on `engine`.
+    """
+    target = target if target is not None else telemetry_engine
+    if target is None:
+        return {}
+    from .models import TELEMETRY_MODELS
+
+    return {model: target for model in TELEMETRY_MODELS}
+
+
+def new_session() -> Session:
+    return Session(engine, binds=telemetry_binds())
+
+
+def _writer_connect(dbapi_connection, connection_record) -> None:
+    # Take over transaction control from pysqlite so SAVEPOINTs nest correctly.
+    dbapi_connection.isolation_level = None
+    dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+
+def _writer_begin(conn) -> None:
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def create_writer_engine(url: Optional[str] = None) -> Engine:
+    """Single-connection SQLite engine for the write queue.
+
+    Transactions start with BEGIN IMMEDIATE, so the writer takes the lock up
+    front instead of failing a read-to-write upgrade, and the database is put
+    in WAL mode so pooled readers never block its commits.
+    """
+    target = create_engine(
+        url or get_settings().database_url,
+        connect_args=_sqlite_connect_args(),
+        poolclass=StaticPool,
+    )
+    event.listen(target, "connect", _writer_connect)
+    event.listen(target, "begin", _writer_begin)
+    return instrument_engine(target)
+
+
+_async_engine: Optional["AsyncEngine"] = None
+_async_telemetry_engine: Optional["AsyncEngine"] = None
+
+
+def _async_support():
+    """Import the asyncio extension on demand (only the async agent path uses it)."""
+    try:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlmodel.ext.asyncio.session import AsyncSession
+    except Exception as exc:  # pragma: no cover - optional dependency guard
+        raise RuntimeError("Async DB path requires SQLAlchemy asyncio support.") from exc
+    return create_async_engine, AsyncSession
+
+
+def _create_async_engine(url: str) -> "AsyncEngine":
+    create_async_engine, _ = _async_support()
+    connect_args = _sqlite_connect_args() if "sqlite" in url.split("://", 1)[0] else {}
+    target = create_async_engine(url, connect_args=connect_args)
+    instrument_engine(target.sync_engine)
+    return target
+
+
+def get_async_engine() -> "AsyncEngine":
+    """Create the async engine on first use (requires aiosqlite/asyncpg)."""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = _create_async_engine(get_settings().resolved_async_database_url)
+    return _async_engine
+
+
+def get_async_telemetry_engine() -> Optional["AsyncEngine"]:
+    global _async_telemetry_engine
+    if _async_telemetry_engine is None and _telemetry_url:
+        _async_telemetry_engine = _create_async_engine(async_url(_telemetry_url))
+    return _async_telemetry_engine
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_telemetry_engine
+    for target in (_async_engine, _async_telemetry_engine):
+        if target is not None:
+            await target.dispose()
+    _async_engine = None
+    _async_telemetry_engine = None
+
+
+def dialect_insert(session: Session, model):
+    """INSERT construct supporting `on_conflict_do_update` (SQLite/PostgreSQL)."""
+    name = session.get_bind(model).dialect.name
+    if name == "sqlite":
+        return sqlite.insert(model)
+    if name == "postgresql":
+        return postgresql.insert(model)
+    raise RuntimeError(f"Upserts are not supported on {name}")
+
+
+def telemetry_tables() -> List[Any]:
+    from .models import TELEMETRY_MODELS
+
+    return [model.__table__ for model in TELEMETRY_MODELS]
 
 
 def init_db() -> None:
-    """Create all database tables."""
+    """Create all database tables (telemetry tables in their own database when configured).
+
+    Tables that already exist are then brought up to date by `migrations.upgrade_schema`.
+    """
     from . import models  # noqa: F401 - ensure models are registered
+    from .migrations import upgrade_schema
+
+    for target in all_engines():
+        prefer_incremental_vacuum(target)
+    if telemetry_engine is None:
+        SQLModel.metadata.create_all(engine)
+    else:
+        telemetry = telemetry_tables()
+        inventory = [table for table in SQLModel.metadata.sorted_tables if table not in telemetry]
+        SQLModel.metadata.create_all(engine, tables=inventory)
+        SQLModel.metadata.create_all(telemetry_engine, tables=telemetry)
+    upgrade_schema()
+
+
+def prune_in_batches(session: Session, model: Any, condition: Any, batch_size: int) -> int:
+    """Delete matching rows `batch_size` at a time, committing per batch."""
+    total = 0
+    while True:
+        batch = select(model.id).where(condition).limit(batch_size).scalar_subquery()
+        deleted = session.exec(delete(model).where(model.id.in_(batch))).rowcount
+        session.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def all_engines() -> List[Engine]:
+    return [engine] + ([telemetry_engine] if telemetry_engine is not None else [])
 
-    SQLModel.metadata.create_all(engine)
+
+def prefer_incremental_vacuum(target: Engine) -> None:
+    """New SQLite files use auto_vacuum=INCREMENTAL; it can only be set before the first table."""
+    if target.dialect.name != "sqlite":
+        return
+    with target.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA page_count").scalar() == 0:
+            conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+
+
+def maintain_database(target: Engine, vacuum_pages: int = 0) -> Optional[Dict[str, Any]]:
+    """Planner stats, incremental vacuum and WAL checkpoint for one SQLite file."""
+    if target.dialect.name != "sqlite":
+        return None
+    with target.connect() as conn:
+        # Bounded ANALYZE: samples each index instead of scanning whole tables.
+        conn.exec_driver_sql("PRAGMA analysis_limit=1000")
+        conn.exec_driver_sql("ANALYZE")
+        conn.exec_driver_sql("PRAGMA optimize")
+        incremental = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+        free_before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        if incremental and free_before:
+            pages = free_before if vacuum_pages <= 0 else min(int(vacuum_pages), free_before)
+            # pysqlite steps a statement once and the pragma frees a page per step.
+            for _ in range(pages):
+                conn.exec_driver_sql("PRAGMA incremental_vacuum")
+            conn.commit()
+        free_after = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        busy, wal_pages, checkpointed = conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").one()
+    return {
+        "database": target.url.database,
+        "auto_vacuum": "incremental" if incremental else "off",
+        "free_pages": free_after,
+        "pages_reclaimed": free_before - free_after,
+        "busy": bool(busy),
+        "wal_pages": wal_pages,
+        "checkpointed": checkpointed,
+    }
 
 
 def get_session() -> Iterator[Session]:
-    with Session(engine) as session:
+    with new_session() as session:
+        yield session
+
+
+async def get_async_session() -> AsyncIterator["AsyncSession"]:
+    _, AsyncSession = _async_support()
+    telemetry = get_async_telemetry_engine()
+    async with AsyncSession(
+        get_async_engine(), binds=telemetry_binds(telemetry) if telemetry else None, expire_on_commit=False
+    ) as session:
         yield session
 
 
 @contextmanager
 def session_scope() -> Iterator[Session]:
     """Context manager for scripts or background tasks."""
-    with Session(engine) as session:
+    with new_session() as session:
         try:
             yield session
             session.commit()
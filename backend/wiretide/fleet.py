@@ -0,0 +1,367 @@
+"""In-process read model of the fleet for the admin views.
+
+`FLEET` holds one `DeviceRecord` (with its `StatusRecord`) per device plus
+id sets per device_type, status and presence, so the device list, device
+detail and clients views filter, sort, count and page without SQL. It is
+loaded on startup (`main.warm_ui`) and kept current lazily:
+
+- Every INSERT/UPDATE of a device stamps `Device.changed_at` (a column
+  default/onupdate, so Core statements are covered too); status reports
+  stamp `DeviceStatus.updated_at`. Writers share no counter row.
+- Before answering, `sync` re-reads devices and status rows stamped after
+  its watermark (two indexed range scans, each against the database that
+  holds the table). The watermark trails the sync start by
+  `fleet_sync_overlap` (plus `sqlite_busy_timeout` on SQLite, since a
+  statement stamped in Python may wait that long for the write lock), so
+  rows committed shortly after their stamp are still picked up; rows seen
+  again without changes are skipped.
+- A write that commits later than that (e.g. a PostgreSQL lock wait) is
+  caught by the full reconcile every `fleet_reconcile_interval`: every row
+  is re-read and compared, so unchanged records keep their version.
+- Deletes bump the `fleet` generation in `cachegeneration`. When it moved,
+  the live ids are reconciled; a generation lower than the one seen (reset
+  or restored DB) triggers a full reload.
+
+Each record gets a `version` from a process-wide counter whenever its
+device or status content changes (row cache key, see templating). Client
+lists are kept as the stored JSON text and decoded on demand; the merged
+/clients list is cached until a status or hostname changes.
+"""
+
+import heapq
+import itertools
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import Text, type_coerce
+from sqlmodel import Session, select
+
+from .cache_bus import BUS, TOPIC_FLEET
+from .config import get_settings
+from .models import CacheGeneration, Device, DeviceStatus
+from .services import ClientSummary, merge_clients
+
+SORT_FIELDS = ("id", "hostname", "last_seen", "created_at")
+ID_CHUNK = 500
+
+_DEVICE_COLUMNS = (
+    Device.id,
+    Device.hostname,
+    Device.description,
+    Device.device_type,
+    Device.status,
+    Device.approved,
+    Device.last_seen,
+    Device.ssh_enabled,
+    Device.ssh_fingerprint,
+    Device.agent_version,
+    Device.agent_update_allowed,
+    Device.ip_last,
+    Device.presence,
+    Device.presence_changed_at,
+    Device.created_at,
+)
+_STATUS_COLUMNS = (
+    DeviceStatus.device_id,
+    DeviceStatus.dns_ok,
+    DeviceStatus.ntp_ok,
+    DeviceStatus.firewall_profile_active,
+    DeviceStatus.security_log_samples,
+    type_coerce(DeviceStatus.clients, Text),
+    DeviceStatus.updated_at,
+)
+
+
+_VERSIONS = itertools.count(1)
+
+
+def publish_fleet_delete(session: Session) -> None:
+    """Tell every worker's model to drop devices deleted in this transaction."""
+    BUS.publish(session, TOPIC_FLEET)
+
+
+class StatusRecord:
+    __slots__ = (
+        "device_id",
+        "dns_ok",
+        "ntp_ok",
+        "firewall_profile_active",
+        "security_log_samples",
+        "clients_json",
+        "updated_at",
+        "_summaries",
+    )
+
+    def __init__(self, row: Tuple[Any, ...]) -> None:
+        (
+            self.device_id,
+            self.dns_ok,
+            self.ntp_ok,
+            self.firewall_profile_active,
+            self.security_log_samples,
+            clients,
+            self.updated_at,
+        ) = row
+        # Drivers that decode JSON themselves (psycopg) hand back lists; keep the compact text form.
+        self.clients_json = clients if clients is None or isinstance(clients, str) else json.dumps(clients)
+        self._summaries: Optional[Tuple[ClientSummary, ...]] = None
+
+    def values(self) -> Tuple[Any, ...]:
+        return (
+            self.dns_ok,
+            self.ntp_ok,
+            self.firewall_profile_active,
+            self.security_log_samples,
+            self.clients_json,
+            self.updated_at,
+        )
+
+    @property
+    def clients(self) -> Optional[List[Dict[str, Any]]]:
+        return json.loads(self.clients_json) if self.clients_json else None
+
+    @property
+    def summaries(self) -> Tuple[ClientSummary, ...]:
+        if self._summaries is None:
+            self._summaries = tuple(ClientSummary(entry) for entry in self.clients or ())
+        return self._summaries
+
+
+class DeviceRecord:
+    __slots__ = tuple(column.key for column in _DEVICE_COLUMNS) + ("hostname_key", "status_row", "version")
+
+    def __init__(self, row: Tuple[Any, ...], status_row: Optional[StatusRecord] = None) -> None:
+        (
+            self.id,
+            self.hostname,
+            self.description,
+            self.device_type,
+            self.status,
+            self.approved,
+            self.last_seen,
+            self.ssh_enabled,
+            self.ssh_fingerprint,
+            self.agent_version,
+            self.agent_update_allowed,
+            self.ip_last,
+            self.presence,
+            self.presence_changed_at,
+            self.created_at,
+        ) = row
+        self.hostname_key = self.hostname.casefold()
+        self.status_row = status_row
+        self.version = next(_VERSIONS)
+
+    def values(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, column.key) for column in _DEVICE_COLUMNS)
+
+
+def _chunks(ids: List[int]) -> Iterable[List[int]]:
+    for start in range(0, len(ids), ID_CHUNK):
+        yield ids[start : start + ID_CHUNK]
+
+
+class FleetModel:
+    def __init__(self) -> None:
+        self.devices: Dict[int, DeviceRecord] = {}
+        self.generation: Optional[int] = None
+        # Rows stamped after this are re-read on the next sync.
+        self.watermark: Optional[datetime] = None
+        self.reconciled = float("-inf")
+        self._indexes: Dict[str, Dict[str, Set[int]]] = {"device_type": {}, "status": {}, "presence": {}}
+        self._hostname_rank: Optional[Dict[int, int]] = None
+        self._clients: Optional[List[Dict[str, Any]]] = None
+        self._lock = threading.RLock()
+
+    # -- synchronisation ---------------------------------------------------
+    def sync(self, session: Session) -> "FleetModel":
+        """Bring the model up to date with committed writes from any worker."""
+        with self._lock:
+            started = datetime.now(timezone.utc)
+            generation = (
+                session.exec(select(CacheGeneration.generation).where(CacheGeneration.name == TOPIC_FLEET)).first()
+                or 0
+            )
+            if self.generation is None or generation < self.generation:
+                self._load(session)
+            elif monotonic() - self.reconciled >= get_settings().fleet_reconcile_interval:
+                self._reconcile(session)
+            else:
+                self._refresh(session, deleted=generation != self.generation)
+            self.generation = generation
+            mark = started - timedelta(seconds=self._overlap(session))
+            self.watermark = mark if self.watermark is None else max(self.watermark, mark)
+        return self
+
+    @staticmethod
+    def _overlap(session: Session) -> float:
+        settings = get_settings()
+        sqlite = session.get_bind(Device).dialect.name == "sqlite"
+        return settings.fleet_sync_overlap + (settings.sqlite_busy_timeout if sqlite else 0.0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.generation = None
+
+    def _load(self, session: Session) -> None:
+        self.devices = {}
+        self._indexes = {name: {} for name in self._indexes}
+        self.watermark = None
+        self.reconciled = monotonic()
+        for row in session.exec(select(*_DEVICE_COLUMNS).order_by(Device.id)):
+            self._put(DeviceRecord(row))
+        for row in session.exec(select(*_STATUS_COLUMNS)):
+            record = self.devices.get(row[0])
+            if record is not None:
+                record.status_row = StatusRecord(row)
+        self._changed(hostnames=True)
+
+    def _reconcile(self, session: Session) -> None:
+        """Compare every row with the model; records whose content is unchanged are kept as they are."""
+        self.reconciled = monotonic()
+        rows = session.exec(select(*_DEVICE_COLUMNS)).all()
+        _, renamed = self._apply(rows)
+        gone = set(self.devices) - {row[0] for row in rows}
+        for device_id in gone:
+            self._drop(device_id)
+        statuses = self._apply_statuses(session.exec(select(*_STATUS_COLUMNS)).all())
+        if renamed or gone or statuses:
+            self._changed(hostnames=bool(renamed or gone))
+
+    def _refresh(self, session: Session, deleted: bool) -> None:
+        changed = session.exec(select(*_DEVICE_COLUMNS).where(Device.changed_at > self.watermark)).all()
+        added, renamed = self._apply(changed)
+        if deleted:
+            live = set(session.exec(select(Device.id)).all())
+            for device_id in set(self.devices) - live:
+                self._drop(device_id)
+            missing = sorted(live - set(self.devices))
+            for chunk in _chunks(missing):
+                added += self._apply(session.exec(select(*_DEVICE_COLUMNS).where(Device.id.in_(chunk))).all())[0]
+            renamed = True
+        # Read on their own watermark: with a telemetry database, status rows commit separately.
+        status_rows = session.exec(select(*_STATUS_COLUMNS).where(DeviceStatus.updated_at > self.watermark)).all()
+        for chunk in _chunks(added):
+            status_rows += session.exec(select(*_STATUS_COLUMNS).where(DeviceStatus.device_id.in_(chunk))).all()
+        statuses = self._apply_statuses(status_rows)
+        if renamed or statuses:
+            self._changed(hostnames=renamed)
+
+    def _apply(self, rows: List[Tuple[Any, ...]]) -> Tuple[List[int], bool]:
+        """Store changed device rows; (ids new to the model, whether a hostname was added or changed)."""
+        added: List[int] = []
+        renamed = False
+        for row in rows:
+            previous = self.devices.get(row[0])
+            if previous is None:
+                added.append(row[0])
+            elif previous.values() == tuple(row):
+                continue
+            renamed = renamed or previous is None or previous.hostname != row[1]
+            self._put(DeviceRecord(row, previous.status_row if previous else None))
+        return added, renamed
+
+    def _apply_statuses(self, rows: List[Tuple[Any, ...]]) -> bool:
+        """Attach changed status rows; True when any record changed."""
+        changed = False
+        for row in rows:
+            record = self.devices.get(row[0])
+            if record is None:
+                continue
+            status_row = StatusRecord(row)
+            if record.status_row is not None and record.status_row.values() == status_row.values():
+                continue
+            record.status_row = status_row
+            record.version = next(_VERSIONS)
+            changed = True
+        return changed
+
+    def _put(self, record: DeviceRecord) -> None:
+        if record.id in self.devices:
+            self._unindex(self.devices[record.id])
+        self.devices[record.id] = record
+        for name, index in self._indexes.items():
+            index.setdefault(getattr(record, name), set()).add(record.id)
+
+    def _drop(self, device_id: int) -> None:
+        self._unindex(self.devices.pop(device_id))
+
+    def _unindex(self, record: DeviceRecord) -> None:
+        for name, index in self._indexes.items():
+            index.get(getattr(record, name), set()).discard(record.id)
+
+    def _changed(self, hostnames: bool) -> None:
+        self._clients = None
+        if hostnames:
+            self._hostname_rank = None
+
+    # -- queries -----------------------------------------------------------
+    def get(self, device_id: int) -> Optional[DeviceRecord]:
+        return self.devices.get(device_id)
+
+    def query(
+        self,
+        device_type: Optional[str] = None,
+        status: Optional[str] = None,
+        presence: Optional[str] = None,
+        search: Optional[str] = None,
+        sort: str = "id",
+        offset: int = 0,
+        limit: Optional[int] = 50,
+    ) -> Tuple[int, List[DeviceRecord]]:
+        """(total matching, one page or with `limit=None` all records); `search` is a case-insensitive substring."""
+        with self._lock:
+            wanted = [
+                self._indexes[name].get(value, set())
+                for name, value in (("device_type", device_type), ("status", status), ("presence", presence))
+                if value
+            ]
+            if wanted:
+                wanted.sort(key=len)
+                records = [self.devices[device_id] for device_id in wanted[0].intersection(*wanted[1:])]
+            else:
+                records = list(self.devices.values())
+            if search:
+                needle = search.casefold()
+                records = [record for record in records if needle in record.hostname_key]
+            key, reverse = self._sort_key(sort)
+            end = len(records) if limit is None else max(offset, 0) + max(limit, 0)
+            if end < len(records) // 4:
+                page = (heapq.nlargest if reverse else heapq.nsmallest)(end, records, key=key)
+            else:
+                page = sorted(records, key=key, reverse=reverse)
+            return len(records), page[offset:end]
+
+    def _sort_key(self, sort: str) -> Tuple[Callable[[DeviceRecord], Any], bool]:
+        name = sort.lstrip("-")
+        if name not in SORT_FIELDS:
+            raise ValueError(f"cannot sort by {sort!r}")
+        if name == "hostname":
+            if self._hostname_rank is None:
+                ordered = sorted(self.devices.values(), key=lambda record: (record.hostname_key, record.id))
+                self._hostname_rank = {record.id: rank for rank, record in enumerate(ordered)}
+            rank = self._hostname_rank
+            key: Callable[[DeviceRecord], Any] = lambda record: rank[record.id]
+        elif name == "id":
+            key = lambda record: record.id
+        else:
+            # Unset timestamps sort first; ties fall back to id.
+            key = lambda record: (getattr(record, name) is not None, getattr(record, name), record.id)
+        return key, sort.startswith("-")
+
+    def clients(self) -> List[Dict[str, Any]]:
+        """All reported clients merged across devices (see services.merge_clients); cached until a status changes."""
+        with self._lock:
+            if self._clients is None:
+                self._clients = merge_clients(
+                    (record.id, record.hostname, record.status_row.updated_at, record.status_row.summaries)
+                    for record in self.devices.values()
+                    if record.status_row is not None and record.status_row.clients_json
+                )
+            return self._clients
+
+
+FLEET = FleetModel()
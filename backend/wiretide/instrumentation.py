@@ -0,0 +1,90 @@
+"""ASGI middleware binding the per-request context used by metrics, DB hooks and tracing."""
+
+from time import perf_counter, perf_counter_ns
+
+from .config import get_settings
+from .metrics import (
+    DB_QUERIES_PER_REQUEST,
+    DB_TIME_PER_REQUEST,
+    HTTP_IN_FLIGHT,
+    HTTP_LATENCY,
+    HTTP_REQUESTS,
+    route_template,
+)
+from .request_context import RequestContext, bind_request, unbind_request
+from .tracing import export, start_trace
+
+DB_DEBUG_HEADER = b"x-wiretide-db"
+SERVER_TIMING_HEADER = b"server-timing"
+
+
+def format_db_stats(ctx: RequestContext) -> str:
+    return (
+        f"queries={ctx.db_queries};time_ms={ctx.db_time * 1000.0:.2f};"
+        f"distinct={len(ctx.fingerprints)};repeated={ctx.repeated_statements}"
+    )
+
+
+class InstrumentationMiddleware:
+    """Pure ASGI middleware; avoids BaseHTTPMiddleware's extra task per request."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        settings = get_settings()
+        record_metrics = settings.metrics_enabled
+        db_header = settings.db_debug_header
+        ctx = RequestContext()
+        ctx.trace = trace = start_trace(scope.get("headers", []))
+        token = bind_request(ctx)
+        status_code = 500
+
+        async def send_wrapper(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if db_header or trace is not None:
+                    headers = list(message.get("headers", []))
+                    if db_header:
+                        headers.append((DB_DEBUG_HEADER, format_db_stats(ctx).encode("latin-1")))
+                    if trace is not None:
+                        timing = trace.server_timing(perf_counter_ns())
+                        headers.append((SERVER_TIMING_HEADER, timing.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        if record_metrics:
+            HTTP_IN_FLIGHT.inc()
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = perf_counter() - start
+            ctx.route = route_template(scope)
+            if trace is not None:
+                method = scope.get("method", "GET")
+                export(
+                    trace,
+                    f"{method} {ctx.route}",
+                    perf_counter_ns(),
+                    {
+                        "http.method": method,
+                        "http.route": ctx.route,
+                        "http.target": scope.get("path", ""),
+                        "http.status_code": status_code,
+                        "db.queries": ctx.db_queries,
+                    },
+                )
+            if record_metrics:
+                HTTP_IN_FLIGHT.dec()
+                method = scope.get("method", "GET")
+                HTTP_REQUESTS.inc(method, ctx.route, str(status_code))
+                HTTP_LATENCY.observe(elapsed, method, ctx.route)
+                DB_QUERIES_PER_REQUEST.observe(ctx.db_queries, ctx.route)
+                DB_TIME_PER_REQUEST.observe(ctx.db_time, ctx.route)
+            unbind_request(token)
@@ -1,63 +1,113 @@
 """Wiretide FastAPI application entrypoint."""
 
-from contextlib import asynccontextmanager
-from pathlib import Path
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
+from importlib.util import find_spec
 from typing import Any
 
 from fastapi import Depends, FastAPI, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
 from sqlmodel import Session, select
 
-try:
-    from fastapi.templating import Jinja2Templates
-except Exception:  # pragma: no cover - optional dependency guard
-    Jinja2Templates = None
-try:
-    import jinja2  # type: ignore
-except Exception:  # pragma: no cover
-    jinja2 = None
-try:
-    import multipart  # type: ignore
-
-    MULTIPART_AVAILABLE = True
-except Exception:  # pragma: no cover
-    MULTIPART_AVAILABLE = False
-
+from .assets import AssetFiles, load_manifest
 from .config import get_settings
-from .db import get_session, init_db, session_scope
-from .routes import router
+from .db import dispose_async_engine, get_session, init_db, session_scope
+from .fleet import FLEET
+from .backup import backup_router, run_scheduled_backup
+from .maintenance import maintenance_router, run_maintenance
+from .preregistration import preregistration_router
+from .profiler_routes import profiler_router
+from .profiling import ProfiledRoute
+from .instrumentation import InstrumentationMiddleware
+from .monitoring import monitoring_router
+from .background import run_periodically
+from .presence import run_presence_sweep
+from .updates import run_rollouts, updates_router
+from .routes import agent_router, router
+from .runtime import describe_runtime
 from .services import ensure_settings_seeded
+from .tracing import flush_traces
+from .templating import JINJA_AVAILABLE, get_templates, precompile_templates
+from .write_queue import start_write_queue, stop_write_queue
 from .auth import SESSION_TTL_SECONDS, issue_session_token, verify_password, validate_session_token
 
 
 settings = get_settings()
-BASE_PATH = Path(__file__).resolve().parent
-STATIC_DIR = (BASE_PATH.parent / settings.static_dir).resolve()
-TEMPLATES_DIR = (BASE_PATH.parent / settings.templates_dir).resolve()
-templates = (
-    Jinja2Templates(directory=str(TEMPLATES_DIR))
-    if Jinja2Templates and jinja2 is not None
-    else None
-)
-if templates:
-    templates.env.globals.update(
-        default_admin_username=settings.admin_username,
-        default_admin_has_password=bool(settings.admin_password_hash),
-    )
+logger = logging.getLogger("wiretide.main")
+# Checked without importing: the form parser is only loaded on the first login.
+MULTIPART_AVAILABLE = find_spec("multipart") is not None
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
+def warm_ui() -> None:
+    """Load UI-only pieces (asset manifest, templates, bcrypt, fleet model) after agents are served."""
+    load_manifest()
+    precompile_templates()
+    with session_scope() as session:
+        FLEET.sync(session)
+    if settings.admin_password_hash:
+        import bcrypt  # noqa: F401
+
+
+async def _warm_ui_in_background() -> None:
+    try:
+        await asyncio.to_thread(warm_ui)
+    except Exception:
+        logger.exception("UI warmup failed; templates will compile on first use")
+
+
+def _prepare_database() -> None:
     init_db()
     with session_scope() as session:
         ensure_settings_seeded(session)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(_prepare_database)
+    if settings.write_queue_enabled and settings.using_sqlite:
+        start_write_queue(max_batch=settings.write_queue_max_batch)
+    jobs = [
+        (settings.presence_sweep_interval, run_presence_sweep, "presence sweep"),
+        (settings.rollout_interval, run_rollouts, "rollout advance"),
+        (settings.db_maintenance_interval, run_maintenance, "database maintenance"),
+        (settings.backup_interval, run_scheduled_backup, "database backup"),
+    ]
+    tasks = [
+        asyncio.create_task(run_periodically(interval, job, name))
+        for interval, job, name in jobs
+        if interval > 0
+    ]
+    # Agent endpoints are live from here; the UI warms up behind them.
+    tasks.append(asyncio.create_task(_warm_ui_in_background()))
     yield
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    await asyncio.to_thread(stop_write_queue)
+    await dispose_async_engine()
+    flush_traces()
 
 
 app = FastAPI(title=settings.app_name, version=settings.version, lifespan=lifespan)
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+app.router.route_class = ProfiledRoute
+app.add_middleware(InstrumentationMiddleware)
+app.mount("/static", AssetFiles(), name="static")
+if settings.async_db_enabled:
+    from .async_routes import async_agent_router
+
+    app.include_router(async_agent_router)
+else:
+    app.include_router(agent_router)
 app.include_router(router)
+app.include_router(monitoring_router)
+app.include_router(updates_router)
+app.include_router(maintenance_router)
+app.include_router(backup_router)
+app.include_router(preregistration_router)
+app.include_router(profiler_router)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -71,7 +121,7 @@ def index(request: Request) -> Any:
     elif cookie_token and not settings.admin_password_hash:
         is_logged_in = cookie_token == settings.admin_token
 
-    if not templates:
+    if not JINJA_AVAILABLE:
         return HTMLResponse(
             content=f"{settings.app_name} v{settings.version}",
             status_code=200,
@@ -84,6 +134,7 @@ def index(request: Request) -> Any:
 
 @app.get("/login", response_class=HTMLResponse)
 def login_page(request: Request) -> Any:
+    templates = get_templates()
     if not templates:
         return HTMLResponse(content="Templates not available; ensure Jinja2 is installed.", status_code=501)
     return templates.TemplateResponse(
@@ -91,10 +142,8 @@ def login_page(request: Request) -> Any:
         {
             "request": request,
             "use_password": bool(settings.admin_password_hash),
-            "admin_username": settings.admin_username,
             "auth_page": True,
             "logged_out": request.query_params.get("logged_out") == "1",
-            "admin_has_password": bool(settings.admin_password_hash),
         },
     )
 
@@ -148,4 +197,4 @@ else:
 def health(session: Session = Depends(get_session)) -> dict:
     # Simple connectivity check; no schema assumptions.
     session.exec(select(1))
-    return {"status": "ok", "version": settings.version}
+    return {"status": "ok", "version": settings.version, "runtime": describe_runtime()}
@@ -0,0 +1,134 @@
+"""Scheduled database maintenance: retention pruning, planner stats, incremental vacuum.
+
+A pass prunes each retention rule in batches of `maintenance_batch_size` rows,
+committing after every batch so agent writes never wait long on the lock,
+then runs `db.maintain_database` on each database file (bounded ANALYZE,
+PRAGMA optimize, incremental vacuum, WAL checkpoint). Every pass is recorded
+as a `MaintenanceRun` with its duration and the rows/pages reclaimed.
+"""
+
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_
+from sqlmodel import Session, select
+
+from .config import get_settings
+from .db import get_session, maintain_database, prune_in_batches, session_scope
+from .models import Device, DeviceConfig, DeviceStatus, MaintenanceRun, PresenceEvent, RolloutTarget, SecurityEvent
+from .profiling import ProfiledRoute
+from .routes import require_admin_token
+from .schemas import MaintenanceRunOut
+from .updates import UPDATE_PACKAGE
+
+maintenance_router = APIRouter(route_class=ProfiledRoute)
+
+Rule = Tuple[str, Any, Any]
+
+
+def retention_rules(now: datetime) -> List[Rule]:
+    """(name, model, condition) per table; a retention of 0 days disables the rule."""
+    settings = get_settings()
+    rules: List[Rule] = [
+        # Configs queued for devices that were deleted outside remove_device.
+        ("deviceconfig_orphaned", DeviceConfig, DeviceConfig.device_id.not_in(select(Device.id))),
+    ]
+    # Updates queued by a rollout still waiting for the device are settled by the rollout, not by age.
+    in_rollout = and_(
+        DeviceConfig.package == UPDATE_PACKAGE,
+        DeviceConfig.device_id.in_(select(RolloutTarget.device_id).where(RolloutTarget.state == "updating")),
+    )
+    ages = (
+        ("deviceconfig", DeviceConfig, DeviceConfig.created_at, settings.config_retention_days, ~in_rollout),
+        ("securityevent", SecurityEvent, SecurityEvent.last_seen, settings.security_event_retention_days, None),
+        ("presenceevent", PresenceEvent, PresenceEvent.at, settings.presence_event_retention_days, None),
+        ("maintenancerun", MaintenanceRun, MaintenanceRun.started_at, settings.maintenance_run_retention_days, None),
+    )
+    for name, model, column, days, extra in ages:
+        if days > 0:
+            condition = column < now - timedelta(days=days)
+            rules.append((name, model, condition if extra is None else and_(condition, extra)))
+    return rules
+
+
+def session_engines(session: Session) -> List[Any]:
+    """Distinct engines behind the session (inventory, plus telemetry when split)."""
+    engines: List[Any] = []
+    for model in (Device, DeviceStatus):
+        bind = session.get_bind(model)
+        if bind not in engines:
+            engines.append(bind)
+    return engines
+
+
+def perform_maintenance(session: Session, now: Optional[datetime] = None) -> MaintenanceRun:
+    """Run one pass and record it; an error is stored on the run and re-raised."""
+    settings = get_settings()
+    now = now or datetime.now(timezone.utc)
+    run = MaintenanceRun(started_at=now)
+    session.add(run)
+    session.commit()
+    started = perf_counter()
+    rows: Dict[str, int] = {}
+    databases: List[Dict[str, Any]] = []
+    try:
+        for name, model, condition in retention_rules(now):
+            deleted = prune_in_batches(session, model, condition, max(settings.maintenance_batch_size, 1))
+            if deleted:
+                rows[name] = deleted
+        for target in session_engines(session):
+            result = maintain_database(target, settings.maintenance_vacuum_pages)
+            if result is not None:
+                databases.append(result)
+    except Exception as exc:
+        session.rollback()
+        run.error = str(exc)[:500]
+        raise
+    finally:
+        run.finished_at = datetime.now(timezone.utc)
+        run.duration_ms = round((perf_counter() - started) * 1000, 1)
+        run.rows_deleted = rows
+        run.databases = databases
+        run.pages_reclaimed = sum(result["pages_reclaimed"] for result in databases)
+        session.add(run)
+        session.commit()
+        session.refresh(run)
+    return run
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def run_maintenance() -> Optional[Dict[str, Any]]:
+    """Background job (see main.lifespan); skipped when another worker just ran it."""
+    interval = get_settings().db_maintenance_interval
+    now = datetime.now(timezone.utc)
+    with session_scope() as session:
+        last = session.exec(select(MaintenanceRun.started_at).order_by(MaintenanceRun.id.desc())).first()
+        if last is not None and _utc(last) > now - timedelta(seconds=interval / 2):
+            return None
+        run = perform_maintenance(session, now)
+        return {"duration_ms": run.duration_ms, "rows_deleted": run.rows_deleted, "pages_reclaimed": run.pages_reclaimed}
+
+
+@maintenance_router.get("/api/maintenance/runs", response_model=List[MaintenanceRunOut])
+def list_maintenance_runs(
+    limit: int = 20,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> List[MaintenanceRunOut]:
+    stmt = select(MaintenanceRun).order_by(MaintenanceRun.id.desc()).limit(min(limit, 200))
+    return [MaintenanceRunOut.model_validate(row, from_attributes=True) for row in session.exec(stmt).all()]
+
+
+@maintenance_router.post("/api/maintenance/run", response_model=MaintenanceRunOut)
+async def trigger_maintenance(
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> MaintenanceRunOut:
+    run = await run_in_threadpool(perform_maintenance, session)
+    return MaintenanceRunOut.model_validate(run, from_attributes=True)
@@ -0,0 +1,280 @@
+"""In-process metrics with Prometheus text exposition output.
+
+Metrics are plain counters/histograms guarded by a lock per metric, so the
+per-request cost is a dict lookup and a bisect. Gauges that describe the
+database (queue depth, devices by status) are computed at scrape time instead
+of being maintained on every write.
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from .models import Device, DeviceConfig
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Sequence[str]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(v) for v in labels)
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def samples(self) -> List[str]:  # pragma: no cover - overridden
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return self.header() + self.samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(val)}"
+            for key, val in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0.0] * (len(self.buckets) + 2)
+                self._series[key] = series
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return int(sum(series[:-1])) if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines: List[str] = []
+        bucket_names = self.labelnames + ("le",)
+        for key, series in items:
+            cumulative = 0.0
+            for bound, observed in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += observed
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(bucket_names, key + (_format_value(bound),))} "
+                    f"{_format_value(cumulative)}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds process-wide metrics plus scrape-time collectors."""
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[..., Iterable[_Metric]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def add_collector(self, collector: Callable[..., Iterable[_Metric]]) -> None:
+        """Register a callable returning metrics built at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self, *collector_args) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for metric in collector(*collector_args):
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "wiretide_http_requests_total",
+    "HTTP requests by method, route template and status code.",
+    ("method", "route", "status"),
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "wiretide_http_request_duration_seconds",
+    "HTTP request latency by method and route template.",
+    ("method", "route"),
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "wiretide_http_requests_in_flight",
+    "HTTP requests currently being served.",
+)
+DB_QUERIES_PER_REQUEST = REGISTRY.histogram(
+    "wiretide_db_queries_per_request",
+    "SQL statements executed per HTTP request by route template.",
+    ("route",),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+DB_TIME_PER_REQUEST = REGISTRY.histogram(
+    "wiretide_db_time_seconds",
+    "Time spent executing SQL per HTTP request by route template.",
+    ("route",),
+)
+HEARTBEATS = REGISTRY.counter(
+    "wiretide_heartbeats_total",
+    "Accepted agent /status heartbeats.",
+)
+FRAGMENT_CACHE = REGISTRY.counter(
+    "wiretide_fragment_cache_total",
+    "Rendered UI fragment lookups by cache and result (hit, miss, evict).",
+    ("cache", "result"),
+)
+WRITE_BATCH_SIZE = REGISTRY.histogram(
+    "wiretide_write_queue_batch_size",
+    "Write units committed per write-queue transaction.",
+    buckets=QUERY_COUNT_BUCKETS,
+)
+
+
+def _fleet_gauges(session: Session) -> Iterable[_Metric]:
+    queue_depth = Gauge(
+        "wiretide_config_queue_depth",
+        "Queued (undelivered) config packages across all devices.",
+    )
+    queue_depth.set(session.exec(select(func.count()).select_from(DeviceConfig)).one())
+    devices = Gauge(
+        "wiretide_devices",
+        "Devices by lifecycle status and device type.",
+        ("status", "device_type"),
+    )
+    rows = session.exec(
+        select(Device.status, Device.device_type, func.count()).group_by(
+            Device.status, Device.device_type
+        )
+    ).all()
+    for status_value, device_type, count in rows:
+        devices.set(count, status_value, device_type)
+    presence = Gauge(
+        "wiretide_devices_presence",
+        "Devices by presence state (heartbeat derived).",
+        ("presence",),
+    )
+    rows = session.exec(select(Device.presence, func.count()).group_by(Device.presence)).all()
+    for presence_value, count in rows:
+        presence.set(count, presence_value)
+    return (queue_depth, devices, presence)
+
+
+REGISTRY.add_collector(_fleet_gauges)
+
+
+def route_template(scope: dict) -> str:
+    """Return the matched route template (low cardinality) for an ASGI scope."""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return path
+    raw_path = scope.get("path", "")
+    if raw_path.startswith("/static/"):
+        return "/static"
+    return "<unmatched>"
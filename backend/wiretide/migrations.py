@@ -0,0 +1,120 @@
+"""Idempotent startup upgrade for databases created by older releases.
+
+`create_all` only creates missing tables. Columns, indexes and unique keys
+added to existing tables since (device presence, `device.changed_at`, the
+unique `device.hostname` / `devicestatus.device_id` keys the upserts rely
+on) are added by `upgrade_schema`, which `db.init_db` runs on every start.
+Each step first checks the live schema, so a current database costs a few
+catalog reads. When several workers start at once, a step that fails
+because another worker just applied it is skipped.
+
+Before a unique index is built, duplicate rows are removed: of devices
+sharing a hostname the oldest (lowest id) is kept and the others are
+deleted with their dependent rows; of status rows sharing a device the
+newest is kept.
+"""
+
+import logging
+from typing import Any, Callable, List, Optional, Set
+
+from sqlalchemy import delete, inspect, literal
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Session, SQLModel, func, select
+
+from . import db
+from .models import Device, DeviceStatus
+from .routes import DEVICE_CHILD_MODELS
+
+logger = logging.getLogger("wiretide.migrations")
+
+
+def upgrade_schema(bind: Optional[Engine] = None, telemetry_bind: Optional[Engine] = None) -> List[str]:
+    """Bring existing tables up to the models (defaults: the app's engines); returns the steps applied."""
+    if bind is None:
+        bind, telemetry_bind = db.engine, db.telemetry_engine
+    telemetry = db.telemetry_tables() if telemetry_bind is not None else []
+    applied: List[str] = []
+    for table in SQLModel.metadata.sorted_tables:
+        target = telemetry_bind if table in telemetry else bind
+        applied += _upgrade_table(target, table, lambda: Session(bind, binds=db.telemetry_binds(telemetry_bind)))
+    for step in applied:
+        logger.info("schema upgrade: %s", step)
+    return applied
+
+
+def _upgrade_table(target: Engine, table: Any, session: Callable[[], Session]) -> List[str]:
+    applied: List[str] = []
+    if not inspect(target).has_table(table.name):
+        return applied
+    for column in table.columns:
+        if column.name not in _column_names(target, table.name):
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {_column_ddl(target, column)}"
+            _apply(target, ddl, lambda name=column.name: name in _column_names(target, table.name))
+            applied.append(ddl)
+    for column in table.columns:
+        if column.unique and not _has_unique(target, table.name, column.name):
+            with session() as dedupe_session:
+                removed = _dedupe(dedupe_session, table.name)
+                dedupe_session.commit()
+            ddl = f"CREATE UNIQUE INDEX ix_{table.name}_{column.name} ON {table.name} ({column.name})"
+            _apply(target, ddl, lambda name=column.name: _has_unique(target, table.name, name))
+            applied.append(f"{ddl} (removed {removed} duplicate rows)")
+    for index in table.indexes:
+        if index.name not in _index_names(target, table.name):
+            _apply(target, index, lambda name=index.name: name in _index_names(target, table.name))
+            applied.append(f"CREATE INDEX {index.name} ON {table.name}")
+    return applied
+
+
+def _column_ddl(target: Engine, column: Any) -> str:
+    ddl = column.type.compile(dialect=target.dialect)
+    default = column.default
+    # NOT NULL needs a value for the existing rows; columns with computed defaults are added nullable.
+    if not column.nullable and default is not None and default.is_scalar:
+        value = literal(default.arg, column.type).compile(dialect=target.dialect, compile_kwargs={"literal_binds": True})
+        ddl += f" NOT NULL DEFAULT {value}"
+    return ddl
+
+
+def _apply(target: Engine, step: Any, done: Callable[[], bool]) -> None:
+    try:
+        with target.begin() as conn:
+            if isinstance(step, str):
+                conn.exec_driver_sql(step)
+            else:
+                step.create(conn)
+    except DBAPIError:
+        # Another worker starting at the same time may have applied it first.
+        if not done():
+            raise
+
+
+def _column_names(target: Engine, table: str) -> Set[str]:
+    return {column["name"] for column in inspect(target).get_columns(table)}
+
+
+def _index_names(target: Engine, table: str) -> Set[str]:
+    return {index["name"] for index in inspect(target).get_indexes(table)}
+
+
+def _has_unique(target: Engine, table: str, column: str) -> bool:
+    inspector = inspect(target)
+    keys = [index["column_names"] for index in inspector.get_indexes(table) if index.get("unique")]
+    keys += [constraint["column_names"] for constraint in inspector.get_unique_constraints(table)]
+    return [column] in keys
+
+
+def _dedupe(session: Session, table: str) -> int:
+    if table == DeviceStatus.__tablename__:
+        keep = select(func.max(DeviceStatus.id)).group_by(DeviceStatus.device_id)
+        return session.exec(delete(DeviceStatus).where(DeviceStatus.id.not_in(keep))).rowcount
+    if table != Device.__tablename__:
+        return 0
+    keep = select(func.min(Device.id)).group_by(Device.hostname)
+    ids = list(session.exec(select(Device.id).where(Device.id.not_in(keep))).all())
+    if ids:
+        for model in DEVICE_CHILD_MODELS:
+            session.exec(delete(model).where(model.device_id.in_(ids)))
+        session.exec(delete(Device).where(Device.id.in_(ids)))
+    return len(ids)
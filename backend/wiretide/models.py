@@ -3,13 +3,16 @@
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column, Index, JSON, UniqueConstraint
 from sqlmodel import Field, SQLModel
 
 
 class Device(SQLModel, table=True):
+    # Presence listings/counts and the sweeper's cutoff scan stay index-only.
+    __table_args__ = (Index("ix_device_presence_last_seen", "presence", "last_seen"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    hostname: str
+    hostname: str = Field(unique=True)
     description: Optional[str] = Field(default=None)
     device_type: str = Field(default="unknown", description="router|switch|firewall|access_point|unknown")
     status: str = Field(default="waiting", description="waiting|approved|blocked")
@@ -20,12 +23,20 @@ class Device(SQLModel, table=True):
     agent_version: Optional[str] = Field(default=None)
     agent_update_allowed: bool = Field(default=False)
     ip_last: Optional[str] = Field(default=None, description="last known IP address")
+    presence: str = Field(default="unknown", description="unknown|online|stale|offline")
+    presence_changed_at: Optional[datetime] = Field(default=None)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # Set on every INSERT/UPDATE (ORM and Core); the fleet model re-reads rows changed since its last sync.
+    changed_at: Optional[datetime] = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        index=True,
+        sa_column_kwargs={"onupdate": lambda: datetime.now(timezone.utc)},
+    )
 
 
 class DeviceStatus(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    device_id: int = Field(foreign_key="device.id")
+    device_id: int = Field(foreign_key="device.id", unique=True)
     dns_ok: bool = Field(default=False)
     ntp_ok: bool = Field(default=False)
     firewall_profile_active: Optional[str] = Field(default=None)
@@ -35,7 +46,40 @@ class DeviceStatus(SQLModel, table=True):
     clients: Optional[List[Dict[str, Any]]] = Field(
         default=None, sa_column=Column(JSON)
     )
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+
+
+class PresenceEvent(SQLModel, table=True):
+    """Append-only log of presence transitions (written only when state changes)."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    device_id: int = Field(foreign_key="device.id", index=True)
+    previous: str
+    presence: str
+    at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+
+
+class SecurityEvent(SQLModel, table=True):
+    """Security events from `/status`; one row per (device, fingerprint, time bucket)."""
+
+    __table_args__ = (
+        UniqueConstraint("device_id", "fingerprint", "bucket", name="uq_securityevent_dedup"),
+        Index("ix_securityevent_device_last_seen", "device_id", "last_seen"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    device_id: int = Field(foreign_key="device.id")
+    event_type: str = Field(description="e.g. firewall_drop|wifi_auth_failure|ssh_failure")
+    severity: Optional[str] = Field(default=None)
+    src: Optional[str] = Field(default=None)
+    dst: Optional[str] = Field(default=None)
+    raw: Optional[str] = Field(default=None, description="first raw log line seen for this key")
+    tags: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
+    fingerprint: str
+    bucket: datetime
+    first_seen: datetime
+    last_seen: datetime = Field(index=True)
+    count: int = Field(default=1)
 
 
 class DeviceConfig(SQLModel, table=True):
@@ -47,6 +91,47 @@ class DeviceConfig(SQLModel, table=True):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
+class AgentArtifact(SQLModel, table=True):
+    """Agent update artifact stored on disk under its sha256 (content-addressed)."""
+
+    sha256: str = Field(primary_key=True)
+    version: str = Field(index=True)
+    filename: str
+    size: int
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class UpdateRollout(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    artifact_sha256: str = Field(foreign_key="agentartifact.sha256")
+    version: str
+    status: str = Field(default="active", description="active|paused|completed|cancelled")
+    percent: int = Field(default=100, description="share of the cohort (0-100) included in this rollout")
+    device_types: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
+    max_concurrent: int = Field(default=25, description="devices updating at the same time")
+    error_threshold: float = Field(default=0.2, description="pause when failed/finished exceeds this")
+    min_reports: int = Field(default=10, description="finished updates required before the error check")
+    pause_reason: Optional[str] = Field(default=None)
+    resumed_at: Optional[datetime] = Field(default=None, description="error rate only counts updates after this")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class RolloutTarget(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("rollout_id", "device_id", name="uq_rollouttarget_device"),
+        Index("ix_rollouttarget_rollout_state", "rollout_id", "state"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    rollout_id: int = Field(foreign_key="updaterollout.id")
+    device_id: int = Field(foreign_key="device.id", index=True)
+    state: str = Field(default="updating", description="updating|succeeded|failed")
+    error: Optional[str] = Field(default=None)
+    assigned_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = Field(default=None)
+
+
 class ControllerSettings(SQLModel, table=True):
     id: int = Field(default=1, primary_key=True)
     shared_token: str
@@ -58,3 +143,57 @@ class ControllerSettings(SQLModel, table=True):
         default=None, sa_column=Column(JSON)
     )
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class CacheGeneration(SQLModel, table=True):
+    """Per-topic generation counters for cross-worker cache invalidation."""
+
+    name: str = Field(primary_key=True)
+    generation: int = Field(default=0)
+
+
+class PreRegistration(SQLModel, table=True):
+    """Device imported ahead of its first `/register` (see preregistration.py).
+
+    An agent registering with this hostname and `ssh_fingerprint` is approved
+    immediately; `claimed_at`/`device_id` record which device took the entry.
+    """
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    hostname: str = Field(unique=True)
+    device_type: str
+    description: Optional[str] = Field(default=None)
+    ssh_fingerprint: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    claimed_at: Optional[datetime] = Field(default=None)
+    device_id: Optional[int] = Field(default=None)
+
+
+class ProfilerArm(SQLModel, table=True):
+    """Single row (id=1): the armed profiling request budget shared by all workers."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    pattern: str
+    method: Optional[str] = Field(default=None)
+    mode: str = Field(default="cprofile", description="cprofile|sample")
+    remaining: int = Field(default=0)
+    armed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    expires_at: datetime
+
+
+class MaintenanceRun(SQLModel, table=True):
+    """One scheduled maintenance pass (see maintenance.run_maintenance)."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    started_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+    finished_at: Optional[datetime] = Field(default=None)
+    duration_ms: Optional[float] = Field(default=None)
+    rows_deleted: Dict[str, int] = Field(default_factory=dict, sa_column=Column(JSON))
+    pages_reclaimed: int = Field(default=0)
+    databases: List[Dict[str, Any]] = Field(default_factory=list, sa_column=Column(JSON))
+    error: Optional[str] = Field(default=None)
+
+
+# High-churn heartbeat data; lives in `telemetry_database_url` when configured
+# (see db.telemetry_binds). Queries must not join these with inventory tables.
+TELEMETRY_MODELS = (DeviceStatus, PresenceEvent, SecurityEvent)
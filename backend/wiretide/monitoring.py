@@ -0,0 +1,255 @@
+"""Security Monitoring API: cursor-based NDJSON stream of security and presence events.
+
+Consumers tail the fleet by passing back the cursor from the last line of
+each batch. The cursor holds the last delivered id per source table, so a
+batch is an index range scan on the primary keys; no OFFSET, no re-reads.
+
+Security rows keep counting while their dedup bucket is open, and the id
+cursor would not bring a row back after it grew. By default the stream
+therefore stops at the first row whose bucket closed less than
+`security_event_settle_seconds` ago; ingest never writes a closed bucket (see
+`security_events`), so a delivered row is final. `settled=false` streams rows
+as soon as they exist, with counts that may still grow.
+"""
+
+import asyncio
+import heapq
+import hmac
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from .config import get_settings
+from .db import get_session
+from .models import Device, PresenceEvent, SecurityEvent
+from .profiling import ProfiledRoute
+from .routes import require_admin_token
+from .services import monitoring_api_enabled
+
+monitoring_router = APIRouter(route_class=ProfiledRoute)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+PRESENCE_TYPE_PREFIX = "presence_"
+MAX_BATCH = 5000
+MAX_WAIT_SECONDS = 30.0
+WAIT_POLL_SECONDS = 1.0
+_CURSOR = re.compile(r"^s(\d+)-p(\d+)$")
+
+Cursor = Tuple[int, int]
+
+
+def require_monitoring_access(
+    request: Request,
+    authorization: Optional[str] = Header(default=None, alias="Authorization"),
+    x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token"),
+    session: Session = Depends(get_session),
+) -> None:
+    """404 while the Monitoring API is off; accepts the monitoring bearer token or admin auth."""
+    if not monitoring_api_enabled(session):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Monitoring API disabled",
+        )
+    api_token = get_settings().monitoring_api_token
+    if api_token and authorization and authorization.startswith("Bearer "):
+        if hmac.compare_digest(authorization[len("Bearer "):].strip(), api_token):
+            return
+    require_admin_token(x_admin_token, authorization, request, session)
+
+
+def format_cursor(cursor: Cursor) -> str:
+    return f"s{cursor[0]}-p{cursor[1]}"
+
+
+def parse_cursor(session: Session, value: Optional[str]) -> Cursor:
+    """`None`/empty starts at the beginning; `now` starts after the newest events."""
+    if not value:
+        return (0, 0)
+    if value == "now":
+        return (
+            session.exec(select(func.coalesce(func.max(SecurityEvent.id), 0))).one(),
+            session.exec(select(func.coalesce(func.max(PresenceEvent.id), 0))).one(),
+        )
+    match = _CURSOR.match(value)
+    if not match:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+    return (int(match.group(1)), int(match.group(2)))
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _iso(value: datetime) -> str:
+    return _utc(value).isoformat().replace("+00:00", "Z")
+
+
+def _security_item(row: SecurityEvent, hostname: str) -> Dict[str, Any]:
+    return {
+        "kind": "security",
+        "id": row.id,
+        "device_id": row.device_id,
+        "device_name": hostname,
+        "time": _iso(row.first_seen),
+        "last_seen": _iso(row.last_seen),
+        "type": row.event_type,
+        "severity": row.severity,
+        "src": row.src,
+        "dst": row.dst,
+        "message": row.raw,
+        "tags": row.tags or [],
+        "count": row.count,
+    }
+
+
+def _presence_item(row: PresenceEvent, hostname: str) -> Dict[str, Any]:
+    return {
+        "kind": "presence",
+        "id": row.id,
+        "device_id": row.device_id,
+        "device_name": hostname,
+        "time": _iso(row.at),
+        "type": PRESENCE_TYPE_PREFIX + row.presence,
+        "previous": row.previous,
+        "presence": row.presence,
+    }
+
+
+def _hostnames(session: Session, device_ids: Set[int]) -> Dict[int, str]:
+    # Events may live in the telemetry database, so names are looked up by id.
+    if not device_ids:
+        return {}
+    return dict(session.exec(select(Device.id, Device.hostname).where(Device.id.in_(device_ids))).all())
+
+
+def fetch_batch(
+    session: Session,
+    cursor: Cursor,
+    limit: int,
+    device_ids: List[int],
+    types: List[str],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    settled: bool,
+) -> Tuple[List[Dict[str, Any]], Cursor]:
+    """Next events after `cursor`, merged by time while keeping each source in id order."""
+    security_types = [t for t in types if not t.startswith(PRESENCE_TYPE_PREFIX)]
+    presence_states = [t[len(PRESENCE_TYPE_PREFIX):] for t in types if t.startswith(PRESENCE_TYPE_PREFIX)]
+
+    security_rows: List[SecurityEvent] = []
+    if not types or security_types:
+        stmt = (
+            select(SecurityEvent)
+            .where(SecurityEvent.id > cursor[0])
+            .order_by(SecurityEvent.id)
+            .limit(limit)
+        )
+        if device_ids:
+            stmt = stmt.where(SecurityEvent.device_id.in_(device_ids))
+        if security_types:
+            stmt = stmt.where(SecurityEvent.event_type.in_(security_types))
+        if since:
+            stmt = stmt.where(SecurityEvent.first_seen >= since)
+        if until:
+            stmt = stmt.where(SecurityEvent.first_seen < until)
+        settings = get_settings()
+        open_after = datetime.now(timezone.utc) - timedelta(
+            seconds=settings.security_event_bucket_seconds + settings.security_event_settle_seconds
+        )
+        for row in session.exec(stmt):
+            # Settled mode stops at the first row whose bucket can still grow (or a late write can still reach).
+            if settled and _utc(row.bucket) > open_after:
+                break
+            security_rows.append(row)
+
+    presence_rows: List[PresenceEvent] = []
+    if not types or presence_states:
+        stmt = (
+            select(PresenceEvent)
+            .where(PresenceEvent.id > cursor[1])
+            .order_by(PresenceEvent.id)
+            .limit(limit)
+        )
+        if device_ids:
+            stmt = stmt.where(PresenceEvent.device_id.in_(device_ids))
+        if presence_states:
+            stmt = stmt.where(PresenceEvent.presence.in_(presence_states))
+        if since:
+            stmt = stmt.where(PresenceEvent.at >= since)
+        if until:
+            stmt = stmt.where(PresenceEvent.at < until)
+        presence_rows = list(session.exec(stmt))
+
+    names = _hostnames(session, {row.device_id for row in security_rows} | {row.device_id for row in presence_rows})
+    # Rows of devices deleted meanwhile are skipped, as the inner join used to.
+    security = [
+        (_utc(row.first_seen), _security_item(row, names[row.device_id]))
+        for row in security_rows
+        if row.device_id in names
+    ]
+    presence = [
+        (_utc(row.at), _presence_item(row, names[row.device_id]))
+        for row in presence_rows
+        if row.device_id in names
+    ]
+
+    merged = heapq.merge(security, presence, key=lambda pair: pair[0])
+    items = [item for _, item in merged][:limit]
+    security_ids = [item["id"] for item in items if item["kind"] == "security"]
+    presence_ids = [item["id"] for item in items if item["kind"] == "presence"]
+    next_cursor = (
+        security_ids[-1] if security_ids else cursor[0],
+        presence_ids[-1] if presence_ids else cursor[1],
+    )
+    return items, next_cursor
+
+
+def _ndjson(items: List[Dict[str, Any]], cursor: Cursor, limit: int) -> Iterator[str]:
+    for item in items:
+        yield json.dumps(item, separators=(",", ":")) + "\n"
+    trailer = {"kind": "cursor", "cursor": format_cursor(cursor), "count": len(items), "more": len(items) >= limit}
+    yield json.dumps(trailer, separators=(",", ":")) + "\n"
+
+
+@monitoring_router.get("/api/monitoring/events")
+async def stream_events(
+    cursor: Optional[str] = None,
+    device_id: List[int] = Query(default=[]),
+    type: List[str] = Query(default=[]),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 500,
+    wait: float = 0.0,
+    settled: bool = True,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_monitoring_access),
+) -> StreamingResponse:
+    """NDJSON batch of events after `cursor`; the last line carries the next cursor.
+
+    `wait` (seconds, max 30) long-polls until at least one event arrives. Security rows
+    are held back until their bucket has settled unless `settled=false`.
+    """
+    limit = max(1, min(limit, MAX_BATCH))
+    position = await run_in_threadpool(parse_cursor, session, cursor)
+    deadline = monotonic() + max(0.0, min(wait, MAX_WAIT_SECONDS))
+    while True:
+        items, next_cursor = await run_in_threadpool(
+            fetch_batch, session, position, limit, device_id, type, since, until, settled
+        )
+        # End the read transaction so the next poll sees new commits.
+        session.rollback()
+        if items or monotonic() >= deadline:
+            break
+        await asyncio.sleep(WAIT_POLL_SECONDS)
+    return StreamingResponse(_ndjson(items, next_cursor, limit), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,190 @@
+"""Bulk device pre-registration (inventory import).
+
+`POST /api/devices/import` takes NDJSON or CSV rows of hostname, device_type,
+description and ssh_fingerprint. Rows are upserted into `PreRegistration`
+`import_chunk_size` at a time (one multi-row INSERT and one commit per chunk);
+devices that already registered and match are approved in the same chunk.
+Later registrations are approved by `services.claim_preregistration`.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from .config import get_settings
+from .db import dialect_insert, get_session
+from .models import Device, PreRegistration
+from .profiling import ProfiledRoute
+from .routes import UNKNOWN_DEVICE_TYPE, VALID_DEVICE_TYPES, require_admin_token
+from .schemas import ImportResult, ImportRowResult, PreRegistrationIn, PreRegistrationOut
+
+preregistration_router = APIRouter(route_class=ProfiledRoute)
+
+MAX_IMPORT_BYTES = 16 * 1024 * 1024
+ParsedRow = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+
+def parse_ndjson(text: str) -> List[ParsedRow]:
+    rows: List[ParsedRow] = []
+    for line, raw in enumerate(text.splitlines(), start=1):
+        if not raw.strip():
+            continue
+        try:
+            value = json.loads(raw)
+        except ValueError as exc:
+            rows.append((line, None, f"invalid JSON: {exc.msg}"))
+            continue
+        rows.append((line, value, None) if isinstance(value, dict) else (line, None, "expected a JSON object"))
+    return rows
+
+
+def parse_csv(text: str) -> List[ParsedRow]:
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or "hostname" not in reader.fieldnames:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="CSV header must include hostname")
+    return [
+        (reader.line_num, {key: value for key, value in row.items() if key and value not in (None, "")}, None)
+        for row in reader
+    ]
+
+
+def validate_row(raw: Dict[str, Any]) -> Tuple[Optional[PreRegistrationIn], Optional[str]]:
+    try:
+        item = PreRegistrationIn.model_validate(raw)
+    except ValidationError as exc:
+        first = exc.errors()[0]
+        return None, f"{'.'.join(str(part) for part in first['loc']) or 'row'}: {first['msg']}"
+    if item.device_type not in VALID_DEVICE_TYPES or item.device_type == UNKNOWN_DEVICE_TYPE:
+        return None, "device_type must be a known, non-unknown type"
+    item.hostname = item.hostname.strip()
+    item.ssh_fingerprint = item.ssh_fingerprint.strip()
+    return item, None
+
+
+def _import_chunk(
+    session: Session, chunk: List[Tuple[int, PreRegistrationIn]], now: datetime
+) -> Tuple[Set[str], Set[str]]:
+    """Upsert one chunk and approve matching waiting devices; returns (existing, approved) hostnames."""
+    hostnames = [item.hostname for _, item in chunk]
+    existing = set(session.exec(select(PreRegistration.hostname).where(PreRegistration.hostname.in_(hostnames))))
+    stmt = dialect_insert(session, PreRegistration).values(
+        [{**item.model_dump(), "created_at": now} for _, item in chunk]
+    )
+    session.exec(
+        stmt.on_conflict_do_update(
+            index_elements=["hostname"],
+            set_={column: stmt.excluded[column] for column in ("device_type", "description", "ssh_fingerprint")},
+        )
+    )
+
+    # Devices that registered before the import: approve matches, grouped per type.
+    expected = {item.hostname: item for _, item in chunk}
+    waiting = session.exec(
+        select(Device.id, Device.hostname, Device.ssh_fingerprint).where(
+            Device.hostname.in_(hostnames), Device.status == "waiting", Device.ssh_enabled.is_(True)
+        )
+    ).all()
+    by_type: Dict[str, List[int]] = {}
+    approved: Set[str] = set()
+    for device_id, hostname, fingerprint in waiting:
+        if fingerprint and fingerprint.strip() == expected[hostname].ssh_fingerprint:
+            by_type.setdefault(expected[hostname].device_type, []).append(device_id)
+            approved.add(hostname)
+    for device_type, ids in by_type.items():
+        session.exec(
+            update(Device).where(Device.id.in_(ids)).values(status="approved", approved=True, device_type=device_type)
+        )
+    if approved:
+        session.exec(
+            update(PreRegistration)
+            .where(PreRegistration.hostname.in_(approved))
+            .values(
+                claimed_at=now,
+                device_id=select(Device.id).where(Device.hostname == PreRegistration.hostname).scalar_subquery(),
+            )
+        )
+    session.commit()
+    return existing, approved
+
+
+def import_preregistrations(session: Session, rows: List[ParsedRow], now: Optional[datetime] = None) -> ImportResult:
+    now = now or datetime.now(timezone.utc)
+    chunk_size = max(get_settings().import_chunk_size, 1)
+    results: Dict[int, ImportRowResult] = {}
+    valid: List[Tuple[int, PreRegistrationIn]] = []
+    seen = set()
+    for line, raw, error in rows:
+        item = None
+        if raw is not None:
+            item, error = validate_row(raw)
+        if item is not None and item.hostname in seen:
+            item, error = None, "duplicate hostname in this file"
+        if item is None:
+            hostname = raw.get("hostname") if isinstance(raw, dict) else None
+            results[line] = ImportRowResult(line=line, hostname=hostname, result="error", detail=error)
+            continue
+        seen.add(item.hostname)
+        valid.append((line, item))
+
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start : start + chunk_size]
+        existing, approved = _import_chunk(session, chunk, now)
+        for line, item in chunk:
+            results[line] = ImportRowResult(
+                line=line,
+                hostname=item.hostname,
+                result="updated" if item.hostname in existing else "created",
+                approved=item.hostname in approved,
+            )
+
+    ordered = [results[line] for line in sorted(results)]
+    return ImportResult(
+        created=sum(row.result == "created" for row in ordered),
+        updated=sum(row.result == "updated" for row in ordered),
+        approved=sum(row.approved for row in ordered),
+        errors=sum(row.result == "error" for row in ordered),
+        rows=ordered,
+    )
+
+
+@preregistration_router.post("/api/devices/import", response_model=ImportResult)
+async def import_devices(
+    request: Request,
+    format: Optional[str] = None,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> ImportResult:
+    """Pre-register devices from NDJSON (default) or CSV (`?format=csv` or a text/csv body)."""
+    body = await request.body()
+    if len(body) > MAX_IMPORT_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Import too large")
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Import must be UTF-8") from exc
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="format must be csv or ndjson")
+    rows = parse_csv(text) if fmt == "csv" else parse_ndjson(text)
+    return await run_in_threadpool(import_preregistrations, session, rows)
+
+
+@preregistration_router.get("/api/preregistrations", response_model=List[PreRegistrationOut])
+def list_preregistrations(
+    unclaimed: bool = False,
+    limit: int = 500,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> List[PreRegistrationOut]:
+    stmt = select(PreRegistration).order_by(PreRegistration.hostname).limit(min(limit, 5000))
+    if unclaimed:
+        stmt = stmt.where(PreRegistration.claimed_at.is_(None))
+    return [PreRegistrationOut.model_validate(row, from_attributes=True) for row in session.exec(stmt).all()]
@@ -0,0 +1,91 @@
+"""Device presence (online/stale/offline) derived from agent heartbeats.
+
+Heartbeats only write presence when it actually changes. The sweeper demotes
+silent devices with set-based conditional UPDATEs over the
+(presence, last_seen) index, so it is cheap and safe to run in every worker.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, update
+from sqlmodel import Session, select
+
+from .config import get_settings
+from .db import session_scope
+from .models import Device, PresenceEvent
+
+PRESENCE_UNKNOWN = "unknown"
+PRESENCE_ONLINE = "online"
+PRESENCE_STALE = "stale"
+PRESENCE_OFFLINE = "offline"
+PRESENCE_STATES = (PRESENCE_UNKNOWN, PRESENCE_ONLINE, PRESENCE_STALE, PRESENCE_OFFLINE)
+
+
+def mark_seen(session: Session, device: Device, now: datetime) -> None:
+    """Record a heartbeat; writes presence/event rows only on a transition."""
+    if device.presence == PRESENCE_ONLINE:
+        return
+    session.add(
+        PresenceEvent(device_id=device.id, previous=device.presence, presence=PRESENCE_ONLINE, at=now)
+    )
+    device.presence = PRESENCE_ONLINE
+    device.presence_changed_at = now
+    session.add(device)
+
+
+def mark_device_seen(session: Session, device_id: int, presence: str, now: datetime) -> None:
+    """`mark_seen` for upsert paths that only know the stored presence value."""
+    if presence == PRESENCE_ONLINE:
+        return
+    result = session.exec(
+        update(Device)
+        .where(Device.id == device_id, Device.presence == presence)
+        .values(presence=PRESENCE_ONLINE, presence_changed_at=now)
+    )
+    if result.rowcount:
+        session.add(PresenceEvent(device_id=device_id, previous=presence, presence=PRESENCE_ONLINE, at=now))
+
+
+def _demote(session: Session, previous: str, target: str, cutoff: datetime, now: datetime) -> List[int]:
+    condition = (Device.presence == previous, Device.last_seen < cutoff)
+    stmt = update(Device).where(*condition).values(presence=target, presence_changed_at=now)
+    if session.get_bind().dialect.update_returning:
+        ids = list(session.exec(stmt.returning(Device.id)).scalars())
+    else:
+        ids = list(session.exec(select(Device.id).where(*condition)).all())
+        if ids:
+            session.exec(stmt.where(Device.id.in_(ids)))
+    session.add_all(
+        PresenceEvent(device_id=device_id, previous=previous, presence=target, at=now)
+        for device_id in ids
+    )
+    return ids
+
+
+def sweep_presence(session: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Demote devices whose last heartbeat is past the thresholds; caller commits."""
+    settings = get_settings()
+    now = now or datetime.now(timezone.utc)
+    offline_cutoff = now - timedelta(seconds=settings.presence_offline_after)
+    stale_cutoff = now - timedelta(seconds=settings.presence_stale_after)
+    offline = _demote(session, PRESENCE_ONLINE, PRESENCE_OFFLINE, offline_cutoff, now)
+    offline += _demote(session, PRESENCE_STALE, PRESENCE_OFFLINE, offline_cutoff, now)
+    stale = _demote(session, PRESENCE_ONLINE, PRESENCE_STALE, stale_cutoff, now)
+    session.flush()
+    return {PRESENCE_STALE: len(stale), PRESENCE_OFFLINE: len(offline)}
+
+
+def presence_counts(session: Session) -> Dict[str, int]:
+    counts = {state: 0 for state in PRESENCE_STATES}
+    rows = session.exec(select(Device.presence, func.count()).group_by(Device.presence)).all()
+    for presence, count in rows:
+        counts[presence] = count
+    return counts
+
+
+def run_presence_sweep() -> Dict[str, int]:
+    """Background job (see main.lifespan); returns only non-zero transition counts."""
+    with session_scope() as session:
+        changed = sweep_presence(session)
+    return {state: count for state, count in changed.items() if count}
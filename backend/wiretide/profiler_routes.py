@@ -0,0 +1,94 @@
+"""Admin endpoints and page for on-demand profiling (see profiling.py)."""
+
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import FileResponse, HTMLResponse
+from sqlmodel import Session
+
+from .cache_bus import BUS, TOPIC_PROFILER
+from .db import get_session
+from .models import ProfilerArm
+from .profiling import CAPTURE_NAME, PROFILER, ProfiledRoute, list_captures, profile_dir
+from .routes import require_admin_token
+from .schemas import ProfilerArmOut, ProfilerArmRequest, ProfilerState
+from .templating import get_templates
+
+profiler_router = APIRouter(route_class=ProfiledRoute)
+
+
+def _state(session: Session) -> ProfilerState:
+    row = session.get(ProfilerArm, 1)
+    armed = None
+    if row is not None and row.remaining > 0 and PROFILER.reload(session) is not None:
+        armed = ProfilerArmOut.model_validate(row, from_attributes=True)
+    return ProfilerState(armed=armed, captures=list_captures())
+
+
+@profiler_router.get("/api/profiler", response_model=ProfilerState)
+def profiler_state(
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> ProfilerState:
+    return _state(session)
+
+
+@profiler_router.post("/api/profiler/arm", response_model=ProfilerState)
+def arm_profiler(
+    payload: ProfilerArmRequest,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> ProfilerState:
+    now = datetime.now(timezone.utc)
+    row = session.get(ProfilerArm, 1) or ProfilerArm(id=1, pattern=payload.pattern, expires_at=now)
+    row.pattern = payload.pattern
+    row.method = payload.method.upper() if payload.method else None
+    row.mode = payload.mode
+    row.remaining = payload.count
+    row.armed_at = now
+    row.expires_at = now + timedelta(seconds=payload.ttl_seconds)
+    session.add(row)
+    BUS.publish(session, TOPIC_PROFILER)
+    session.commit()
+    return _state(session)
+
+
+@profiler_router.delete("/api/profiler/arm", response_model=ProfilerState)
+def disarm_profiler(
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> ProfilerState:
+    row = session.get(ProfilerArm, 1)
+    if row is not None:
+        row.remaining = 0
+        session.add(row)
+    BUS.publish(session, TOPIC_PROFILER)
+    session.commit()
+    return _state(session)
+
+
+@profiler_router.get("/api/profiler/captures/{name}")
+def download_capture(name: str, _: None = Depends(require_admin_token)) -> FileResponse:
+    path = profile_dir() / name
+    if not CAPTURE_NAME.match(name) or not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Capture not found")
+    media_type = "application/json" if name.endswith(".json") else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=name)
+
+
+@profiler_router.get("/profiler", response_class=HTMLResponse)
+def profiler_page(
+    request: Request,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+):
+    templates = get_templates()
+    if not templates:
+        return HTMLResponse(
+            content="Templates not available; ensure Jinja2 is installed.",
+            status_code=501,
+        )
+    return templates.TemplateResponse(
+        "profiler.html",
+        {"request": request, "state": _state(session), "admin_session": True},
+    )
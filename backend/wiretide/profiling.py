@@ -0,0 +1,358 @@
+"""On-demand request profiling, armed by an admin (see profiler_routes.py).
+
+Every router uses `ProfiledRoute`. While nothing is armed its handler costs
+one attribute check. Arming stores a route pattern and a request budget in
+`profilerarm`; workers learn about it through the invalidation bus and claim
+requests with a conditional UPDATE, so N means N across all workers. At most
+one request per worker is profiled at a time.
+
+A capture covers the handler coroutine (only while it runs, not while it
+awaits), sync endpoints in the threadpool and write units handed to
+`write_queue.run_write`. Mode `cprofile` stores a `.pstats` file; mode
+`sample` walks the stacks of those threads every `profile_sample_interval`
+seconds and stores collapsed stacks (`frame;frame;frame count`, as read by
+flamegraph.pl/speedscope). Each capture gets a `.json` sidecar.
+"""
+
+import asyncio
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from fnmatch import fnmatchcase
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from sqlalchemy import update
+from sqlmodel import Session
+from starlette.requests import Request
+from starlette.responses import Response
+
+from .cache_bus import BUS, TOPIC_PROFILER
+from .config import get_settings
+from .db import get_session
+from .models import ProfilerArm
+
+logger = logging.getLogger("wiretide.profiling")
+
+MODES = ("cprofile", "sample")
+CAPTURE_NAME = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9]{6}-[0-9]+-[A-Za-z0-9_]+\.(pstats|collapsed|json)$")
+_CURRENT: ContextVar[Optional["Capture"]] = ContextVar("wiretide_profile_capture", default=None)
+
+
+def profile_dir() -> Path:
+    return (Path(__file__).resolve().parent.parent / get_settings().profile_dir).resolve()
+
+
+@dataclass
+class ArmSpec:
+    pattern: str
+    method: Optional[str]
+    mode: str
+    expires_at: datetime
+
+    def matches(self, method: str, route: str, path: str) -> bool:
+        if self.method and self.method != method:
+            return False
+        return fnmatchcase(route, self.pattern) or fnmatchcase(path, self.pattern)
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class Capture:
+    """Profile data for one request, collected from every thread that works on it."""
+
+    def __init__(self, mode: str, method: str, route: str, path: str) -> None:
+        self.mode = mode
+        self.method = method
+        self.route = route
+        self.path = path
+        self.profiles: List[cProfile.Profile] = []
+        self.samples: Counter = Counter()
+        self._active: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._loop_profile: Optional[cProfile.Profile] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self.started = perf_counter()
+
+    # -- collection --------------------------------------------------------
+    @contextmanager
+    def _slice(self, profile: Optional[cProfile.Profile] = None) -> Iterator[None]:
+        ident = threading.get_ident()
+        with self._lock:
+            self._active[ident] = self._active.get(ident, 0) + 1
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            with self._lock:
+                self._active[ident] -= 1
+                if not self._active[ident]:
+                    del self._active[ident]
+
+    def run_sync(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run `fn` in the current (worker/writer) thread under this capture."""
+        if threading.get_ident() in self._active:
+            return fn(*args, **kwargs)
+        profile = cProfile.Profile() if self.mode == "cprofile" else None
+        try:
+            with self._slice(profile):
+                return fn(*args, **kwargs)
+        finally:
+            if profile is not None:
+                with self._lock:
+                    self.profiles.append(profile)
+
+    async def run_coroutine(self, coro: Any) -> Any:
+        if self.mode == "cprofile":
+            self._loop_profile = cProfile.Profile()
+            self.profiles.append(self._loop_profile)
+        return await _Sliced(coro, lambda: self._slice(self._loop_profile))
+
+    def start(self) -> None:
+        if self.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample, name="wiretide-profiler", daemon=True)
+            self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    def _sample(self) -> None:
+        interval = max(get_settings().profile_sample_interval, 0.0005)
+        while not self._stop.wait(interval):
+            with self._lock:
+                idents = list(self._active)
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.samples[_collapsed(frame)] += 1
+
+    # -- output ------------------------------------------------------------
+    def write(self, directory: Path, status_code: int) -> Dict[str, Any]:
+        duration_ms = round((perf_counter() - self.started) * 1000, 2)
+        now = datetime.now(timezone.utc)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", f"{self.method}_{self.route}").strip("_")
+        stem = f"{now.strftime('%Y%m%d-%H%M%S')}-{now.microsecond:06d}-{os.getpid()}-{slug}"
+        directory.mkdir(parents=True, exist_ok=True)
+        if self.mode == "cprofile":
+            name = f"{stem}.pstats"
+            stats = pstats.Stats(self.profiles[0])
+            if len(self.profiles) > 1:
+                stats.add(*self.profiles[1:])
+            stats.dump_stats(directory / name)
+            detail = {"calls": stats.total_calls}
+        else:
+            name = f"{stem}.collapsed"
+            (directory / name).write_text("".join(f"{stack} {count}\n" for stack, count in self.samples.items()))
+            detail = {"samples": sum(self.samples.values())}
+        meta = {
+            "name": name,
+            "mode": self.mode,
+            "method": self.method,
+            "route": self.route,
+            "path": self.path,
+            "status": status_code,
+            "duration_ms": duration_ms,
+            "created_at": now.isoformat(),
+            **detail,
+        }
+        (directory / f"{stem}.json").write_text(json.dumps(meta))
+        prune_captures(directory, get_settings().profile_keep)
+        return meta
+
+
+class _Sliced:
+    """Await `coro`, calling `slice()` around each step so only its own execution is profiled."""
+
+    def __init__(self, coro: Any, slice: Callable[[], Any]) -> None:
+        self._coro = coro
+        self._slice = slice
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            with self._slice():
+                try:
+                    yielded = self._coro.throw(error) if error is not None else self._coro.send(value)
+                except StopIteration as stop:
+                    return stop.value
+            try:
+                value, error = (yield yielded), None
+            except BaseException as exc:  # cancellation is forwarded into the handler
+                value, error = None, exc
+
+
+def _collapsed(frame: Any) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{Path(code.co_filename).stem}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def list_captures(directory: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Capture metadata, newest first."""
+    directory = directory or profile_dir()
+    captures = []
+    for path in directory.glob("*.json"):
+        try:
+            captures.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return sorted(captures, key=lambda meta: meta.get("created_at", ""), reverse=True)
+
+
+def prune_captures(directory: Path, keep: int) -> None:
+    for meta in list_captures(directory)[max(keep, 1):]:
+        stem = meta["name"].rsplit(".", 1)[0]
+        for suffix in (".pstats", ".collapsed", ".json"):
+            (directory / f"{stem}{suffix}").unlink(missing_ok=True)
+
+
+class Profiler:
+    """Per-worker view of the armed spec; `profilerarm` holds the shared request budget."""
+
+    def __init__(self) -> None:
+        self.armed: Optional[ArmSpec] = None
+        self.stale = True
+        self._busy = threading.Lock()
+
+    def invalidate(self) -> None:
+        self.stale = True
+
+    def reload(self, session: Session) -> Optional[ArmSpec]:
+        self.stale = False
+        row = session.get(ProfilerArm, 1)
+        if row is None or row.remaining <= 0 or _utc(row.expires_at) <= datetime.now(timezone.utc):
+            self.armed = None
+        else:
+            self.armed = ArmSpec(row.pattern, row.method, row.mode, _utc(row.expires_at))
+        return self.armed
+
+    def wants(self, method: str, route: str, path: str) -> bool:
+        """Cheap per-request check (no DB): whether `claim` could capture this request."""
+        if self.stale:
+            return True
+        spec = self.armed
+        if spec is None:
+            return False
+        if spec.expires_at <= datetime.now(timezone.utc):
+            self.armed = None
+            return False
+        return spec.matches(method, route, path)
+
+    def claim(self, session: Session, method: str, route: str, path: str) -> Optional[Capture]:
+        """Reload if needed; take one request from the shared budget when it matches."""
+        if self.stale:
+            self.reload(session)
+        spec = self.armed
+        if spec is None:
+            return None
+        if spec.expires_at <= datetime.now(timezone.utc):
+            self.armed = None
+            return None
+        if not spec.matches(method, route, path):
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        claimed = session.exec(
+            update(ProfilerArm)
+            .where(ProfilerArm.id == 1, ProfilerArm.remaining > 0)
+            .values(remaining=ProfilerArm.remaining - 1)
+        ).rowcount
+        session.commit()
+        if not claimed:
+            self._busy.release()
+            self.armed = None
+            return None
+        return Capture(spec.mode, method, route, path)
+
+    def release(self) -> None:
+        self._busy.release()
+
+
+PROFILER = Profiler()
+BUS.subscribe(TOPIC_PROFILER, PROFILER.invalidate)
+
+
+def profiled(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """`fn` wrapped to run under the current request's capture, if one is active."""
+    capture = _CURRENT.get()
+    return fn if capture is None else functools.partial(capture.run_sync, fn)
+
+
+def _wrap_sync_endpoint(call: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(call)
+    def endpoint(*args: Any, **kwargs: Any) -> Any:
+        capture = _CURRENT.get()
+        if capture is None:
+            return call(*args, **kwargs)
+        return capture.run_sync(call, *args, **kwargs)
+
+    return endpoint
+
+
+def _claim(request: Request, method: str, route: str) -> Optional[Capture]:
+    # Honour dependency overrides so tests (and alternate setups) use their DB.
+    provider = request.app.dependency_overrides.get(get_session, get_session)
+    with contextmanager(provider)() as session:
+        return PROFILER.claim(session, method, route, request.url.path)
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose handler can be profiled on demand; a no-op unless armed."""
+
+    def get_route_handler(self) -> Callable[[Request], Any]:
+        # FastAPI runs these in the threadpool, outside the handler coroutine.
+        if not asyncio.iscoroutinefunction(self.dependant.call):
+            self.dependant.call = _wrap_sync_endpoint(self.dependant.call)
+        handler = super().get_route_handler()
+        route = self.path_format
+
+        async def profiled_handler(request: Request) -> Response:
+            if not PROFILER.wants(request.method, route, request.url.path):
+                return await handler(request)
+            capture = await run_in_threadpool(_claim, request, request.method, route)
+            if capture is None:
+                return await handler(request)
+            status_code = 500
+            token = _CURRENT.set(capture)
+            capture.start()
+            try:
+                response = await capture.run_coroutine(handler(request))
+                status_code = response.status_code
+                return response
+            finally:
+                _CURRENT.reset(token)
+                capture.stop()
+                PROFILER.release()
+                try:
+                    meta = await run_in_threadpool(capture.write, profile_dir(), status_code)
+                    logger.info("Profiled %s %s -> %s", request.method, route, meta["name"])
+                except Exception:  # pragma: no cover - never fail the request over a profile
+                    logger.exception("Writing profile for %s failed", route)
+
+        return profiled_handler
@@ -0,0 +1,109 @@
+"""SQL statement fingerprinting, aggregation and slow-query logging."""
+
+import hashlib
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("wiretide.slow_query")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_NAMED_PARAM = re.compile(r"%\(\w+\)s|:\w+|\$\d+|%s")
+_IN_LIST = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("select", "update", "delete", "with")
+
+MAX_TRACKED_FINGERPRINTS = 500
+
+
+def normalize_statement(statement: str) -> str:
+    """Collapse literals, placeholders and IN-lists so equivalent queries match."""
+    text = _STRING_LITERAL.sub("?", statement)
+    text = _NAMED_PARAM.sub("?", text)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _IN_LIST.sub("IN (...)", text)
+
+
+def fingerprint(statement: str) -> str:
+    normalized = normalize_statement(statement)
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+
+
+class QueryStats:
+    """Process-wide aggregate per statement fingerprint (bounded)."""
+
+    def __init__(self, max_entries: int = MAX_TRACKED_FINGERPRINTS) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, statement: str, elapsed: float) -> str:
+        normalized = normalize_statement(statement)
+        key = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    return key
+                entry = {"statement": normalized, "count": 0, "total_ms": 0.0, "max_ms": 0.0}
+                self._entries[key] = entry
+            elapsed_ms = elapsed * 1000.0
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            if elapsed_ms > entry["max_ms"]:
+                entry["max_ms"] = elapsed_ms
+        return key
+
+    def snapshot(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = [dict(entry, fingerprint=key) for key, entry in self._entries.items()]
+        items.sort(key=lambda e: e["total_ms"], reverse=True)
+        for item in items:
+            item["total_ms"] = round(item["total_ms"], 3)
+            item["max_ms"] = round(item["max_ms"], 3)
+        return items[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+QUERY_STATS = QueryStats()
+
+
+def explain_plan(dbapi_connection, dialect_name: str, statement: str, parameters) -> Optional[str]:
+    """Return the planner output for a statement using a raw DBAPI cursor."""
+    if not statement.lstrip().lower().startswith(_EXPLAINABLE):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if dialect_name == "sqlite" else "EXPLAIN "
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters or ())
+        rows = cursor.fetchall()
+    except Exception as exc:  # pragma: no cover - best-effort diagnostics
+        return f"<explain failed: {exc}>"
+    finally:
+        cursor.close()
+    return "\n".join(" | ".join(str(col) for col in row) for row in rows)
+
+
+def log_slow_query(
+    dbapi_connection,
+    dialect_name: str,
+    statement: str,
+    parameters,
+    elapsed: float,
+    explain: bool,
+) -> None:
+    plan = explain_plan(dbapi_connection, dialect_name, statement, parameters) if explain else None
+    logger.warning(
+        "slow query %.1fms fingerprint=%s statement=%s parameters=%r%s",
+        elapsed * 1000.0,
+        fingerprint(statement),
+        _WHITESPACE.sub(" ", statement).strip(),
+        parameters,
+        f"\nplan:\n{plan}" if plan else "",
+    )
@@ -0,0 +1,48 @@
+"""Per-request instrumentation context shared by middleware and DB hooks."""
+
+from contextvars import ContextVar, Token
+from time import perf_counter
+from typing import Any, Dict, Optional
+
+
+class RequestContext:
+    """Mutable per-request counters.
+
+    The object is bound to a context variable by the instrumentation middleware;
+    sync handlers run in the threadpool with a copy of that context, so they
+    mutate the same instance and the middleware sees the totals afterwards.
+    """
+
+    __slots__ = ("route", "started", "db_queries", "db_time", "fingerprints", "trace")
+
+    def __init__(self) -> None:
+        self.route: Optional[str] = None
+        self.started = perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.fingerprints: Dict[str, int] = {}
+        # tracing.Trace when this request is sampled.
+        self.trace: Optional[Any] = None
+
+    @property
+    def repeated_statements(self) -> int:
+        """Fingerprints executed more than once (N+1 candidates)."""
+        return sum(1 for count in self.fingerprints.values() if count > 1)
+
+
+_current: ContextVar[Optional[RequestContext]] = ContextVar(
+    "wiretide_request_context", default=None
+)
+
+
+def current_request() -> Optional[RequestContext]:
+    """Return the context of the request being served, if any."""
+    return _current.get()
+
+
+def bind_request(ctx: RequestContext) -> Token:
+    return _current.set(ctx)
+
+
+def unbind_request(token: Token) -> None:
+    _current.reset(token)
@@ -1,19 +1,28 @@
 """API routes for device/agent flows."""
 
-import hashlib
 import json
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Optional, Sequence
+from typing import List, Optional, Tuple
 
 from fastapi import APIRouter, Depends, Header, HTTPException, Request, status, Form
 from fastapi.responses import HTMLResponse, RedirectResponse, Response
-from sqlalchemy import delete, func
+from sqlalchemy import delete, update
 from sqlmodel import Session, select
 
+from .cache_bus import BUS, TOPIC_ADMIN_CREDENTIALS
 from .config import get_settings
-from .db import get_session
-from .models import ControllerSettings, Device, DeviceConfig, DeviceStatus
+from .db import dialect_insert, get_session
+from .fleet import FLEET, SORT_FIELDS as FLEET_SORT_FIELDS, DeviceRecord, publish_fleet_delete
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, HEARTBEATS, REGISTRY
+from .querystats import QUERY_STATS
+from .models import Device, DeviceConfig, DeviceStatus, PresenceEvent, RolloutTarget, SecurityEvent
+from .presence import PRESENCE_STATES, mark_device_seen, mark_seen, presence_counts
+from .profiling import ProfiledRoute
+from .security_events import ingest_security_samples
+from .templating import DEVICE_ROWS, get_templates, refresh_template_globals
+from .tracing import traced
+from .write_queue import run_write
 from .auth import (
     parse_basic_credentials,
     validate_session_token,
@@ -28,6 +37,9 @@ from .device_templates import (
 )
 from .schemas import (
     ApproveRequest,
+    BulkDeviceRequest,
+    BulkDeviceResult,
+    BulkSkipped,
     ChangePasswordRequest,
     ClearConfigRequest,
     ConfigResponse,
@@ -44,16 +56,26 @@ from .schemas import (
     TokenResponse,
     UpdatePolicyRequest,
     MonitoringToggleRequest,
+    PresenceEventOut,
+    PresenceSummary,
+    SecurityEventOut,
 )
 from .services import (
+    canonical_sha256,
+    claim_preregistration,
     ensure_settings_seeded,
     find_device_by_hostname,
     get_device,
     get_settings_row,
+    monitoring_api_enabled,
     refresh_shared_token,
+    save_controller_settings,
+    shared_token_matches,
 )
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
+# Agent-facing endpoints; main.py mounts either this router or the async variant.
+agent_router = APIRouter(route_class=ProfiledRoute)
 DEVICE_CONFIG_LIMIT = 10
 VALID_DEVICE_TYPES = set(VALID_TEMPLATE_TYPES) | {UNKNOWN_DEVICE_TYPE}
 VALID_STATUS = {"waiting", "approved", "blocked"}
@@ -78,11 +100,63 @@ def _enforce_transition(current: str, target: str) -> None:
         )
 
 
+def _filter_devices(stmt, device_type: Optional[str], status_filter: Optional[str], presence: Optional[str]):
+    """Column filters of a bulk selector, re-checked in SQL on the rows about to change."""
+    if device_type:
+        stmt = stmt.where(Device.device_type == device_type)
+    if status_filter:
+        stmt = stmt.where(Device.status == status_filter)
+    if presence:
+        stmt = stmt.where(Device.presence == presence)
+    return stmt
+
+
+def _device_page(
+    session: Session,
+    device_type: Optional[str],
+    status_filter: Optional[str],
+    presence: Optional[str],
+    search: Optional[str],
+    sort: str,
+    offset: int,
+    limit: int,
+) -> Tuple[int, List[DeviceRecord]]:
+    """Filtered, sorted page of the device list (API and devices page), served from `FLEET`."""
+    if device_type and device_type not in VALID_DEVICE_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid device_type filter")
+    if status_filter and status_filter not in VALID_STATUS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status filter")
+    if presence and presence not in PRESENCE_STATES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid presence filter")
+    if sort.lstrip("-") not in FLEET_SORT_FIELDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sort")
+    return FLEET.sync(session).query(
+        device_type, status_filter, presence, search, sort, max(offset, 0), min(limit, 200)
+    )
+
+
+def _device_rows(templates, devices: List[DeviceRecord]) -> List[str]:
+    """Table rows for the devices page; only devices changed since their row was cached are rendered."""
+    row_template = templates.env.get_template("_device_row.html")
+    device_templates = list_device_templates()
+
+    def render(device: DeviceRecord) -> str:
+        return row_template.render(dev=_serialize_device(device, device.status_row), device_templates=device_templates)
+
+    return [DEVICE_ROWS.get(device.id, device.version, lambda device=device: render(device)) for device in devices]
+
+
+def _fleet_device(session: Session, device_id: int) -> DeviceRecord:
+    device = FLEET.sync(session).get(device_id)
+    if device is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
+    return device
+
+
 def _validate_registration_token(session: Session, token: Optional[str]) -> None:
     if not token:
         return
-    settings = get_settings_row(session)
-    if token != settings.shared_token:
+    if not shared_token_matches(session, token):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid shared token",
@@ -90,8 +164,7 @@ def _validate_registration_token(session: Session, token: Optional[str]) -> None
 
 
 def _validate_status_token(session: Session, device: Device, token: Optional[str]) -> None:
-    settings = get_settings_row(session)
-    if token == settings.shared_token:
+    if shared_token_matches(session, token):
         return
     if token:
         raise HTTPException(
@@ -104,48 +177,37 @@ def _validate_status_token(session: Session, device: Device, token: Optional[str
             detail="Invalid shared token",
         )
 
-# Optional templates for basic server-rendered UI.
-try:
-    from fastapi.templating import Jinja2Templates
-except Exception:  # pragma: no cover
-    Jinja2Templates = None
-try:
-    import jinja2  # type: ignore
-except Exception:  # pragma: no cover
-    jinja2 = None
-
-_base_path = Path(__file__).resolve().parent
-_templates_dir = (_base_path.parent / get_settings().templates_dir).resolve()
-templates = (
-    Jinja2Templates(directory=str(_templates_dir))
-    if Jinja2Templates and jinja2 is not None
-    else None
-)
-
 
-def require_agent_token(
-    x_shared_token: Optional[str] = Header(default=None, alias="X-Shared-Token"),
-    session: Session = Depends(get_session),
-) -> ControllerSettings:
-    settings = get_settings_row(session)
+@traced("auth")
+def check_agent_token(session: Session, x_shared_token: Optional[str]) -> None:
     if not x_shared_token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Missing shared token",
         )
-    if x_shared_token != settings.shared_token:
+    if not shared_token_matches(session, x_shared_token):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid shared token",
         )
-    return settings
 
 
+def require_agent_token(
+    x_shared_token: Optional[str] = Header(default=None, alias="X-Shared-Token"),
+    session: Session = Depends(get_session),
+) -> None:
+    check_agent_token(session, x_shared_token)
+
+
+@traced("auth")
 def require_admin_token(
     x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token"),
     authorization: Optional[str] = Header(default=None, alias="Authorization"),
     request: Request = None,
+    session: Session = Depends(get_session),
 ) -> None:
+    # Pick up password changes made through another worker.
+    BUS.poll(session)
     settings = get_settings()
     password_hash = settings.admin_password_hash
     if password_hash:
@@ -202,6 +264,30 @@ def _persist_admin_hash(new_hash: str, settings) -> None:
         )
 
 
+def _reload_admin_credentials() -> None:
+    """Adopt a password hash persisted by another worker (see change_admin_password)."""
+    settings = get_settings()
+    if not settings.admin_env_path:
+        return
+    try:
+        lines = Path(settings.admin_env_path).read_text().splitlines()
+    except OSError:
+        return
+    for line in lines:
+        key, _, value = line.partition("=")
+        if key.strip() == "WIRETIDE_ADMIN_PASSWORD_HASH" and value.strip():
+            settings.admin_password_hash = value.strip()
+
+
+def _admin_credentials_changed() -> None:
+    _reload_admin_credentials()
+    refresh_template_globals()
+
+
+BUS.subscribe(TOPIC_ADMIN_CREDENTIALS, _admin_credentials_changed)
+
+
+@traced("serialize")
 def _serialize_device(device: Device, status_row: Optional[DeviceStatus]) -> DeviceOut:
     template_data = get_device_template(device.device_type)
     template_info = DeviceTemplateInfo(**template_data) if template_data else None
@@ -218,6 +304,8 @@ def _serialize_device(device: Device, status_row: Optional[DeviceStatus]) -> Dev
         agent_version=device.agent_version,
         agent_update_allowed=device.agent_update_allowed,
         ip_last=device.ip_last,
+        presence=device.presence,
+        presence_changed_at=device.presence_changed_at,
         created_at=device.created_at,
         template=template_info,
         status_row=DeviceStatusOut(
@@ -233,13 +321,69 @@ def _serialize_device(device: Device, status_row: Optional[DeviceStatus]) -> Dev
     )
 
 
-@router.post("/register", response_model=RegisterResponse)
-def register_device(
-    payload: RegisterRequest,
-    request: Request,
-    session: Session = Depends(get_session),
+# Payload field -> Device column; only fields the agent actually sent are written.
+_REGISTER_COLUMNS = {
+    "description": "description",
+    "ssh_enabled": "ssh_enabled",
+    "ssh_fingerprint": "ssh_fingerprint",
+    "agent_version": "agent_version",
+    "ip_address": "ip_last",
+}
+_STATUS_COLUMNS = ("dns_ok", "ntp_ok", "firewall_profile_active", "security_log_samples", "clients")
+_NOT_NULL_STATUS_COLUMNS = ("dns_ok", "ntp_ok")
+
+
+def _upsert_device_by_hostname(session: Session, payload: RegisterRequest, now: datetime):
+    """One INSERT ... ON CONFLICT (hostname) DO UPDATE; returns the stored device state."""
+    present = payload.model_fields_set
+    values = {
+        column: getattr(payload, field)
+        for field, column in _REGISTER_COLUMNS.items()
+        if field in present
+    }
+    if values.get("ip_last") is None:
+        values.pop("ip_last", None)
+    updates = list(values)
+    if payload.device_type and payload.device_type != UNKNOWN_DEVICE_TYPE:
+        updates.append("device_type")
+    stmt = dialect_insert(session, Device).values(
+        hostname=payload.hostname,
+        device_type=payload.device_type or UNKNOWN_DEVICE_TYPE,
+        last_seen=now,
+        **values,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["hostname"],
+        # ON CONFLICT DO UPDATE skips column onupdate defaults.
+        set_={column: stmt.excluded[column] for column in updates + ["last_seen", "changed_at"]},
+    ).returning(Device.id, Device.status, Device.approved, Device.device_type, Device.presence)
+    return session.exec(stmt).one()
+
+
+def _upsert_status(session: Session, payload: StatusReport, now: datetime) -> None:
+    values = {
+        column: getattr(payload, column)
+        for column in _STATUS_COLUMNS
+        if column in payload.model_fields_set
+    }
+    for column in _NOT_NULL_STATUS_COLUMNS:
+        if values.get(column, False) is None:
+            del values[column]
+    stmt = dialect_insert(session, DeviceStatus).values(device_id=payload.device_id, updated_at=now, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["device_id"],
+        set_={column: stmt.excluded[column] for column in list(values) + ["updated_at"]},
+    )
+    session.exec(stmt)
+
+
+# Agent endpoint bodies take a Session and leave the commit to the caller so the
+# same code serves the threadpool routes below and the async routes
+# (`async_routes.py`, via AsyncSession.run_sync).
+def register_device_impl(
+    session: Session, payload: RegisterRequest, token: Optional[str]
 ) -> RegisterResponse:
-    _validate_registration_token(session, request.headers.get("x-shared-token"))
+    _validate_registration_token(session, token)
     if payload.device_type and payload.device_type not in VALID_DEVICE_TYPES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -251,38 +395,45 @@ def register_device(
             detail="Device type cannot be reset to unknown",
         )
     now = datetime.now(timezone.utc)
-    device: Optional[Device] = None
 
-    if payload.device_id is not None:
-        device = get_device(session, payload.device_id)
-    else:
-        device = find_device_by_hostname(session, payload.hostname)
+    if payload.device_id is None:
+        row = _upsert_device_by_hostname(session, payload, now)
+        mark_device_seen(session, row.id, row.presence, now)
+        state, approved, device_type = row.status, row.approved, row.device_type
+        if state == "waiting" and payload.ssh_enabled:
+            # Pre-registered by an admin import: approve on first contact.
+            entry = claim_preregistration(session, row.id, payload.hostname, payload.ssh_fingerprint, now)
+            if entry is not None:
+                state, approved, device_type = "approved", True, entry.device_type
+        session.flush()
+        return RegisterResponse(
+            device_id=row.id,
+            status=state,
+            approved=approved,
+            device_type=device_type,
+            shared_token_required=True,
+        )
 
-    if device:
-        device.hostname = payload.hostname
-        device.description = payload.description
-        device.device_type = payload.device_type or device.device_type
-        device.ssh_enabled = payload.ssh_enabled
-        device.ssh_fingerprint = payload.ssh_fingerprint
-        device.agent_version = payload.agent_version
-        device.ip_last = payload.ip_address or device.ip_last
-        device.last_seen = now
-    else:
-        device = Device(
-            hostname=payload.hostname,
-            description=payload.description,
-            device_type=payload.device_type or "unknown",
-            status="waiting",
-            approved=False,
-            ssh_enabled=payload.ssh_enabled,
-            ssh_fingerprint=payload.ssh_fingerprint,
-            agent_version=payload.agent_version,
-            ip_last=payload.ip_address,
-            last_seen=now,
+    device = get_device(session, payload.device_id)
+    if payload.hostname != device.hostname and find_device_by_hostname(session, payload.hostname):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Hostname already registered to another device",
         )
+    device.hostname = payload.hostname
+    device.description = payload.description
+    device.device_type = payload.device_type or device.device_type
+    device.ssh_enabled = payload.ssh_enabled
+    device.ssh_fingerprint = payload.ssh_fingerprint
+    device.agent_version = payload.agent_version
+    device.ip_last = payload.ip_address or device.ip_last
+    device.last_seen = now
+    mark_seen(session, device, now)
     session.add(device)
-    session.commit()
-    session.refresh(device)
+    session.flush()
+    if device.status == "waiting" and device.ssh_enabled:
+        if claim_preregistration(session, device.id, device.hostname, device.ssh_fingerprint, now) is not None:
+            session.refresh(device)
 
     return RegisterResponse(
         device_id=device.id,
@@ -293,18 +444,14 @@ def register_device(
     )
 
 
-@router.post("/status", response_model=StatusResponse)
-def update_status(
-    payload: StatusReport,
-    request: Request,
-    session: Session = Depends(get_session),
+def update_status_impl(
+    session: Session, payload: StatusReport, token: Optional[str]
 ) -> StatusResponse:
-    auth_token = request.headers.get("x-shared-token")
     device = get_device(session, payload.device_id)
-    _validate_status_token(session, device, auth_token)
+    _validate_status_token(session, device, token)
     now = datetime.now(timezone.utc)
 
-    # Upsert device fields that may change with status.
+    # Device fields that may change with status (the UPDATE only carries changed columns).
     if payload.ssh_enabled is not None:
         device.ssh_enabled = payload.ssh_enabled
     if payload.ssh_fingerprint:
@@ -312,38 +459,17 @@ def update_status(
     if payload.agent_version:
         device.agent_version = payload.agent_version
     device.last_seen = now
+    mark_seen(session, device, now)
     session.add(device)
 
-    existing_status = (
-        session.exec(
-            select(DeviceStatus).where(DeviceStatus.device_id == payload.device_id)
-        ).first()
-    )
-    if existing_status:
-        status_row = existing_status
-    else:
-        status_row = DeviceStatus(device_id=payload.device_id)
-
-    if payload.dns_ok is not None:
-        status_row.dns_ok = payload.dns_ok
-    if payload.ntp_ok is not None:
-        status_row.ntp_ok = payload.ntp_ok
-    status_row.firewall_profile_active = payload.firewall_profile_active
-    status_row.security_log_samples = payload.security_log_samples
-    status_row.clients = payload.clients
-    status_row.updated_at = now
-    session.add(status_row)
-    session.commit()
+    _upsert_status(session, payload, now)
+    ingest_security_samples(session, device.id, payload.security_log_samples, now)
+    session.flush()
 
-    return StatusResponse(last_seen=device.last_seen)
+    return StatusResponse(last_seen=now)
 
 
-@router.get("/config", response_model=ConfigResponse)
-def get_config(
-    device_id: int,
-    session: Session = Depends(get_session),
-    _: ControllerSettings = Depends(require_agent_token),
-) -> ConfigResponse:
+def get_config_impl(session: Session, device_id: int) -> ConfigResponse:
     device = get_device(session, device_id)
     if not device.approved or device.status != "approved":
         raise HTTPException(
@@ -371,16 +497,77 @@ def get_config(
     )
     # Pop the latest config once served to avoid re-delivery.
     session.delete(config_row)
-    session.commit()
+    session.flush()
     return response
 
 
-@router.get("/token/current", response_model=TokenResponse)
-def current_token(session: Session = Depends(get_session)) -> TokenResponse:
+def current_token_impl(session: Session) -> TokenResponse:
     settings = ensure_settings_seeded(session)
     return TokenResponse(shared_token=settings.shared_token)
 
 
+@agent_router.post("/register", response_model=RegisterResponse)
+async def register_device(
+    payload: RegisterRequest,
+    request: Request,
+    session: Session = Depends(get_session),
+) -> RegisterResponse:
+    return await run_write(session, register_device_impl, payload, request.headers.get("x-shared-token"))
+
+
+@agent_router.post("/status", response_model=StatusResponse)
+async def update_status(
+    payload: StatusReport,
+    request: Request,
+    session: Session = Depends(get_session),
+) -> StatusResponse:
+    response = await run_write(session, update_status_impl, payload, request.headers.get("x-shared-token"))
+    HEARTBEATS.inc()
+    return response
+
+
+@agent_router.get("/config", response_model=ConfigResponse)
+async def get_config(
+    device_id: int,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_agent_token),
+) -> ConfigResponse:
+    return await run_write(session, get_config_impl, device_id)
+
+
+@agent_router.get("/token/current", response_model=TokenResponse)
+def current_token(session: Session = Depends(get_session)) -> TokenResponse:
+    return current_token_impl(session)
+
+
+@router.get("/metrics")
+def metrics(
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> Response:
+    if not get_settings().metrics_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Metrics disabled",
+        )
+    return Response(content=REGISTRY.render(session), media_type=METRICS_CONTENT_TYPE)
+
+
+@router.get("/api/admin/db-stats")
+def db_stats(
+    limit: int = 50,
+    _: None = Depends(require_admin_token),
+) -> dict:
+    """Aggregated SQL statement fingerprints, most expensive first."""
+    return {"statements": QUERY_STATS.snapshot(limit=min(limit, 500))}
+
+
+@router.delete("/api/admin/db-stats")
+def reset_db_stats(_: None = Depends(require_admin_token)) -> dict:
+    QUERY_STATS.reset()
+    return {"status": "ok"}
+
+
 @router.get("/api/device-templates", response_model=List[DeviceTemplateInfo])
 def list_device_templates_route(
     _: None = Depends(require_admin_token),
@@ -396,9 +583,7 @@ def toggle_monitoring(
 ) -> SettingsResponse:
     settings = get_settings_row(session)
     settings.monitoring_api_enabled = payload.monitoring_api_enabled
-    session.add(settings)
-    session.commit()
-    session.refresh(settings)
+    save_controller_settings(session, settings)
     return SettingsResponse(
         shared_token=settings.shared_token,
         agent_update_policy=settings.agent_update_policy,
@@ -431,6 +616,7 @@ def regenerate_shared_token(
     _: None = Depends(require_admin_token),
 ) -> TokenResponse:
     settings = refresh_shared_token(session)
+    session.commit()
     return TokenResponse(shared_token=settings.shared_token)
 
 
@@ -449,9 +635,7 @@ def update_agent_policy(
     settings.agent_update_policy = payload.agent_update_policy
     settings.agent_update_url = payload.agent_update_url
     settings.agent_min_version = payload.agent_min_version
-    session.add(settings)
-    session.commit()
-    session.refresh(settings)
+    save_controller_settings(session, settings)
     return SettingsResponse(
         shared_token=settings.shared_token,
         agent_update_policy=settings.agent_update_policy,
@@ -466,45 +650,70 @@ def update_agent_policy(
 def list_devices(
     device_type: Optional[str] = None,
     status: Optional[str] = None,
+    presence: Optional[str] = None,
     search: Optional[str] = None,
+    sort: str = "id",
     limit: int = 50,
     offset: int = 0,
     session: Session = Depends(get_session),
     _: None = Depends(require_admin_token),
 ) -> DevicesListResponse:
-    if device_type and device_type not in VALID_DEVICE_TYPES:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid device_type filter",
-        )
-    if status and status not in VALID_STATUS:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid status filter",
-        )
+    total, devices = _device_page(session, device_type, status, presence, search, sort, offset, limit)
+    items = [_serialize_device(device, device.status_row) for device in devices]
+    return DevicesListResponse(items=items, total=total, limit=min(limit, 200), offset=offset)
 
-    stmt = select(Device)
-    if device_type:
-        stmt = stmt.where(Device.device_type == device_type)
-    if status:
-        stmt = stmt.where(Device.status == status)
-    if search:
-        stmt = stmt.where(Device.hostname.contains(search))
-    limited = stmt.offset(offset).limit(min(limit, 200))
-
-    devices: Sequence[Device] = session.exec(limited).all()
-    total = session.exec(select(func.count()).select_from(stmt.subquery())).one()
-    device_ids = [d.id for d in devices]
-    status_rows = (
-        session.exec(
-            select(DeviceStatus).where(DeviceStatus.device_id.in_(device_ids))
-        ).all()
-        if device_ids
-        else []
+
+@router.get("/api/presence", response_model=PresenceSummary)
+def presence_summary(
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> PresenceSummary:
+    settings = get_settings()
+    return PresenceSummary(
+        counts=presence_counts(session),
+        stale_after=settings.presence_stale_after,
+        offline_after=settings.presence_offline_after,
     )
-    status_map = {row.device_id: row for row in status_rows}
-    items = [_serialize_device(dev, status_map.get(dev.id)) for dev in devices]
-    return DevicesListResponse(items=items, total=total, limit=min(limit, 200), offset=offset)
+
+
+@router.get("/api/presence/events", response_model=List[PresenceEventOut])
+def presence_events(
+    device_id: Optional[int] = None,
+    limit: int = 100,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> List[PresenceEventOut]:
+    stmt = select(PresenceEvent).order_by(PresenceEvent.id.desc()).limit(min(limit, 1000))
+    if device_id is not None:
+        stmt = stmt.where(PresenceEvent.device_id == device_id)
+    return [PresenceEventOut.model_validate(row, from_attributes=True) for row in session.exec(stmt).all()]
+
+
+@router.get("/api/security/events", response_model=List[SecurityEventOut])
+def security_events(
+    device_id: Optional[int] = None,
+    event_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 100,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> List[SecurityEventOut]:
+    if not monitoring_api_enabled(session):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Monitoring API disabled",
+        )
+    stmt = select(SecurityEvent).order_by(SecurityEvent.last_seen.desc()).limit(min(limit, 1000))
+    if device_id is not None:
+        stmt = stmt.where(SecurityEvent.device_id == device_id)
+    if event_type:
+        stmt = stmt.where(SecurityEvent.event_type == event_type)
+    if since:
+        stmt = stmt.where(SecurityEvent.last_seen >= since)
+    if until:
+        stmt = stmt.where(SecurityEvent.last_seen < until)
+    return [SecurityEventOut.model_validate(row, from_attributes=True) for row in session.exec(stmt).all()]
 
 
 @router.get("/api/devices/{device_id}", response_model=DeviceOut)
@@ -513,13 +722,8 @@ def get_device_detail(
     session: Session = Depends(get_session),
     _: None = Depends(require_admin_token),
 ) -> DeviceOut:
-    device = get_device(session, device_id)
-    status_row = (
-        session.exec(
-            select(DeviceStatus).where(DeviceStatus.device_id == device_id)
-        ).first()
-    )
-    return _serialize_device(device, status_row)
+    device = _fleet_device(session, device_id)
+    return _serialize_device(device, device.status_row)
 
 
 @router.get("/devices", response_class=HTMLResponse)
@@ -527,57 +731,40 @@ def devices_page(
     request: Request,
     device_type: Optional[str] = None,
     status: Optional[str] = None,
+    presence: Optional[str] = None,
     search: Optional[str] = None,
+    sort: str = "id",
     limit: int = 50,
     offset: int = 0,
     session: Session = Depends(get_session),
     _: None = Depends(require_admin_token),
 ):
+    templates = get_templates()
     if not templates:
         return HTMLResponse(
             content="Templates not available; ensure Jinja2 is installed.",
             status_code=501,
         )
-    if device_type and device_type not in VALID_DEVICE_TYPES:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid device_type filter")
-    if status and status not in VALID_STATUS:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status filter")
-
-    stmt = select(Device)
-    if device_type:
-        stmt = stmt.where(Device.device_type == device_type)
-    if status:
-        stmt = stmt.where(Device.status == status)
-    if search:
-        stmt = stmt.where(Device.hostname.contains(search))
-    limited = stmt.offset(offset).limit(min(limit, 200))
-
-    devices = session.exec(limited).all()
-    total = session.exec(select(func.count()).select_from(stmt.subquery())).one()
-    device_ids = [d.id for d in devices]
-    status_rows = (
-        session.exec(
-            select(DeviceStatus).where(DeviceStatus.device_id.in_(device_ids))
-        ).all()
-        if device_ids
-        else []
-    )
-    status_map = {row.device_id: row for row in status_rows}
-    items = [_serialize_device(dev, status_map.get(dev.id)) for dev in devices]
+    total, devices = _device_page(session, device_type, status, presence, search, sort, offset, limit)
 
     return templates.TemplateResponse(
         "devices.html",
         {
             "request": request,
-            "items": items,
+            "rows": _device_rows(templates, devices),
             "total": total,
             "limit": min(limit, 200),
             "offset": offset,
-            "filters": {"device_type": device_type, "status": status, "search": search},
+            "filters": {
+                "device_type": device_type,
+                "status": status,
+                "presence": presence,
+                "search": search,
+                "sort": sort,
+            },
+            "presence_states": PRESENCE_STATES,
             "admin_session": True,
-            "admin_username": get_settings().admin_username,
             "device_templates": list_device_templates(),
-            "admin_has_password": bool(get_settings().admin_password_hash),
         },
     )
 
@@ -588,42 +775,13 @@ def clients_page(
     session: Session = Depends(get_session),
     _: None = Depends(require_admin_token),
 ):
+    templates = get_templates()
     if not templates:
         return HTMLResponse(
             content="Templates not available; ensure Jinja2 is installed.",
             status_code=501,
         )
-    devices = session.exec(select(Device)).all()
-    device_map = {d.id: d for d in devices}
-    statuses = session.exec(select(DeviceStatus)).all()
-
-    clients_by_mac = {}
-    for status_row in statuses:
-        if not status_row.clients:
-            continue
-        device = device_map.get(status_row.device_id)
-        for entry in status_row.clients:
-            mac = (entry.get("mac") or "").lower()
-            key = mac or f"row-{status_row.device_id}-{len(clients_by_mac)}"
-            record = {
-                "mac": mac or entry.get("host") or entry.get("hostname") or "unknown",
-                "ip": entry.get("ip"),
-                "host": entry.get("host") or entry.get("hostname"),
-                "connection": "wifi" if entry.get("iface") or entry.get("ssid") else "lan",
-                "ssid": entry.get("ssid"),
-                "band": entry.get("band"),
-                "device_name": device.hostname if device else f"device-{status_row.device_id}",
-                "device_id": status_row.device_id,
-                "updated_at": status_row.updated_at,
-            }
-            existing = clients_by_mac.get(key)
-            if existing and existing.get("updated_at") and status_row.updated_at:
-                if existing["updated_at"] >= status_row.updated_at:
-                    continue
-            clients_by_mac[key] = record
-
-    rows = list(clients_by_mac.values())
-    rows.sort(key=lambda r: (r.get("host") or r.get("mac") or "").lower())
+    rows = FLEET.sync(session).clients()
 
     return templates.TemplateResponse(
         "clients.html",
@@ -631,18 +789,11 @@ def clients_page(
             "request": request,
             "clients": rows,
             "admin_session": True,
-            "admin_username": get_settings().admin_username,
-            "admin_has_password": bool(get_settings().admin_password_hash),
         },
     )
 
 
-@router.post("/api/devices/approve", response_model=RegisterResponse)
-def approve_device(
-    payload: ApproveRequest,
-    session: Session = Depends(get_session),
-    _: None = Depends(require_admin_token),
-) -> RegisterResponse:
+def approve_device_impl(session: Session, payload: ApproveRequest) -> RegisterResponse:
     if payload.device_type not in VALID_DEVICE_TYPES or payload.device_type == "unknown":
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -663,9 +814,6 @@ def approve_device(
 
     # Regenerate shared token to force agents to fetch a fresh token.
     refresh_shared_token(session)
-
-    session.commit()
-    session.refresh(device)
     return RegisterResponse(
         device_id=device.id,
         status=device.status,
@@ -675,44 +823,164 @@ def approve_device(
     )
 
 
-@router.post("/api/devices/block", response_model=DeviceOut)
-def block_device(
-    device_id: int,
+@router.post("/api/devices/approve", response_model=RegisterResponse)
+async def approve_device(
+    payload: ApproveRequest,
     session: Session = Depends(get_session),
     _: None = Depends(require_admin_token),
-) -> DeviceOut:
+) -> RegisterResponse:
+    return await run_write(session, approve_device_impl, payload)
+
+
+def block_device_impl(session: Session, device_id: int) -> DeviceOut:
     device = get_device(session, device_id)
     _enforce_transition(device.status, "blocked")
     device.status = "blocked"
     device.approved = False
     session.add(device)
-    session.commit()
+    session.flush()
     status_row = (
         session.exec(select(DeviceStatus).where(DeviceStatus.device_id == device_id)).first()
     )
     return _serialize_device(device, status_row)
 
 
-@router.delete("/api/devices/{device_id}")
-def remove_device(
+@router.post("/api/devices/block", response_model=DeviceOut)
+async def block_device(
     device_id: int,
     session: Session = Depends(get_session),
     _: None = Depends(require_admin_token),
-) -> dict:
-    device = get_device(session, device_id)
-    session.exec(delete(DeviceStatus).where(DeviceStatus.device_id == device_id))
-    session.exec(delete(DeviceConfig).where(DeviceConfig.device_id == device_id))
-    session.delete(device)
-    session.commit()
+) -> DeviceOut:
+    return await run_write(session, block_device_impl, device_id)
+
+
+# Rows keyed by device_id; telemetry tables may sit in another database.
+DEVICE_CHILD_MODELS = (DeviceStatus, DeviceConfig, PresenceEvent, SecurityEvent, RolloutTarget)
+
+
+def _delete_devices(session: Session, device_ids: List[int]) -> None:
+    """One DELETE per table for the whole set; caller commits."""
+    for model in DEVICE_CHILD_MODELS:
+        session.exec(delete(model).where(model.device_id.in_(device_ids)))
+    session.exec(delete(Device).where(Device.id.in_(device_ids)))
+    # Deletes leave no changed row behind; the generation tells readers to reconcile.
+    publish_fleet_delete(session)
+
+
+def remove_device_impl(session: Session, device_id: int) -> dict:
+    get_device(session, device_id)
+    _delete_devices(session, [device_id])
+    session.flush()
     return {"removed": device_id}
 
 
-@router.post("/api/queue-config", response_model=ConfigResponse)
-def queue_config(
-    payload: QueueConfigRequest,
+BULK_MAX_DEVICES = 5000
+
+
+def _bulk_skip_reason(action: str, row, device_type: Optional[str]) -> Optional[str]:
+    if action == "delete":
+        return None
+    target = "approved" if action == "approve" else "blocked"
+    if target not in ALLOWED_TRANSITIONS.get(row.status, set()):
+        return f"Transition {row.status} -> {target} not allowed"
+    if action == "approve" and not row.ssh_enabled:
+        return "Device not reachable via SSH; approval blocked"
+    if action == "approve" and (device_type or row.device_type) == UNKNOWN_DEVICE_TYPE:
+        return "Device type must be valid and not 'unknown' before approval"
+    return None
+
+
+def bulk_device_action_impl(session: Session, payload: BulkDeviceRequest) -> BulkDeviceResult:
+    """Apply one action to many devices with set-based statements; caller commits once."""
+    if payload.device_ids is None and payload.selector is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="device_ids or selector required")
+    if payload.action == "approve" and payload.device_type is not None and (
+        payload.device_type not in VALID_DEVICE_TYPES or payload.device_type == UNKNOWN_DEVICE_TYPE
+    ):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid device_type")
+    stmt = select(Device.id, Device.status, Device.ssh_enabled, Device.device_type)
+    if payload.device_ids is not None:
+        stmt = stmt.where(Device.id.in_(payload.device_ids))
+    if payload.selector is not None:
+        selector = payload.selector
+        if not (selector.device_type or selector.status or selector.presence or selector.search):
+            # An empty selector would match the whole fleet.
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Selector must set at least one filter")
+        if (selector.device_type and selector.device_type not in VALID_DEVICE_TYPES) or (
+            selector.status and selector.status not in VALID_STATUS
+        ) or (selector.presence and selector.presence not in PRESENCE_STATES):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid selector")
+        # Matched like GET /api/devices (case-insensitive search, from FLEET).
+        _, records = FLEET.sync(session).query(
+            selector.device_type, selector.status, selector.presence, selector.search, limit=None
+        )
+        ids = [record.id for record in records]
+        if payload.device_ids is not None:
+            listed = set(payload.device_ids)
+            ids = [device_id for device_id in ids if device_id in listed]
+        stmt = stmt.where(Device.id.in_(ids[: BULK_MAX_DEVICES + 1]))
+        stmt = _filter_devices(stmt, selector.device_type, selector.status, selector.presence)
+    rows = session.exec(stmt.order_by(Device.id).limit(BULK_MAX_DEVICES + 1)).all()
+    if len(rows) > BULK_MAX_DEVICES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Selection matches more than {BULK_MAX_DEVICES} devices",
+        )
+
+    found = {row.id for row in rows}
+    skipped = [
+        BulkSkipped(device_id=device_id, reason="Device not found")
+        for device_id in dict.fromkeys(payload.device_ids or [])
+        if device_id not in found
+    ]
+    applied = []
+    for row in rows:
+        reason = _bulk_skip_reason(payload.action, row, payload.device_type)
+        if reason:
+            skipped.append(BulkSkipped(device_id=row.id, reason=reason))
+        else:
+            applied.append(row.id)
+
+    rotated = False
+    if applied and payload.action == "delete":
+        _delete_devices(session, applied)
+    elif applied and payload.action == "block":
+        session.exec(
+            update(Device)
+            .where(Device.id.in_(applied))
+            .values(status="blocked", approved=False)
+        )
+    elif applied:
+        values = {"status": "approved", "approved": True}
+        if payload.device_type:
+            values["device_type"] = payload.device_type
+        session.exec(update(Device).where(Device.id.in_(applied)).values(**values))
+        # One rotation for the whole batch (see approve_device_impl).
+        refresh_shared_token(session)
+        rotated = True
+    session.flush()
+    return BulkDeviceResult(action=payload.action, applied=applied, skipped=skipped, token_rotated=rotated)
+
+
+@router.post("/api/devices/bulk", response_model=BulkDeviceResult)
+async def bulk_device_action(
+    payload: BulkDeviceRequest,
     session: Session = Depends(get_session),
     _: None = Depends(require_admin_token),
-) -> ConfigResponse:
+) -> BulkDeviceResult:
+    return await run_write(session, bulk_device_action_impl, payload)
+
+
+@router.delete("/api/devices/{device_id}")
+async def remove_device(
+    device_id: int,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> dict:
+    return await run_write(session, remove_device_impl, device_id)
+
+
+def queue_config_impl(session: Session, payload: QueueConfigRequest) -> ConfigResponse:
     device = get_device(session, payload.device_id)
     if not device.approved or device.status != "approved":
         raise HTTPException(
@@ -733,8 +1001,7 @@ def queue_config(
         oldest = existing.pop(0)
         session.delete(oldest)
 
-    canonical_json = json.dumps(payload.package_json, sort_keys=True, separators=(",", ":"))
-    sha256 = hashlib.sha256(canonical_json.encode()).hexdigest()
+    sha256 = canonical_sha256(payload.package_json)
 
     config_entry = DeviceConfig(
         device_id=payload.device_id,
@@ -743,8 +1010,7 @@ def queue_config(
         sha256=sha256,
     )
     session.add(config_entry)
-    session.commit()
-    session.refresh(config_entry)
+    session.flush()
 
     return ConfigResponse(
         device_id=config_entry.device_id,
@@ -755,6 +1021,15 @@ def queue_config(
     )
 
 
+@router.post("/api/queue-config", response_model=ConfigResponse)
+async def queue_config(
+    payload: QueueConfigRequest,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> ConfigResponse:
+    return await run_write(session, queue_config_impl, payload)
+
+
 @router.post("/api/configs/clear")
 def clear_configs(
     payload: ClearConfigRequest,
@@ -774,6 +1049,7 @@ def clear_configs(
 def change_admin_password(
     payload: ChangePasswordRequest,
     request: Request,
+    session: Session = Depends(get_session),
     _: None = Depends(require_admin_token),
 ) -> dict:
     settings = get_settings()
@@ -798,7 +1074,12 @@ def change_admin_password(
 
     # Attempt to persist to env file when possible.
     _persist_admin_hash(new_hash, settings)
+    # Other workers re-read the env file when they see the bumped generation.
+    BUS.publish(session, TOPIC_ADMIN_CREDENTIALS)
+    session.commit()
     return {"status": "ok"}
+
+
 @router.get("/devices/{device_id}", response_class=HTMLResponse)
 def device_detail_page(
     request: Request,
@@ -806,18 +1087,14 @@ def device_detail_page(
     session: Session = Depends(get_session),
     _: None = Depends(require_admin_token),
 ):
+    templates = get_templates()
     if not templates:
         return HTMLResponse(
             content="Templates not available; ensure Jinja2 is installed.",
             status_code=501,
         )
-    device = get_device(session, device_id)
-    status_row = (
-        session.exec(
-            select(DeviceStatus).where(DeviceStatus.device_id == device_id)
-        ).first()
-    )
-    serialized = _serialize_device(device, status_row)
+    device = _fleet_device(session, device_id)
+    serialized = _serialize_device(device, device.status_row)
     device_json = serialized.model_dump()
     device_json_str = json.dumps(device_json, default=str, indent=2)
     is_router_like = device.device_type in {"router", "firewall"}
@@ -832,7 +1109,5 @@ def device_detail_page(
             "admin_session": True,
             "is_router_like": is_router_like,
             "is_ap_like": is_ap_like,
-            "admin_username": get_settings().admin_username,
-            "admin_has_password": bool(get_settings().admin_password_hash),
         },
     )
@@ -0,0 +1,163 @@
+"""Production server profile: uvicorn/Nginx settings derived from the host.
+
+`install_wiretide.sh` runs `python -m wiretide.runtime plan` inside the venv
+and writes the result to `/etc/wiretide/runtime.env`; the systemd unit passes
+those values to uvicorn and the generated Nginx config uses the upstream
+keepalive pool size. `/health` reports what the running process was started
+with (`describe_runtime`) so the choice can be checked on a live controller.
+
+Worker count: one per available core (CPU affinity and the cgroup quota are
+honoured), capped at `SQLITE_MAX_WORKERS` on SQLite, where every worker
+contends for the same write lock, and at `MAX_WORKERS` otherwise.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+from dataclasses import asdict, dataclass
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+from .config import get_settings
+
+SQLITE_MAX_WORKERS = 4
+MAX_WORKERS = 16
+MAX_BACKLOG = 4096
+# Uvicorn must keep idle connections open longer than Nginx reuses them, or
+# Nginx can send a request on a socket uvicorn is closing.
+NGINX_KEEPALIVE_TIMEOUT = 15
+KEEPALIVE_TIMEOUT = NGINX_KEEPALIVE_TIMEOUT + 5
+
+
+@dataclass
+class RuntimeProfile:
+    profile: str
+    cpus: int
+    db_mode: str
+    workers: int
+    loop: str
+    http: str
+    backlog: int
+    keepalive_timeout: int
+    nginx_keepalive: int
+
+    def env(self) -> Dict[str, str]:
+        """Settings names as read by `config.Settings` (and expanded in the systemd unit)."""
+        return {
+            "WIRETIDE_RUNTIME_PROFILE": self.profile,
+            "WIRETIDE_SERVER_WORKERS": str(self.workers),
+            "WIRETIDE_SERVER_LOOP": self.loop,
+            "WIRETIDE_SERVER_HTTP": self.http,
+            "WIRETIDE_SERVER_BACKLOG": str(self.backlog),
+            "WIRETIDE_SERVER_KEEPALIVE_TIMEOUT": str(self.keepalive_timeout),
+            "WIRETIDE_NGINX_KEEPALIVE": str(self.nginx_keepalive),
+        }
+
+
+def available_cpus() -> int:
+    """Cores this process may use: affinity mask, further limited by a cgroup v2 quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - not Linux
+        cpus = os.cpu_count() or 1
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(cpus, 1)
+
+
+def somaxconn() -> int:
+    try:
+        return int(Path("/proc/sys/net/core/somaxconn").read_text())
+    except (OSError, ValueError):
+        return 128
+
+
+def plan_runtime(
+    cpus: int,
+    database_url: str,
+    uvloop: Optional[bool] = None,
+    httptools: Optional[bool] = None,
+    listen_backlog: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> RuntimeProfile:
+    """Production profile for a host with `cpus` cores; `workers` overrides the computed count."""
+    db_mode = "sqlite" if database_url.startswith("sqlite") else "server"
+    if workers is None:
+        workers = min(cpus, SQLITE_MAX_WORKERS if db_mode == "sqlite" else MAX_WORKERS)
+    workers = max(workers, 1)
+    uvloop = find_spec("uvloop") is not None if uvloop is None else uvloop
+    httptools = find_spec("httptools") is not None if httptools is None else httptools
+    # The kernel silently truncates listen() backlogs to somaxconn.
+    backlog = max(128, min(somaxconn() if listen_backlog is None else listen_backlog, MAX_BACKLOG))
+    return RuntimeProfile(
+        profile="production",
+        cpus=cpus,
+        db_mode=db_mode,
+        workers=workers,
+        loop="uvloop" if uvloop else "asyncio",
+        http="httptools" if httptools else "h11",
+        backlog=backlog,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        nginx_keepalive=max(16, 8 * workers),
+    )
+
+
+def _event_loop() -> str:
+    # uvicorn --loop uvloop installs uvloop's policy; readable from any thread.
+    return type(asyncio.get_event_loop_policy()).__module__.split(".")[0]
+
+
+def describe_runtime() -> Dict[str, Any]:
+    """Server settings this process was started with, plus what is actually in use."""
+    settings = get_settings()
+    http = None
+    if "uvicorn.protocols.http.httptools_impl" in sys.modules:
+        http = "httptools"
+    elif "uvicorn.protocols.http.h11_impl" in sys.modules:
+        http = "h11"
+    return {
+        "profile": settings.runtime_profile,
+        "workers": settings.server_workers,
+        "loop": settings.server_loop,
+        "http": settings.server_http,
+        "backlog": settings.server_backlog,
+        "keepalive_timeout": settings.server_keepalive_timeout,
+        "db_mode": "sqlite" if settings.using_sqlite else "server",
+        "cpus": available_cpus(),
+        "pid": os.getpid(),
+        "active_loop": _event_loop(),
+        "active_http": http,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m wiretide.runtime", description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=("plan",))
+    parser.add_argument("--cpus", type=int, default=None, help="cores to plan for (default: detected)")
+    parser.add_argument("--workers", type=int, default=None, help="override the computed worker count")
+    parser.add_argument("--database-url", default=None, help="default: WIRETIDE_DATABASE_URL")
+    parser.add_argument("--format", choices=("env", "json"), default="env")
+    args = parser.parse_args(argv)
+    profile = plan_runtime(
+        args.cpus or available_cpus(),
+        args.database_url or get_settings().database_url,
+        workers=args.workers,
+    )
+    if args.format == "json":
+        print(json.dumps(asdict(profile)))
+    else:
+        for key, value in profile.env().items():
+            print(f"{key}={value}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
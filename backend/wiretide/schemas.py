@@ -1,7 +1,7 @@
 """Pydantic/SQLModel schemas for API I/O."""
 
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field as PydanticField
 
@@ -67,6 +67,36 @@ class ApproveRequest(BaseModel):
     device_type: str
 
 
+class DeviceSelector(BaseModel):
+    """Same filters as `GET /api/devices`; at least one must be set."""
+
+    device_type: Optional[str] = None
+    status: Optional[str] = None
+    presence: Optional[str] = None
+    search: Optional[str] = None
+
+
+class BulkDeviceRequest(BaseModel):
+    action: Literal["approve", "block", "delete"]
+    device_ids: Optional[List[int]] = PydanticField(default=None, max_length=5000)
+    selector: Optional[DeviceSelector] = None
+    device_type: Optional[str] = PydanticField(
+        default=None, description="approve only: type to assign (default: each device's current type)."
+    )
+
+
+class BulkSkipped(BaseModel):
+    device_id: int
+    reason: str
+
+
+class BulkDeviceResult(BaseModel):
+    action: str
+    applied: List[int]
+    skipped: List[BulkSkipped]
+    token_rotated: bool = False
+
+
 class TokenResponse(BaseModel):
     shared_token: str
 
@@ -100,6 +130,8 @@ class DeviceOut(BaseModel):
     agent_version: Optional[str] = None
     agent_update_allowed: bool
     ip_last: Optional[str] = None
+    presence: str = "unknown"
+    presence_changed_at: Optional[datetime] = None
     created_at: datetime
     status_row: Optional[DeviceStatusOut] = None
     template: Optional[DeviceTemplateInfo] = None
@@ -112,6 +144,155 @@ class DevicesListResponse(BaseModel):
     offset: int
 
 
+class PresenceSummary(BaseModel):
+    counts: Dict[str, int]
+    stale_after: int
+    offline_after: int
+
+
+class PresenceEventOut(BaseModel):
+    id: int
+    device_id: int
+    previous: str
+    presence: str
+    at: datetime
+
+
+class SecurityEventOut(BaseModel):
+    id: int
+    device_id: int
+    event_type: str
+    severity: Optional[str] = None
+    src: Optional[str] = None
+    dst: Optional[str] = None
+    raw: Optional[str] = None
+    tags: Optional[List[str]] = None
+    first_seen: datetime
+    last_seen: datetime
+    count: int
+
+
+class MaintenanceRunOut(BaseModel):
+    id: int
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    duration_ms: Optional[float] = None
+    rows_deleted: Dict[str, int]
+    pages_reclaimed: int
+    databases: List[Dict[str, Any]]
+    error: Optional[str] = None
+
+
+class PreRegistrationIn(BaseModel):
+    hostname: str = PydanticField(min_length=1, max_length=255)
+    device_type: str
+    description: Optional[str] = None
+    ssh_fingerprint: str = PydanticField(min_length=1)
+
+
+class PreRegistrationOut(PreRegistrationIn):
+    id: int
+    created_at: datetime
+    claimed_at: Optional[datetime] = None
+    device_id: Optional[int] = None
+
+
+class ImportRowResult(BaseModel):
+    line: int
+    hostname: Optional[str] = None
+    result: str = PydanticField(description="created|updated|error")
+    approved: bool = PydanticField(default=False, description="an already registered device was approved")
+    detail: Optional[str] = None
+
+
+class ImportResult(BaseModel):
+    created: int
+    updated: int
+    approved: int
+    errors: int
+    rows: List[ImportRowResult]
+
+
+class ProfilerArmRequest(BaseModel):
+    pattern: str = PydanticField(
+        min_length=1, description="fnmatch pattern on the route template or path, e.g. /api/devices*"
+    )
+    method: Optional[str] = PydanticField(default=None, description="only this HTTP method (default: any)")
+    count: int = PydanticField(default=5, ge=1, le=100, description="requests to capture across all workers")
+    mode: Literal["cprofile", "sample"] = "cprofile"
+    ttl_seconds: int = PydanticField(default=600, ge=1, le=86400, description="disarm after this long")
+
+
+class ProfilerArmOut(BaseModel):
+    pattern: str
+    method: Optional[str] = None
+    mode: str
+    remaining: int
+    armed_at: datetime
+    expires_at: datetime
+
+
+class ProfilerState(BaseModel):
+    armed: Optional[ProfilerArmOut] = None
+    captures: List[Dict[str, Any]]
+
+
+class BackupOut(BaseModel):
+    name: str
+    database: str
+    size: int
+    sha256: str
+    created_at: datetime
+
+
+class ArtifactOut(BaseModel):
+    sha256: str
+    version: str
+    filename: str
+    size: int
+    url: str
+    created_at: datetime
+
+
+class RolloutCreate(BaseModel):
+    artifact_sha256: str
+    percent: int = PydanticField(default=10, ge=0, le=100)
+    device_types: Optional[List[str]] = None
+    max_concurrent: int = PydanticField(default=25, ge=1)
+    error_threshold: float = PydanticField(default=0.2, gt=0, le=1)
+    min_reports: int = PydanticField(default=10, ge=1)
+
+
+class RolloutPatch(BaseModel):
+    status: Optional[str] = PydanticField(default=None, description="active|paused|cancelled")
+    percent: Optional[int] = PydanticField(default=None, ge=0, le=100)
+    max_concurrent: Optional[int] = PydanticField(default=None, ge=1)
+    error_threshold: Optional[float] = PydanticField(default=None, gt=0, le=1)
+
+
+class RolloutOut(BaseModel):
+    id: int
+    artifact_sha256: str
+    version: str
+    status: str
+    percent: int
+    device_types: Optional[List[str]] = None
+    max_concurrent: int
+    error_threshold: float
+    min_reports: int
+    pause_reason: Optional[str] = None
+    counts: Dict[str, int]
+    created_at: datetime
+    updated_at: datetime
+
+
+class UpdateReport(BaseModel):
+    device_id: int
+    version: str
+    success: bool
+    error: Optional[str] = None
+
+
 class SettingsResponse(BaseModel):
     shared_token: str
     agent_update_policy: str
@@ -0,0 +1,177 @@
+"""Append-only security event store fed from `/status` security_log_samples.
+
+Recognised sample shapes (anything else stays in the status snapshot only):
+- ``{"events": [{"type": ..., "src": ..., "dst": ..., "severity": ..., "ts": ..., "raw": ..., "tags": [...]}]}``
+- ``{"<event_type>": ["raw log line", {...}, ...]}``
+
+Events are aggregated per (device, fingerprint, time bucket) in memory and
+written with one multi-row upsert per chunk, so a flood of identical events
+costs a counter increment rather than a row each. The bucket is taken from the
+receive time, not the agent timestamp, so a report only ever writes to the
+current bucket: once a bucket has closed its rows no longer change, which is
+what the monitoring stream's cursor relies on. At most
+`security_events_max_per_report` events are parsed per report; the remainder is
+recorded as a single `ingest_truncated` event.
+"""
+
+import hashlib
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import case
+from sqlmodel import Session
+
+from .config import get_settings
+from .db import dialect_insert, prune_in_batches
+from .models import SecurityEvent
+from .services import monitoring_api_enabled
+
+TRUNCATED_EVENT_TYPE = "ingest_truncated"
+MAX_FIELD_LENGTH = 128
+MAX_RAW_LENGTH = 512
+UPSERT_CHUNK = 200
+PRUNE_BATCH = 5000
+
+_DIGITS = re.compile(r"\d+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def iter_sample_events(samples: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    for key, value in samples.items():
+        if not isinstance(value, list):
+            continue
+        for item in value:
+            if isinstance(item, str):
+                yield {"type": key, "raw": item}
+            elif isinstance(item, dict):
+                event = dict(item)
+                if key != "events":
+                    event["type"] = key
+                yield event
+
+
+def event_fingerprint(event_type: str, src: Optional[str], dst: Optional[str], raw: Optional[str]) -> str:
+    """Stable key for "the same event"; numbers in the raw line (ports, pids, counters) are ignored."""
+    normalized = _WHITESPACE.sub(" ", _DIGITS.sub("#", raw or "")).strip()
+    key = "|".join((event_type, src or "", dst or "", normalized))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _text(value: Any, limit: int = MAX_FIELD_LENGTH) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    return str(value)[:limit]
+
+
+def _event_time(value: Any, now: datetime) -> datetime:
+    """Agent timestamp (epoch seconds or ISO 8601), clamped to the receive time."""
+    ts: Optional[datetime] = None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            ts = datetime.fromtimestamp(value, tz=timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            ts = None
+    elif isinstance(value, str):
+        try:
+            ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            ts = None
+        if ts is not None and ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+    if ts is None or ts > now:
+        return now
+    return ts
+
+
+def _bucket(ts: datetime, seconds: int) -> datetime:
+    epoch = int(ts.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % max(seconds, 1), tz=timezone.utc)
+
+
+def _row(device_id: int, event: Dict[str, Any], ts: datetime, bucket: datetime) -> Dict[str, Any]:
+    event_type = _text(event.get("type")) or "unknown"
+    src = _text(event.get("src"))
+    dst = _text(event.get("dst") or event.get("dest"))
+    raw = _text(event.get("raw") or event.get("message"), MAX_RAW_LENGTH)
+    tags = event.get("tags")
+    return {
+        "device_id": device_id,
+        "event_type": event_type,
+        "severity": _text(event.get("severity")),
+        "src": src,
+        "dst": dst,
+        "raw": raw,
+        "tags": [str(tag)[:MAX_FIELD_LENGTH] for tag in tags[:16]] if isinstance(tags, list) else None,
+        "fingerprint": event_fingerprint(event_type, src, dst, raw),
+        "bucket": bucket,
+        "first_seen": ts,
+        "last_seen": ts,
+        "count": 1,
+    }
+
+
+def aggregate_events(
+    device_id: int, samples: Dict[str, Any], now: datetime
+) -> List[Dict[str, Any]]:
+    """Collapse a report's events into one row per dedup key (bounded by the per-report cap)."""
+    settings = get_settings()
+    limit = settings.security_events_max_per_report
+    # Backdated events count towards the open bucket; closed buckets are never written again.
+    bucket = _bucket(now, settings.security_event_bucket_seconds)
+    rows: Dict[Tuple[str, datetime], Dict[str, Any]] = {}
+    dropped = 0
+    for index, event in enumerate(iter_sample_events(samples)):
+        if index >= limit:
+            dropped += 1
+            continue
+        ts = _event_time(event.get("ts"), now)
+        row = _row(device_id, event, ts, bucket)
+        key = (row["fingerprint"], row["bucket"])
+        existing = rows.get(key)
+        if existing is None:
+            rows[key] = row
+            continue
+        existing["count"] += 1
+        existing["first_seen"] = min(existing["first_seen"], ts)
+        existing["last_seen"] = max(existing["last_seen"], ts)
+    if dropped:
+        row = _row(device_id, {"type": TRUNCATED_EVENT_TYPE, "severity": "warning"}, now, bucket)
+        row["count"] = dropped
+        rows[(row["fingerprint"], row["bucket"])] = row
+    return list(rows.values())
+
+
+def ingest_security_samples(
+    session: Session, device_id: int, samples: Optional[Dict[str, Any]], now: datetime
+) -> int:
+    """Upsert the report's events; returns the number of dedup rows written. Caller commits."""
+    if not samples or not monitoring_api_enabled(session):
+        return 0
+    rows = aggregate_events(device_id, samples, now)
+    table = SecurityEvent.__table__.c
+    for start in range(0, len(rows), UPSERT_CHUNK):
+        stmt = dialect_insert(session, SecurityEvent).values(rows[start : start + UPSERT_CHUNK])
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["device_id", "fingerprint", "bucket"],
+            set_={
+                "count": table["count"] + excluded["count"],
+                "last_seen": case(
+                    (excluded.last_seen > table.last_seen, excluded.last_seen),
+                    else_=table.last_seen,
+                ),
+            },
+        )
+        session.exec(stmt)
+    return len(rows)
+
+
+def prune_security_events(session: Session, now: Optional[datetime] = None) -> int:
+    """Delete events past retention in bounded batches (commits per batch).
+
+    Scheduled pruning runs through `maintenance.retention_rules`.
+    """
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=get_settings().security_event_retention_days)
+    return prune_in_batches(session, SecurityEvent, SecurityEvent.last_seen < cutoff, PRUNE_BATCH)
@@ -1,12 +1,17 @@
 """Domain services for Wiretide backend."""
 
+import hashlib
+import json
 import secrets
-from typing import Optional
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
 
 from fastapi import HTTPException, status
+from sqlalchemy import func, update
 from sqlmodel import Session, select
 
-from .models import ControllerSettings, Device
+from .cache_bus import BUS, TOPIC_CONTROLLER_SETTINGS, CachedValue
+from .models import ControllerSettings, Device, DeviceStatus, PreRegistration
 
 
 def ensure_settings_seeded(session: Session) -> ControllerSettings:
@@ -34,12 +39,54 @@ def get_settings_row(session: Session) -> ControllerSettings:
     return settings
 
 
+def _load_shared_token(session: Session) -> str:
+    return get_settings_row(session).shared_token
+
+
+_shared_token_cache: CachedValue[str] = CachedValue(BUS, TOPIC_CONTROLLER_SETTINGS, _load_shared_token)
+
+
+def shared_token_matches(session: Session, token: Optional[str]) -> bool:
+    """Compare against the cached shared token, re-reading the DB on mismatch.
+
+    The fallback read covers the poll window after another worker rotated the
+    token, so a fresh token is never rejected because of a stale cache.
+    """
+    if not token:
+        return False
+    if token == _shared_token_cache.get(session):
+        return True
+    if token == _load_shared_token(session):
+        _shared_token_cache.invalidate()
+        return True
+    return False
+
+
+_monitoring_enabled_cache: CachedValue[bool] = CachedValue(
+    BUS, TOPIC_CONTROLLER_SETTINGS, lambda session: get_settings_row(session).monitoring_api_enabled
+)
+
+
+def monitoring_api_enabled(session: Session) -> bool:
+    return _monitoring_enabled_cache.get(session)
+
+
+def save_controller_settings(session: Session, settings: ControllerSettings) -> ControllerSettings:
+    """Persist a settings change and invalidate cached copies in every worker."""
+    session.add(settings)
+    BUS.publish(session, TOPIC_CONTROLLER_SETTINGS)
+    session.commit()
+    session.refresh(settings)
+    return settings
+
+
 def refresh_shared_token(session: Session) -> ControllerSettings:
+    """Rotate the shared agent token; caller commits."""
     settings = get_settings_row(session)
     settings.shared_token = _generate_token()
     session.add(settings)
-    session.commit()
-    session.refresh(settings)
+    BUS.publish(session, TOPIC_CONTROLLER_SETTINGS)
+    session.flush()
     return settings
 
 
@@ -58,6 +105,103 @@ def find_device_by_hostname(session: Session, hostname: str) -> Optional[Device]
     return session.exec(statement).first()
 
 
+def claim_preregistration(
+    session: Session, device_id: int, hostname: str, fingerprint: Optional[str], now: datetime
+) -> Optional[PreRegistration]:
+    """Approve a waiting, SSH-reachable device whose hostname and fingerprint match an import; caller commits."""
+    if not fingerprint:
+        return None
+    entry = session.exec(
+        select(PreRegistration).where(PreRegistration.hostname == hostname, PreRegistration.claimed_at.is_(None))
+    ).first()
+    if entry is None or entry.ssh_fingerprint != fingerprint.strip():
+        return None
+    approved = session.exec(
+        update(Device)
+        .where(Device.id == device_id, Device.status == "waiting", Device.ssh_enabled.is_(True))
+        .values(
+            status="approved",
+            approved=True,
+            device_type=entry.device_type,
+            description=func.coalesce(Device.description, entry.description),
+        )
+    ).rowcount
+    if not approved:
+        return None
+    entry.claimed_at = now
+    entry.device_id = device_id
+    session.add(entry)
+    return entry
+
+
+def canonical_sha256(package_json: Dict[str, Any]) -> str:
+    """SHA256 over the canonical JSON form agents verify (see agent/CONTRACT.md)."""
+    canonical_json = json.dumps(package_json, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical_json.encode()).hexdigest()
+
+
+class ClientSummary:
+    """One reported client as listed on /clients."""
+
+    __slots__ = ("mac", "ip", "host", "connection", "ssid", "band")
+
+    def __init__(self, entry: Mapping[str, Any]) -> None:
+        self.mac = (entry.get("mac") or "").lower()
+        self.ip = entry.get("ip")
+        self.host = entry.get("host") or entry.get("hostname")
+        self.connection = "wifi" if entry.get("iface") or entry.get("ssid") else "lan"
+        self.ssid = entry.get("ssid")
+        self.band = entry.get("band")
+
+
+ClientRows = Iterable[Tuple[int, str, Optional[datetime], Iterable[ClientSummary]]]
+
+
+def merge_clients(rows: ClientRows) -> List[Dict[str, Any]]:
+    """Merge (device_id, device_name, updated_at, clients) rows, keeping the freshest entry per MAC."""
+    clients_by_mac: Dict[str, Dict[str, Any]] = {}
+    for device_id, device_name, updated_at, clients in rows:
+        for client in clients:
+            key = client.mac or f"row-{device_id}-{len(clients_by_mac)}"
+            existing = clients_by_mac.get(key)
+            if existing and existing.get("updated_at") and updated_at:
+                if existing["updated_at"] >= updated_at:
+                    continue
+            clients_by_mac[key] = {
+                "mac": client.mac or client.host or "unknown",
+                "ip": client.ip,
+                "host": client.host,
+                "connection": client.connection,
+                "ssid": client.ssid,
+                "band": client.band,
+                "device_name": device_name,
+                "device_id": device_id,
+                "updated_at": updated_at,
+            }
+
+    merged = list(clients_by_mac.values())
+    merged.sort(key=lambda r: (r.get("host") or r.get("mac") or "").lower())
+    return merged
+
+
+def aggregate_clients(
+    statuses: Iterable[DeviceStatus], device_map: Mapping[int, Device]
+) -> List[Dict[str, Any]]:
+    """Merge client lists across devices, keeping the freshest entry per MAC."""
+    return merge_clients(
+        (
+            status_row.device_id,
+            device_map[status_row.device_id].hostname
+            if status_row.device_id in device_map
+            else f"device-{status_row.device_id}",
+            status_row.updated_at,
+            [ClientSummary(entry) for entry in status_row.clients],
+        )
+        for status_row in statuses
+        if status_row.clients
+    )
+
+
 def _generate_token(length: int = 32) -> str:
     # token_urlsafe gives ~4/3 * n bytes; default yields ~43 chars.
     return secrets.token_urlsafe(length)
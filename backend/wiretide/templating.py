@@ -0,0 +1,156 @@
+"""Shared Jinja2 environment for the server-rendered UI.
+
+One environment serves every page. It is built on first use (jinja2 is not
+imported until then, keeping it off the agent startup path) and warmed after
+startup by `precompile_templates`; compiled bytecode is kept on disk across
+restarts and files are not re-checked on each render unless
+`WIRETIDE_TEMPLATES_AUTO_RELOAD` is set. Admin globals live on the
+environment and are refreshed when the credentials change.
+
+`FragmentCache` keeps rendered HTML snippets keyed by a version of the data
+they show; `DEVICE_ROWS` holds one /devices table row per device, valid for
+the `version` of its fleet record, so a page view only renders rows whose
+device or status changed since they were last shown.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from importlib.util import find_spec
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Hashable, Optional, Tuple
+
+from .assets import asset_url
+from .config import get_settings
+from .metrics import FRAGMENT_CACHE
+from .tracing import span
+
+if TYPE_CHECKING:  # pragma: no cover
+    from fastapi.templating import Jinja2Templates
+
+logger = logging.getLogger("wiretide.templating")
+
+# Optional templates for basic server-rendered UI.
+JINJA_AVAILABLE = find_spec("jinja2") is not None
+
+BASE_PATH = Path(__file__).resolve().parent
+TEMPLATES_DIR = (BASE_PATH.parent / get_settings().templates_dir).resolve()
+
+
+def _build_templates() -> Optional["Jinja2Templates"]:
+    if not JINJA_AVAILABLE:
+        return None
+    import jinja2
+    from fastapi.templating import Jinja2Templates
+
+    class TracedTemplate(jinja2.Template):
+        def render(self, *args, **kwargs):
+            with span("render", f"render {self.name}", template=self.name):
+                return super().render(*args, **kwargs)
+
+    settings = get_settings()
+    bytecode_cache = None
+    if settings.template_bytecode_cache:
+        cache_dir = settings.template_cache_dir
+        if cache_dir:
+            Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(cache_dir)
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(str(TEMPLATES_DIR)),
+        autoescape=True,
+        auto_reload=settings.templates_auto_reload,
+        bytecode_cache=bytecode_cache,
+    )
+    env.template_class = TracedTemplate
+    env.globals["asset_url"] = asset_url
+    templates = Jinja2Templates(env=env)
+    _set_admin_globals(templates)
+    return templates
+
+
+_templates: Optional["Jinja2Templates"] = None
+_templates_lock = threading.Lock()
+
+
+def get_templates() -> Optional["Jinja2Templates"]:
+    """The shared templates object (None without jinja2), built on first call."""
+    global _templates
+    if _templates is None and JINJA_AVAILABLE:
+        with _templates_lock:
+            if _templates is None:
+                _templates = _build_templates()
+    return _templates
+
+
+def _set_admin_globals(templates: "Jinja2Templates") -> None:
+    settings = get_settings()
+    templates.env.globals.update(
+        admin_username=settings.admin_username,
+        admin_has_password=bool(settings.admin_password_hash),
+    )
+
+
+def refresh_template_globals() -> None:
+    """Recompute admin globals after a credentials change."""
+    if _templates is not None:
+        _set_admin_globals(_templates)
+
+
+def precompile_templates() -> int:
+    """Compile every template now so the first page view does not pay for it."""
+    templates = get_templates()
+    if templates is None:
+        return 0
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+    logger.info("Precompiled %d templates", len(names))
+    return len(names)
+
+
+class FragmentCache:
+    """Bounded LRU of rendered HTML fragments, one per key, valid for one version of its data.
+
+    Lookups are counted in `wiretide_fragment_cache_total` (hit, miss, evict).
+    """
+
+    def __init__(self, name: str, size_setting: str) -> None:
+        self.name = name
+        self.size_setting = size_setting
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: Optional[Hashable], render: Callable[[], str]) -> str:
+        """The fragment stored for `key` at `version`, else `render()` it; a None version is never cached."""
+        if version is not None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == version:
+                    self._entries.move_to_end(key)
+                    FRAGMENT_CACHE.inc(self.name, "hit")
+                    return entry[1]
+        FRAGMENT_CACHE.inc(self.name, "miss")
+        html = render()
+        limit = getattr(get_settings(), self.size_setting)
+        if version is None or limit <= 0:
+            return html
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (version, html)
+            self._entries.move_to_end(key)
+            while len(self._entries) > limit:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            FRAGMENT_CACHE.inc(self.name, "evict", amount=evicted)
+        return html
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+DEVICE_ROWS = FragmentCache("device_rows", "device_row_cache_size")
@@ -0,0 +1,316 @@
+"""Sampled per-request trace spans.
+
+A fraction (`trace_sample_rate`) of requests, plus any request arriving with a
+sampled W3C `traceparent`, get a `Trace` on their `RequestContext`. Spans are
+recorded for auth, each DB statement, `_serialize_device` and template
+rendering; the per-stage totals go out in a `Server-Timing` header and the
+whole trace is appended to `trace_file` as one OTLP/JSON `resourceSpans` line
+(the format the OpenTelemetry collector's file exporter writes and its
+`otlpjsonfile` receiver reads). Each worker process writes its own file
+(`<stem>.<pid><suffix>`) and rotates it by size, so workers never rotate a
+file another worker still appends to; files of pids that no longer run are
+removed when a writer starts, so disk use stays bounded across restarts.
+
+Unsampled requests pay one context lookup per instrumented call. A trace
+keeps at most `MAX_SPANS` span records; stage totals stay exact beyond that.
+"""
+
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from threading import Lock
+from time import perf_counter_ns, time_ns
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .config import get_settings
+from .request_context import current_request
+
+MAX_SPANS = 256
+STAGES = ("auth", "db", "serialize", "render")
+SPAN_KIND_INTERNAL, SPAN_KIND_SERVER, SPAN_KIND_CLIENT = 1, 2, 3
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# (stage, span id) of the innermost open span in this context.
+_parent: ContextVar[Optional[Tuple[str, str]]] = ContextVar("wiretide_trace_parent", default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "kind", "start", "end", "attributes")
+
+    def __init__(
+        self,
+        name: str,
+        span_id: str,
+        parent_id: Optional[str],
+        kind: int,
+        start: int,
+        end: int,
+        attributes: Dict[str, Any],
+    ) -> None:
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.attributes = attributes
+
+
+class Trace:
+    """Spans and stage totals of one sampled request; times are perf_counter_ns."""
+
+    __slots__ = ("trace_id", "root_id", "remote_parent", "wall_start", "start", "spans", "stages", "dropped")
+
+    def __init__(self, trace_id: Optional[str] = None, remote_parent: Optional[str] = None) -> None:
+        self.trace_id = trace_id or _new_id(16)
+        self.root_id = _new_id(8)
+        self.remote_parent = remote_parent
+        self.wall_start = time_ns()
+        self.start = perf_counter_ns()
+        self.spans: List[Span] = []
+        self.stages: Dict[str, int] = {}
+        self.dropped = 0
+
+    def record(
+        self,
+        stage: str,
+        name: str,
+        start: int,
+        end: int,
+        attributes: Dict[str, Any],
+        kind: int = SPAN_KIND_INTERNAL,
+        span_id: Optional[str] = None,
+        nested: bool = False,
+    ) -> None:
+        """Add a finished span; `nested` spans (inside one of the same stage) are not double-counted."""
+        if not nested:
+            self.stages[stage] = self.stages.get(stage, 0) + end - start
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return
+        parent = _parent.get()
+        self.spans.append(
+            Span(name, span_id or _new_id(8), parent[1] if parent else self.root_id, kind, start, end, attributes)
+        )
+
+    def server_timing(self, now: int) -> str:
+        parts = [f"{stage};dur={self.stages[stage] / 1e6:.2f}" for stage in STAGES if stage in self.stages]
+        parts.append(f"total;dur={(now - self.start) / 1e6:.2f}")
+        parts.append(f'trace;desc="{self.trace_id}"')
+        return ", ".join(parts)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.root_id}-01"
+
+    def to_otlp(self, name: str, end: int, attributes: Dict[str, Any]) -> Dict[str, Any]:
+        root = Span(name, self.root_id, self.remote_parent, SPAN_KIND_SERVER, self.start, end, attributes)
+        if self.dropped:
+            root.attributes["wiretide.spans_dropped"] = self.dropped
+        spans = [self._otlp_span(span) for span in [root, *self.spans]]
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": _attributes(_resource())},
+                    "scopeSpans": [{"scope": {"name": "wiretide"}, "spans": spans}],
+                }
+            ]
+        }
+
+    def _otlp_span(self, span: Span) -> Dict[str, Any]:
+        status = span.attributes.get("http.status_code")
+        data = {
+            "traceId": self.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": span.kind,
+            "startTimeUnixNano": str(self.wall_start + span.start - self.start),
+            "endTimeUnixNano": str(self.wall_start + span.end - self.start),
+            "attributes": _attributes(span.attributes),
+            "status": {"code": 2 if isinstance(status, int) and status >= 500 else 0},
+        }
+        if span.parent_id:
+            data["parentSpanId"] = span.parent_id
+        return data
+
+
+def _resource() -> Dict[str, Any]:
+    settings = get_settings()
+    return {"service.name": "wiretide", "service.version": settings.version, "process.pid": os.getpid()}
+
+
+def _attributes(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+    out = []
+    for key, value in values.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        out.append({"key": key, "value": typed})
+    return out
+
+
+def start_trace(headers: List[Tuple[bytes, bytes]]) -> Optional[Trace]:
+    """Sampling decision for a new request: parent-based, else `trace_sample_rate`."""
+    for key, value in headers:
+        if key == b"traceparent":
+            match = TRACEPARENT.match(value.decode("latin-1").strip().lower())
+            if match and int(match.group(3), 16) & 1:
+                return Trace(match.group(1), match.group(2))
+            break
+    rate = get_settings().trace_sample_rate
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return None
+    return Trace()
+
+
+def current_trace() -> Optional[Trace]:
+    ctx = current_request()
+    return ctx.trace if ctx is not None else None
+
+
+@contextmanager
+def span(stage: str, name: Optional[str] = None, **attributes: Any) -> Iterator[None]:
+    """Time the enclosed block as a span of `stage` when the request is sampled."""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    parent = _parent.get()
+    span_id = _new_id(8)
+    token = _parent.set((stage, span_id))
+    start = perf_counter_ns()
+    try:
+        yield
+    finally:
+        end = perf_counter_ns()
+        _parent.reset(token)
+        trace.record(
+            stage,
+            name or stage,
+            start,
+            end,
+            attributes,
+            span_id=span_id,
+            nested=parent is not None and parent[0] == stage,
+        )
+
+
+def traced(stage: str, name: Optional[str] = None) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator form of `span` for sync functions (FastAPI dependencies included)."""
+
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        label = name or f"{stage} {fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if current_trace() is None:
+                return fn(*args, **kwargs)
+            with span(stage, label):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def record_query(statement_key: str, start: int, end: int) -> None:
+    """Called by the DB hooks with the statement's perf_counter_ns bounds."""
+    trace = current_trace()
+    if trace is not None:
+        trace.record("db", "db.query", start, end, {"db.statement.fingerprint": statement_key}, SPAN_KIND_CLIENT)
+
+
+# -- output ---------------------------------------------------------------
+_writer: Optional[logging.Logger] = None
+_listener: Optional[QueueListener] = None
+_writer_lock = Lock()
+
+
+def _configured_trace_path() -> Path:
+    return (Path(__file__).resolve().parent.parent / get_settings().trace_file).resolve()
+
+
+def trace_path() -> Path:
+    """This worker's trace file: `trace_file` with the pid before the suffix."""
+    path = _configured_trace_path()
+    return path.with_name(f"{path.stem}.{os.getpid()}{path.suffix}")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # running under another user
+        pass
+    return True
+
+
+def prune_trace_files() -> None:
+    """Delete the trace files (and rotated backups) of worker pids that are gone."""
+    base = _configured_trace_path()
+    pattern = re.compile(rf"{re.escape(base.stem)}\.(\d+){re.escape(base.suffix)}(\.\d+)?")
+    for candidate in base.parent.iterdir():
+        match = pattern.fullmatch(candidate.name)
+        if match and int(match.group(1)) != os.getpid() and not _pid_alive(int(match.group(1))):
+            candidate.unlink(missing_ok=True)
+
+
+def _trace_logger() -> logging.Logger:
+    """Logger whose records are written to the rotating file by a background thread."""
+    global _writer, _listener
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                settings = get_settings()
+                path = trace_path()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                prune_trace_files()
+                handler = RotatingFileHandler(
+                    path,
+                    maxBytes=settings.trace_file_max_bytes,
+                    backupCount=settings.trace_file_backups,
+                    encoding="utf-8",
+                )
+                records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+                _listener = QueueListener(records, handler)
+                _listener.start()
+                writer = logging.getLogger("wiretide.traces")
+                writer.propagate = False
+                writer.setLevel(logging.INFO)
+                writer.handlers = [QueueHandler(records)]
+                _writer = writer
+    return _writer
+
+
+def export(trace: Trace, name: str, end: int, attributes: Dict[str, Any]) -> None:
+    _trace_logger().info(json.dumps(trace.to_otlp(name, end, attributes), separators=(",", ":")))
+
+
+def flush_traces() -> None:
+    """Write out queued traces and close the file (shutdown, tests)."""
+    global _writer, _listener
+    with _writer_lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+        if _writer is not None:
+            _writer.handlers = []
+        _writer, _listener = None, None
@@ -0,0 +1,441 @@
+"""Agent update distribution: content-addressed artifacts and staged rollout waves.
+
+Artifacts live on disk as ``<artifact_dir>/<sha256>`` (plus a precompressed
+``.gz``) and are served with a strong ETag, Range and gzip support; the URL
+never changes for a given content, so proxies and agents can cache forever.
+
+A rollout assigns devices in waves: a stable hash of (rollout, device) picks
+`percent` of the cohort (optionally limited to device types), at most
+`max_concurrent` devices update at once, and the rollout pauses itself when
+the failure ratio of finished updates exceeds `error_threshold`.
+"""
+
+import gzip
+import hashlib
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy import delete, func, update
+from sqlmodel import Session, select
+
+from .config import get_settings
+from .db import get_session, session_scope
+from .models import AgentArtifact, ControllerSettings, Device, DeviceConfig, RolloutTarget, UpdateRollout
+from .profiling import ProfiledRoute
+from .routes import require_admin_token, require_agent_token
+from .schemas import ArtifactOut, RolloutCreate, RolloutOut, RolloutPatch, UpdateReport
+from .services import canonical_sha256
+
+updates_router = APIRouter(route_class=ProfiledRoute)
+
+UPDATE_PACKAGE = "wiretide.update"
+MAX_ARTIFACT_BYTES = 64 * 1024 * 1024
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def artifact_dir() -> Path:
+    return (Path(__file__).resolve().parent.parent / get_settings().artifact_dir).resolve()
+
+
+def artifact_url(sha256: str) -> str:
+    return f"/agent-artifacts/{sha256}"
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def store_artifact(session: Session, data: bytes, version: str, filename: str) -> AgentArtifact:
+    """Write the artifact (and its gzip variant) under its digest; idempotent per content."""
+    digest = hashlib.sha256(data).hexdigest()
+    existing = session.get(AgentArtifact, digest)
+    if existing is not None:
+        return existing
+    directory = artifact_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    _write_atomic(directory / digest, data)
+    _write_atomic(directory / f"{digest}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+    artifact = AgentArtifact(sha256=digest, version=version, filename=filename, size=len(data))
+    session.add(artifact)
+    session.commit()
+    session.refresh(artifact)
+    return artifact
+
+
+def _artifact_out(artifact: AgentArtifact) -> ArtifactOut:
+    return ArtifactOut(**artifact.model_dump(), url=artifact_url(artifact.sha256))
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Single byte range -> inclusive (start, end); None when unsatisfiable."""
+    match = _RANGE.match(header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    first, last = match.group(1), match.group(2)
+    if not first:
+        length = int(last)
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return None
+    return start, end
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+@updates_router.get("/agent-artifacts/{sha256}")
+def download_artifact(sha256: str, request: Request) -> Response:
+    # Served straight from disk: the digest in the URL is the lookup key, no DB access.
+    path = artifact_dir() / sha256
+    if not _SHA256.match(sha256) or not path.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Artifact not found",
+        )
+    etag = f'"{sha256}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE,
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or sha256 in if_none_match:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        size = path.stat().st_size
+        byte_range = parse_range(range_header, size)
+        if byte_range is None:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{size}"},
+            )
+        start, end = byte_range
+        with path.open("rb") as handle:
+            handle.seek(start)
+            chunk = handle.read(end - start + 1)
+        return Response(
+            content=chunk,
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type="application/octet-stream",
+            headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"},
+        )
+
+    gz_path = path.with_name(f"{sha256}.gz")
+    if _accepts_gzip(request.headers.get("accept-encoding", "")) and gz_path.is_file():
+        return FileResponse(
+            gz_path,
+            media_type="application/octet-stream",
+            headers={**headers, "ETag": f'"{sha256}-gz"', "Content-Encoding": "gzip"},
+        )
+    return FileResponse(path, media_type="application/octet-stream", headers=headers)
+
+
+def cohort_slot(rollout_id: int, device_id: int) -> int:
+    """Stable 0-99 slot so raising `percent` only adds devices, never reshuffles."""
+    digest = hashlib.sha256(f"{rollout_id}:{device_id}".encode("ascii")).digest()
+    return int.from_bytes(digest[:4], "big") % 100
+
+
+def rollout_counts(session: Session, rollout_id: int, since: Optional[datetime] = None) -> Dict[str, int]:
+    counts = {"updating": 0, "succeeded": 0, "failed": 0}
+    stmt = (
+        select(RolloutTarget.state, func.count())
+        .where(RolloutTarget.rollout_id == rollout_id)
+        .group_by(RolloutTarget.state)
+    )
+    if since is not None:
+        stmt = stmt.where(RolloutTarget.assigned_at >= since)
+    for state, count in session.exec(stmt).all():
+        counts[state] = count
+    return counts
+
+
+def _update_payload(rollout: UpdateRollout, policy: str) -> Dict[str, str]:
+    return {
+        "url": artifact_url(rollout.artifact_sha256),
+        "version": rollout.version,
+        "script_sha256": rollout.artifact_sha256,
+        "policy": policy,
+    }
+
+
+def _next_wave(session: Session, rollout: UpdateRollout, policy: str, slots: int) -> List[int]:
+    assigned = select(RolloutTarget.device_id).where(RolloutTarget.rollout_id == rollout.id)
+    stmt = (
+        select(Device.id)
+        .where(
+            Device.status == "approved",
+            Device.approved == True,  # noqa: E712 - SQL expression
+            Device.id.not_in(assigned),
+            (Device.agent_version != rollout.version) | (Device.agent_version == None),  # noqa: E711
+        )
+        .order_by(Device.id)
+    )
+    if rollout.device_types:
+        stmt = stmt.where(Device.device_type.in_(rollout.device_types))
+    if policy == "per_device":
+        stmt = stmt.where(Device.agent_update_allowed == True)  # noqa: E712
+    wave: List[int] = []
+    for device_id in session.exec(stmt):
+        if cohort_slot(rollout.id, device_id) < rollout.percent:
+            wave.append(device_id)
+            if len(wave) >= slots:
+                break
+    return wave
+
+
+def advance_rollout(session: Session, rollout: UpdateRollout, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Settle finished/timed-out targets, auto-pause on errors, then queue the next wave."""
+    now = now or datetime.now(timezone.utc)
+    settings = get_settings()
+    in_flight = (RolloutTarget.rollout_id == rollout.id, RolloutTarget.state == "updating")
+    # An agent that reports the new version in /status has applied the update.
+    session.exec(
+        update(RolloutTarget)
+        .where(*in_flight, RolloutTarget.device_id.in_(select(Device.id).where(Device.agent_version == rollout.version)))
+        .values(state="succeeded", finished_at=now)
+    )
+    session.exec(
+        update(RolloutTarget)
+        .where(*in_flight, RolloutTarget.assigned_at < now - timedelta(seconds=settings.rollout_update_timeout))
+        .values(state="failed", error="timeout", finished_at=now)
+    )
+
+    if rollout.status == "active":
+        window = rollout_counts(session, rollout.id, since=rollout.resumed_at)
+        finished = window["succeeded"] + window["failed"]
+        if finished >= rollout.min_reports and window["failed"] / finished > rollout.error_threshold:
+            rollout.status = "paused"
+            rollout.pause_reason = f"error rate {window['failed']}/{finished} above {rollout.error_threshold:.0%}"
+
+    counts = rollout_counts(session, rollout.id)
+    if rollout.status == "active":
+        controller = session.get(ControllerSettings, 1)
+        policy = controller.agent_update_policy if controller else "off"
+        slots = rollout.max_concurrent - counts["updating"]
+        wave = _next_wave(session, rollout, policy, slots) if policy != "off" and slots > 0 else []
+        payload = _update_payload(rollout, policy)
+        digest = canonical_sha256(payload)
+        for device_id in wave:
+            session.add(RolloutTarget(rollout_id=rollout.id, device_id=device_id, assigned_at=now))
+            session.add(
+                DeviceConfig(
+                    device_id=device_id, package=UPDATE_PACKAGE, package_json=payload, sha256=digest, created_at=now
+                )
+            )
+        counts["updating"] += len(wave)
+        if not wave and counts["updating"] == 0 and policy != "off" and rollout.percent >= 100:
+            rollout.status = "completed"
+    rollout.updated_at = now
+    session.add(rollout)
+    session.flush()
+    return counts
+
+
+def run_rollouts() -> Dict[int, str]:
+    """Background job: advance every active or paused rollout; returns status changes."""
+    changes: Dict[int, str] = {}
+    with session_scope() as session:
+        ids = session.exec(
+            select(UpdateRollout.id).where(UpdateRollout.status.in_(("active", "paused")))
+        ).all()
+        for rollout_id in ids:
+            # Row lock (PostgreSQL) keeps concurrent workers from double-filling a wave.
+            rollout = session.exec(
+                select(UpdateRollout).where(UpdateRollout.id == rollout_id).with_for_update()
+            ).one()
+            before = rollout.status
+            advance_rollout(session, rollout)
+            session.commit()
+            if rollout.status != before:
+                changes[rollout_id] = rollout.status
+    return changes
+
+
+def _rollout_out(session: Session, rollout: UpdateRollout) -> RolloutOut:
+    return RolloutOut(**rollout.model_dump(exclude={"resumed_at"}), counts=rollout_counts(session, rollout.id))
+
+
+def _get_rollout(session: Session, rollout_id: int) -> UpdateRollout:
+    rollout = session.get(UpdateRollout, rollout_id)
+    if rollout is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Rollout not found",
+        )
+    return rollout
+
+
+@updates_router.post("/api/agent-artifacts", response_model=ArtifactOut)
+async def upload_artifact(
+    request: Request,
+    version: str,
+    filename: str = "wiretide-agent-update.sh",
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> ArtifactOut:
+    """Raw request body is the artifact (no multipart needed): `curl --data-binary @file`."""
+    data = await request.body()
+    if not data:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Empty artifact",
+        )
+    if len(data) > MAX_ARTIFACT_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Artifact too large",
+        )
+    artifact = await run_in_threadpool(store_artifact, session, data, version, filename)
+    return _artifact_out(artifact)
+
+
+@updates_router.get("/api/agent-artifacts", response_model=List[ArtifactOut])
+def list_artifacts(
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> List[ArtifactOut]:
+    rows = session.exec(select(AgentArtifact).order_by(AgentArtifact.created_at.desc())).all()
+    return [_artifact_out(row) for row in rows]
+
+
+@updates_router.post("/api/rollouts", response_model=RolloutOut)
+def create_rollout(
+    payload: RolloutCreate,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> RolloutOut:
+    artifact = session.get(AgentArtifact, payload.artifact_sha256)
+    if artifact is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Artifact not found",
+        )
+    running = session.exec(
+        select(UpdateRollout.id).where(UpdateRollout.status.in_(("active", "paused")))
+    ).first()
+    if running is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Rollout {running} still in progress; cancel it first",
+        )
+    rollout = UpdateRollout(**payload.model_dump(), version=artifact.version)
+    session.add(rollout)
+    session.flush()
+    advance_rollout(session, rollout)
+    session.commit()
+    session.refresh(rollout)
+    return _rollout_out(session, rollout)
+
+
+@updates_router.get("/api/rollouts", response_model=List[RolloutOut])
+def list_rollouts(
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> List[RolloutOut]:
+    rows = session.exec(select(UpdateRollout).order_by(UpdateRollout.id.desc()).limit(50)).all()
+    return [_rollout_out(session, row) for row in rows]
+
+
+@updates_router.get("/api/rollouts/{rollout_id}", response_model=RolloutOut)
+def get_rollout(
+    rollout_id: int,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> RolloutOut:
+    return _rollout_out(session, _get_rollout(session, rollout_id))
+
+
+@updates_router.patch("/api/rollouts/{rollout_id}", response_model=RolloutOut)
+def patch_rollout(
+    rollout_id: int,
+    payload: RolloutPatch,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_admin_token),
+) -> RolloutOut:
+    """Widen a wave (`percent`, `max_concurrent`), pause, resume or cancel."""
+    rollout = _get_rollout(session, rollout_id)
+    if rollout.status in ("completed", "cancelled"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Rollout already {rollout.status}",
+        )
+    if payload.status is not None and payload.status not in {"active", "paused", "cancelled"}:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid rollout status",
+        )
+    for field in ("percent", "max_concurrent", "error_threshold"):
+        value = getattr(payload, field)
+        if value is not None:
+            setattr(rollout, field, value)
+    now = datetime.now(timezone.utc)
+    if payload.status == "active" and rollout.status != "active":
+        rollout.resumed_at = now
+        rollout.pause_reason = None
+    if payload.status is not None:
+        rollout.status = payload.status
+    if rollout.status == "cancelled":
+        # Drop update packages that agents have not fetched yet.
+        pending = select(RolloutTarget.device_id).where(
+            RolloutTarget.rollout_id == rollout.id, RolloutTarget.state == "updating"
+        )
+        session.exec(
+            delete(DeviceConfig).where(DeviceConfig.package == UPDATE_PACKAGE, DeviceConfig.device_id.in_(pending))
+        )
+    advance_rollout(session, rollout, now)
+    session.commit()
+    session.refresh(rollout)
+    return _rollout_out(session, rollout)
+
+
+@updates_router.post("/agent-update/report")
+def report_update(
+    payload: UpdateReport,
+    session: Session = Depends(get_session),
+    _: None = Depends(require_agent_token),
+) -> dict:
+    """Agent-side result of applying a `wiretide.update` package."""
+    target = session.exec(
+        select(RolloutTarget)
+        .join(UpdateRollout, UpdateRollout.id == RolloutTarget.rollout_id)
+        .where(
+            RolloutTarget.device_id == payload.device_id,
+            RolloutTarget.state == "updating",
+            UpdateRollout.version == payload.version,
+        )
+    ).first()
+    if target is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No update in progress for device",
+        )
+    target.state = "succeeded" if payload.success else "failed"
+    target.error = None if payload.success else (payload.error or "failed")[:256]
+    target.finished_at = datetime.now(timezone.utc)
+    session.add(target)
+    session.commit()
+    return {"status": "ok"}
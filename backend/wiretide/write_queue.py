@@ -0,0 +1,164 @@
+"""Single-writer queue for SQLite.
+
+Enabled with `WIRETIDE_WRITE_QUEUE_ENABLED=true`. One daemon thread owns the
+only write connection (see `db.create_writer_engine`) and drains submitted
+write units in grouped transactions: every unit runs inside its own SAVEPOINT,
+so a unit that raises (e.g. a 404/409 `HTTPException`) is rolled back alone,
+and the whole group is committed once. Futures resolve only after that commit.
+
+A write unit is `fn(session, *args)` that flushes but never commits; the
+`*_impl` functions in `routes` follow that contract. Reads (auth checks,
+listings, pages) keep using the pooled request sessions. With a separate
+telemetry database the writer owns one connection per file.
+"""
+
+import asyncio
+import contextvars
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from .config import get_settings
+from .db import create_writer_engine, telemetry_binds
+from .metrics import WRITE_BATCH_SIZE
+from .profiling import profiled
+
+logger = logging.getLogger("wiretide.write_queue")
+
+_Unit = Tuple[Callable[..., Any], Tuple[Any, ...], contextvars.Context, Future]
+
+
+class WriteQueue:
+    def __init__(self, bind: Engine, max_batch: int = 64, telemetry_bind: Optional[Engine] = None) -> None:
+        self.bind = bind
+        self.telemetry_bind = telemetry_bind
+        self.max_batch = max(1, max_batch)
+        self.batches = 0
+        self._queue: "queue.SimpleQueue[Optional[_Unit]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="wiretide-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Finish queued units, then stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        # The unit runs in the caller's context so per-request DB stats still add up.
+        future: Future = Future()
+        self._queue.put((fn, args, contextvars.copy_context(), future))
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def _next_batch(self) -> Optional[List[_Unit]]:
+        """Block for one unit, then take whatever else is already queued."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                unit = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if unit is None:
+                self._queue.put(None)
+                break
+            batch.append(unit)
+        return batch
+
+    def _run(self) -> None:
+        binds = telemetry_binds(self.telemetry_bind) if self.telemetry_bind is not None else None
+        with Session(self.bind, binds=binds) as session:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                try:
+                    self._execute(session, batch)
+                except Exception:  # pragma: no cover - keep the writer alive
+                    logger.exception("Write queue batch failed")
+
+    def _execute(self, session: Session, batch: List[_Unit]) -> None:
+        done = []
+        for fn, args, context, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with session.begin_nested():
+                    result = context.run(fn, session, *args)
+            except Exception as exc:
+                future.set_exception(exc)
+                continue
+            done.append((future, result))
+        try:
+            session.commit()
+        except Exception as exc:
+            session.rollback()
+            for future, _ in done:
+                future.set_exception(exc)
+        else:
+            for future, result in done:
+                future.set_result(result)
+        self.batches += 1
+        WRITE_BATCH_SIZE.observe(len(batch))
+
+
+_active: Optional[WriteQueue] = None
+
+
+def start_write_queue(
+    bind: Optional[Engine] = None, max_batch: int = 64, telemetry_bind: Optional[Engine] = None
+) -> WriteQueue:
+    global _active
+    if bind is None:
+        bind = create_writer_engine()
+        telemetry_url = get_settings().telemetry_database_url
+        if telemetry_url:
+            telemetry_bind = create_writer_engine(telemetry_url)
+    _active = WriteQueue(bind, max_batch, telemetry_bind)
+    _active.start()
+    return _active
+
+
+def stop_write_queue() -> None:
+    global _active
+    if _active is not None:
+        _active.stop()
+        _active.bind.dispose()
+        if _active.telemetry_bind is not None:
+            _active.telemetry_bind.dispose()
+        _active = None
+
+
+def current_write_queue() -> Optional[WriteQueue]:
+    return _active
+
+
+def _run_inline(session: Session, fn: Callable[..., Any], *args: Any) -> Any:
+    result = fn(session, *args)
+    session.commit()
+    return result
+
+
+async def run_write(session: Session, fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a write unit on the writer thread when the queue is on, else on `session`."""
+    fn = profiled(fn)
+    active = _active
+    if active is None:
+        return await run_in_threadpool(_run_inline, session, fn, *args)
+    return await active.run(fn, *args)
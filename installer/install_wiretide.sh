@@ -7,18 +7,21 @@ set -euo pipefail
 # - Configures systemd + nginx
 # Flags:
 #   --dry-run   : show actions without changing the system
-#   --update    : backup existing /opt/wiretide before deploying
+#   --update    : backup existing /opt/wiretide (code) and the databases (online snapshot) before deploying
 #   --cert-cn X : CN for self-signed TLS cert (default: wiretide.local)
+#   --workers N : uvicorn worker processes (default: chosen from cores and DB mode, see wiretide.runtime)
 
 DRY_RUN=0
 DO_UPDATE=0
 CERT_CN="wiretide.local"
+WORKERS=""
 
 while [[ $# -gt 0 ]]; do
   case "$1" in
     --dry-run) DRY_RUN=1; shift ;;
     --update) DO_UPDATE=1; shift ;;
     --cert-cn) CERT_CN="${2:-wiretide.local}"; shift 2 ;;
+    --workers) WORKERS="${2:-}"; shift 2 ;;
     *) echo "Unknown option: $1"; exit 1 ;;
   esac
 done
@@ -57,6 +60,8 @@ KEY_PATH="$CERT_DIR/wiretide.key"
 WIRETIDE_USER="wiretide"
 WIRETIDE_GROUP="wiretide"
 ADMIN_ENV_FILE="$CONFIG_DIR/admin.env"
+RUNTIME_ENV_FILE="$CONFIG_DIR/runtime.env"
+DATABASE_URL="sqlite:///$DATA_DIR/wiretide.db"
 DEFAULT_ADMIN_USERNAME="admin"
 
 log "Starting Wiretide installer (dry-run=$DRY_RUN, update=$DO_UPDATE)"
@@ -96,6 +101,29 @@ if [[ "$DRY_RUN" -eq 0 ]]; then
   fi
   run "$VENV_DIR/bin/pip" install --upgrade pip
   run "$VENV_DIR/bin/pip" install -r "$APP_DIR/backend/requirements.txt"
+  # Fingerprinted, precompressed static files (served with Cache-Control: immutable).
+  (cd "$APP_DIR/backend" && run "$VENV_DIR/bin/python" -m wiretide.assets)
+fi
+
+# Database snapshot on update (online backup API; safe while the service keeps running)
+if [[ "$DO_UPDATE" -eq 1 && "$DRY_RUN" -eq 0 && -f "$DATA_DIR/wiretide.db" ]]; then
+  log "Snapshotting databases into $DATA_DIR/backups"
+  (cd "$APP_DIR/backend" && run runuser -u "$WIRETIDE_USER" -- env \
+    WIRETIDE_DATABASE_URL="$DATABASE_URL" \
+    WIRETIDE_BACKUP_DIR="$DATA_DIR/backups" \
+    "$VENV_DIR/bin/python" -m wiretide.backup create)
+fi
+
+# Production runtime profile: workers from available cores and DB mode,
+# uvloop/httptools when installed, listen backlog and keep-alive timeouts.
+NGINX_KEEPALIVE=16
+if [[ "$DRY_RUN" -eq 1 ]]; then
+  log "[dry-run] would write runtime profile to $RUNTIME_ENV_FILE"
+else
+  (cd "$APP_DIR/backend" && WIRETIDE_DATABASE_URL="$DATABASE_URL" \
+    "$VENV_DIR/bin/python" -m wiretide.runtime plan ${WORKERS:+--workers "$WORKERS"}) > "$RUNTIME_ENV_FILE"
+  log "Runtime profile: $(tr '\n' ' ' < "$RUNTIME_ENV_FILE")"
+  NGINX_KEEPALIVE="$(sed -n 's/^WIRETIDE_NGINX_KEEPALIVE=//p' "$RUNTIME_ENV_FILE")"
 fi
 
 # Admin credentials (username/password -> bcrypt hash)
@@ -150,10 +178,18 @@ After=network.target
 User=wiretide
 Group=wiretide
 WorkingDirectory=$APP_DIR/backend
-ExecStart=$VENV_DIR/bin/uvicorn wiretide.main:app --host 127.0.0.1 --port 9000 --workers 2
+ExecStart=$VENV_DIR/bin/uvicorn wiretide.main:app --host 127.0.0.1 --port 9000 \\
+  --workers \${WIRETIDE_SERVER_WORKERS} --loop \${WIRETIDE_SERVER_LOOP} --http \${WIRETIDE_SERVER_HTTP} \\
+  --backlog \${WIRETIDE_SERVER_BACKLOG} --timeout-keep-alive \${WIRETIDE_SERVER_KEEPALIVE_TIMEOUT}
 Restart=always
+LimitNOFILE=65536
+EnvironmentFile=$RUNTIME_ENV_FILE
 EnvironmentFile=-$ADMIN_ENV_FILE
-Environment=WIRETIDE_DATABASE_URL=sqlite:///$DATA_DIR/wiretide.db
+Environment=WIRETIDE_DATABASE_URL=$DATABASE_URL
+Environment=WIRETIDE_ARTIFACT_DIR=$DATA_DIR/artifacts
+Environment=WIRETIDE_TEMPLATE_CACHE_DIR=$DATA_DIR/template-cache
+Environment=WIRETIDE_BACKUP_DIR=$DATA_DIR/backups
+Environment=WIRETIDE_TRACE_FILE=$DATA_DIR/traces/wiretide-traces.jsonl
 Environment=WIRETIDE_ADMIN_COOKIE_SECURE=true
 
 [Install]
@@ -173,6 +209,19 @@ if [[ "$DRY_RUN" -eq 1 ]]; then
   log "[dry-run] writing nginx config to $NGINX_CONF"
 else
 cat > "$NGINX_CONF" <<EOF
+# Keep Connection empty for plain requests so upstream connections are reused.
+map \$http_upgrade \$wiretide_connection {
+    default upgrade;
+    ''      '';
+}
+
+upstream wiretide_backend {
+    server 127.0.0.1:9000;
+    keepalive $NGINX_KEEPALIVE;
+    keepalive_requests 10000;
+    keepalive_timeout 15s;
+}
+
 server {
     listen 80;
     server_name _;
@@ -195,15 +244,22 @@ server {
 
     # Proxy everything to uvicorn; let uvicorn serve /static to avoid home-dir perms issues.
     location / {
-        proxy_pass http://127.0.0.1:9000;
+        proxy_pass http://wiretide_backend;
         proxy_set_header Host \$host;
         proxy_set_header X-Real-IP \$remote_addr;
         proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
         proxy_set_header X-Forwarded-Proto \$scheme;
         proxy_http_version 1.1;
         proxy_set_header Upgrade \$http_upgrade;
-        proxy_set_header Connection upgrade;
+        proxy_set_header Connection \$wiretide_connection;
+        proxy_connect_timeout 5s;
         proxy_read_timeout 60s;
+        # Buffer responses so slow clients do not hold a uvicorn worker.
+        proxy_buffering on;
+        proxy_buffer_size 16k;
+        proxy_buffers 32 16k;
+        proxy_busy_buffers_size 64k;
+        client_body_buffer_size 64k;
     }
 }
 EOF
@@ -218,4 +274,4 @@ if [[ "$DRY_RUN" -eq 0 ]]; then
   run systemctl reload nginx
 fi
 
-log "Wiretide installer completed. Uvicorn on 127.0.0.1:9000, Nginx on 443."
+log "Wiretide installer completed. Uvicorn on 127.0.0.1:9000, Nginx on 443 (check: curl -sk https://127.0.0.1/health)."